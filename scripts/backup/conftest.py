@@ -0,0 +1,25 @@
+"""
+Shared fixtures for backup.sh tests
+"""
+
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).parent
+SCRIPTS = ['backup.sh']
+
+@pytest.fixture(scope="session")
+def script_dir():
+    """Directory holding the scripts under test"""
+    return SCRIPT_DIR
+
+@pytest.fixture(scope="session")
+def script_names():
+    """Scripts covered by script_meta and bash_syntax_results"""
+    return SCRIPTS
+
+@pytest.fixture(scope="session")
+def backup_script(read_script):
+    """Content of backup.sh, read once per session"""
+    return read_script(SCRIPT_DIR, 'backup.sh')
@@ -3,97 +3,56 @@
 Test for backup.sh
 """
 
-import os
-import subprocess
+import re
 import pytest
 
-def test_backup_script_exists():
+# Common mock data patterns, matched case-insensitively in one pass
+MOCK_DATA = re.compile(r'MEGA_TREASURE_SHOP|test_backup|dummy|mock', re.IGNORECASE)
+
+def test_backup_script_exists(script_meta):
     """Test that backup.sh exists"""
-    assert os.path.exists('backup.sh')
+    assert 'backup.sh' in script_meta
 
-def test_backup_script_is_executable():
+def test_backup_script_is_executable(script_meta):
     """Test that backup.sh is executable"""
-    assert os.access('backup.sh', os.X_OK)
+    assert script_meta['backup.sh'].st_mode & 0o111
 
-def test_backup_script_syntax():
+def test_backup_script_syntax(bash_syntax_results):
     """Test bash script syntax"""
-    result = subprocess.run(['bash', '-n', 'backup.sh'], capture_output=True, text=True)
+    result = bash_syntax_results['backup.sh']
     assert result.returncode == 0, f"Syntax error: {result.stderr}"
 
-def test_backup_script_has_shebang():
+def test_backup_script_has_shebang(backup_script):
     """Test that script has proper shebang"""
-    with open('backup.sh', 'r') as f:
-        first_line = f.readline().strip()
+    first_line = backup_script.split('\n', 1)[0].strip()
     assert first_line == '#!/bin/bash'
 
-def test_backup_paths_defined():
-    """Test that backup paths are properly defined"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'BACKUP_DIR=' in content
-    assert 'SOURCE_DIR=' in content
-    assert '/Volumes/' in content  # External drives
-
-def test_backup_includes_database():
-    """Test that database backup is included"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'dropush.db' in content
-    assert 'Backing up database' in content
-
-def test_backup_includes_workflows():
-    """Test that n8n workflows are backed up"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'n8n export:workflow' in content
-    assert 'workflows_backup.json' in content
-
-def test_backup_creates_archive():
-    """Test that backup creates compressed archive"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'tar -czf' in content
-    assert '.tar.gz' in content
-
-def test_backup_cleans_old_files():
-    """Test that old backups are cleaned"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'find' in content
-    assert '-mtime +30' in content
-    assert '-delete' in content
-
-def test_backup_logs_completion():
-    """Test that backup logs its completion"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'backup.log' in content
-    assert 'Backup completed' in content
-
-def test_backup_has_date_stamp():
-    """Test that backup uses timestamps"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'date +%Y%m%d_%H%M%S' in content
-    assert '$DATE' in content
-
-def test_no_mock_data():
+# Tokens backup.sh must contain, keyed by the behaviour they cover
+REQUIRED_TOKENS = {
+    'backup_paths_defined': ['BACKUP_DIR=', 'SOURCE_DIR=', '/Volumes/'],
+    'backup_includes_database': ['dropush.db', 'Backing up database'],
+    'backup_includes_workflows': ['n8n export:workflow', 'workflows_backup.json'],
+    'backup_creates_archive': ['tar -czf', '.tar.gz'],
+    'backup_cleans_old_files': ['find', '-mtime +30', '-delete'],
+    'backup_logs_completion': ['backup.log', 'Backup completed'],
+    'backup_has_date_stamp': ['date +%Y%m%d_%H%M%S', '$DATE'],
+}
+
+@pytest.fixture(scope="module")
+def found_tokens(backup_script, scan_tokens):
+    """Required tokens present in backup.sh, found in a single pass"""
+    return scan_tokens(backup_script, [t for tokens in REQUIRED_TOKENS.values() for t in tokens])
+
+@pytest.mark.parametrize('check', REQUIRED_TOKENS)
+def test_backup_required_tokens(check, found_tokens):
+    """Test that script contains the tokens required by each check"""
+    missing = set(REQUIRED_TOKENS[check]) - found_tokens
+    assert not missing, f"backup.sh is missing: {sorted(missing)}"
+
+def test_no_mock_data(backup_script):
     """Test that script has no mock/hardcoded data"""
-    with open('backup.sh', 'r') as f:
-        content = f.read()
-    
-    # Check for common mock data patterns
-    assert 'MEGA_TREASURE_SHOP' not in content
-    assert 'test_backup' not in content
-    assert 'dummy' not in content.lower()
-    assert 'mock' not in content.lower()
+    match = MOCK_DATA.search(backup_script)
+    assert match is None, f"Mock data found: {match.group()}"
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
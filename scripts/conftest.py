@@ -0,0 +1,72 @@
+"""
+Shared fixtures for the shell script tests in scripts/*/
+
+Each suite's conftest.py provides `script_dir` (directory of the scripts)
+and `script_names` (scripts under test). The fixtures depending on them are
+module-scoped: a session-scoped one would keep the first suite's scripts.
+"""
+
+import os
+import re
+import subprocess
+
+import pytest
+
+
+class ScriptResults(dict):
+    """Per-script results; a missing script fails with a clear message, not a KeyError"""
+
+    def __init__(self, script_dir, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.script_dir = script_dir
+
+    def __missing__(self, name):
+        raise AssertionError(f"{name} not found in {self.script_dir}")
+
+
+@pytest.fixture(scope="session")
+def read_script():
+    """Return a helper reading a script's content, asserting that it exists"""
+    def read(script_dir, name):
+        path = script_dir / name
+        assert path.is_file(), f"{name} not found in {script_dir}"
+        return path.read_text()
+    return read
+
+
+@pytest.fixture(scope="module")
+def script_meta(script_dir, script_names):
+    """os.stat of each existing script, one syscall per script per module"""
+    meta = ScriptResults(script_dir)
+    for name in script_names:
+        try:
+            meta[name] = os.stat(script_dir / name)
+        except FileNotFoundError:
+            pass
+    return meta
+
+
+@pytest.fixture(scope="module")
+def bash_syntax_results(script_dir, script_names):
+    """Result of `bash -n` for each existing script, run once per module"""
+    return ScriptResults(script_dir, {
+        name: subprocess.run(
+            ['bash', '-n', str(script_dir / name)],
+            capture_output=True, text=True, check=False
+        )
+        for name in script_names
+        if (script_dir / name).is_file()
+    })
+
+
+@pytest.fixture(scope="session")
+def scan_tokens():
+    """Return a helper finding which tokens occur in a script, in one regex pass"""
+    def scan(content, tokens):
+        # Longest first, so at each offset the lookahead reports the longest match;
+        # a shorter token hidden that way is a prefix of a reported one
+        ordered = sorted(set(tokens), key=len, reverse=True)
+        pattern = re.compile('(?=(' + '|'.join(map(re.escape, ordered)) + '))')
+        found = set(pattern.findall(content))
+        return found | {t for t in ordered if any(f.startswith(t) for f in found)}
+    return scan
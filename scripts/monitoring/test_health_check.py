@@ -3,125 +3,60 @@
 Test for health_check.sh
 """
 
-import os
-import subprocess
+import re
 import pytest
 import json
 
-def test_health_check_script_exists():
+# Common mock data patterns, matched case-insensitively in one pass
+MOCK_DATA = re.compile(r'MEGA_TREASURE_SHOP|test_webhook|dummy|mock', re.IGNORECASE)
+
+def test_health_check_script_exists(script_meta):
     """Test that health_check.sh exists"""
-    assert os.path.exists('health_check.sh')
+    assert 'health_check.sh' in script_meta
 
-def test_health_check_script_is_executable():
+def test_health_check_script_is_executable(script_meta):
     """Test that health_check.sh is executable"""
-    assert os.access('health_check.sh', os.X_OK)
+    assert script_meta['health_check.sh'].st_mode & 0o111
 
-def test_health_check_script_syntax():
+def test_health_check_script_syntax(bash_syntax_results):
     """Test bash script syntax"""
-    result = subprocess.run(['bash', '-n', 'health_check.sh'], capture_output=True, text=True)
+    result = bash_syntax_results['health_check.sh']
     assert result.returncode == 0, f"Syntax error: {result.stderr}"
 
-def test_health_check_script_has_shebang():
+def test_health_check_script_has_shebang(health_check_script):
     """Test that script has proper shebang"""
-    with open('health_check.sh', 'r') as f:
-        first_line = f.readline().strip()
+    first_line = health_check_script.split('\n', 1)[0].strip()
     assert first_line == '#!/bin/bash'
 
-def test_checks_all_services():
-    """Test that script checks all required services"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'dropush-n8n' in content
-    assert 'dropush-ollama' in content
-    assert 'dropush-nginx' in content
-    assert 'docker inspect' in content
-
-def test_checks_disk_usage():
-    """Test that script monitors disk usage"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'df -h' in content
-    assert 'disk_usage' in content
-
-def test_checks_database_size():
-    """Test that script monitors database size"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'dropush.db' in content
-    assert 'du -h' in content
-
-def test_checks_memory_usage():
-    """Test that script monitors memory usage"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'memory_usage' in content
-    assert 'ps aux' in content
-
-def test_creates_json_status():
-    """Test that script creates JSON status"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'status_json' in content
-    assert '"timestamp"' in content
-    assert '"services"' in content
-    assert '"status"' in content
-
-def test_sends_webhook():
-    """Test that script sends webhook to n8n"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'WEBHOOK_URL=' in content
-    assert 'curl -X POST' in content
-    assert 'Content-Type: application/json' in content
-
-def test_logs_locally():
-    """Test that script logs to local file"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'health_check.log' in content
-    assert '>>' in content  # Append to log
-
-def test_handles_service_failures():
-    """Test that script handles service failures"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'not_running' in content
-    assert 'unhealthy' in content
-
-def test_alerts_on_high_disk_usage():
-    """Test that script alerts on high disk usage"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert '-gt 90' in content  # Disk usage > 90%
-    assert 'warning' in content
-
-def test_prints_summary():
-    """Test that script prints summary for cron"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'Health check completed' in content
-    assert 'echo' in content
-
-def test_no_mock_data():
+# Tokens health_check.sh must contain, keyed by the behaviour they cover
+REQUIRED_TOKENS = {
+    'checks_all_services': ['dropush-n8n', 'dropush-ollama', 'dropush-nginx', 'docker inspect'],
+    'checks_disk_usage': ['df -h', 'disk_usage'],
+    'checks_database_size': ['dropush.db', 'du -h'],
+    'checks_memory_usage': ['memory_usage', 'ps aux'],
+    'creates_json_status': ['status_json', '"timestamp"', '"services"', '"status"'],
+    'sends_webhook': ['WEBHOOK_URL=', 'curl -X POST', 'Content-Type: application/json'],
+    'logs_locally': ['health_check.log', '>>'],
+    'handles_service_failures': ['not_running', 'unhealthy'],
+    'alerts_on_high_disk_usage': ['-gt 90', 'warning'],
+    'prints_summary': ['Health check completed', 'echo'],
+}
+
+@pytest.fixture(scope="module")
+def found_tokens(health_check_script, scan_tokens):
+    """Required tokens present in health_check.sh, found in a single pass"""
+    return scan_tokens(health_check_script, [t for tokens in REQUIRED_TOKENS.values() for t in tokens])
+
+@pytest.mark.parametrize('check', REQUIRED_TOKENS)
+def test_health_check_required_tokens(check, found_tokens):
+    """Test that script contains the tokens required by each check"""
+    missing = set(REQUIRED_TOKENS[check]) - found_tokens
+    assert not missing, f"health_check.sh is missing: {sorted(missing)}"
+
+def test_no_mock_data(health_check_script):
     """Test that script has no mock/hardcoded data"""
-    with open('health_check.sh', 'r') as f:
-        content = f.read()
-    
-    # Check for common mock data patterns
-    assert 'MEGA_TREASURE_SHOP' not in content
-    assert 'test_webhook' not in content
-    assert 'dummy' not in content.lower()
-    assert 'mock' not in content.lower()
+    match = MOCK_DATA.search(health_check_script)
+    assert match is None, f"Mock data found: {match.group()}"
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
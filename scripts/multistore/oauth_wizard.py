@@ -7,9 +7,11 @@ Enterprise-ready implementation for connecting multiple eBay stores.
 import os
 import sys
 import json
+import base64
 import sqlite3
 import logging
 import secrets
+import threading
 import webbrowser
 from pathlib import Path
 from typing import Optional, Dict, Any, List
@@ -18,6 +20,11 @@ from urllib.parse import urlencode
 import requests
 from flask import Flask, request, redirect, jsonify
 
+try:
+    from waitress import serve
+except ImportError:
+    serve = None
+
 # Setup paths
 SCRIPT_DIR = Path(__file__).parent.absolute()
 PROJECT_ROOT = SCRIPT_DIR.parent.parent
@@ -41,9 +48,24 @@ class MultiStoreOAuthWizard:
         self.db_path = PROJECT_ROOT / "data" / "sqlite" / "dropush.db"
         self.config_path = PROJECT_ROOT / "config" / "ebay_oauth.json"
         
+        # Shared SQLite connection (opened lazily, used by CLI and callback thread)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        
+        # Pooled HTTP session (keep-alive across token exchanges)
+        self._http = requests.Session()
+        
         # Load eBay OAuth config
         self.config = self._load_config()
         
+        # Basic auth header value, credentials don't change at runtime
+        client_id = self.config.get('client_id')
+        client_secret = self.config.get('client_secret')
+        self._basic_auth = (
+            base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
+            if client_id and client_secret else ''
+        )
+        
         # Flask app for OAuth callback
         self.app = Flask(__name__)
         self._setup_routes()
@@ -57,6 +79,20 @@ class MultiStoreOAuthWizard:
         with open(self.config_path, 'r') as f:
             return json.load(f)
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """Return the shared SQLite connection, opening it on first use."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
+    
+    def close(self):
+        """Close the shared SQLite connection and HTTP session."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._http.close()
+    
     def _setup_routes(self):
         """Setup Flask routes for OAuth callback."""
         
@@ -93,27 +129,20 @@ class MultiStoreOAuthWizard:
         """Add a new store and initiate OAuth flow."""
         logger.info(f"Adding store: {store_name} ({ebay_username})")
         
-        # Check if store already exists
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Insert new store, skipping it if name or username already exist
+        conn = self._get_connection()
+        with self._db_lock, conn:
+            row = conn.execute("""
+                INSERT INTO stores (store_name, ebay_username) 
+                VALUES (?, ?)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, (store_name, ebay_username)).fetchone()
         
-        cursor.execute("SELECT id FROM stores WHERE store_name = ? OR ebay_username = ?", 
-                      (store_name, ebay_username))
-        if cursor.fetchone():
+        if row is None:
             logger.error("Store already exists!")
-            conn.close()
             return False
         
-        # Insert new store
-        cursor.execute("""
-            INSERT INTO stores (store_name, ebay_username) 
-            VALUES (?, ?)
-        """, (store_name, ebay_username))
-        
-        store_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
         # Generate OAuth URL
         state = f"{store_name}:{secrets.token_urlsafe(16)}"
         oauth_url = self._generate_oauth_url(state)
@@ -125,7 +154,7 @@ class MultiStoreOAuthWizard:
         try:
             webbrowser.open(oauth_url)
             print("✅ Browser opened automatically")
-        except:
+        except (webbrowser.Error, OSError):
             print("⚠️  Please open the URL manually in your browser")
         
         return True
@@ -149,7 +178,7 @@ class MultiStoreOAuthWizard:
         
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
-            'Authorization': f'Basic {self._get_basic_auth()}'
+            'Authorization': f'Basic {self._basic_auth}'
         }
         
         data = {
@@ -159,83 +188,65 @@ class MultiStoreOAuthWizard:
         }
         
         try:
-            response = requests.post(url, headers=headers, data=data)
+            response = self._http.post(url, headers=headers, data=data)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Token exchange failed: {e}")
             return None
     
-    def _get_basic_auth(self) -> str:
-        """Get Basic auth string for eBay API."""
-        import base64
-        credentials = f"{self.config.get('client_id')}:{self.config.get('client_secret')}"
-        return base64.b64encode(credentials.encode()).decode()
-    
     def _get_store_from_state(self, state: str) -> str:
         """Extract store name from state parameter."""
-        return state.split(':')[0] if ':' in state else state
+        return state.partition(':')[0]
     
     def _save_tokens(self, store_name: str, tokens: Dict[str, Any]):
         """Save OAuth tokens to database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get store ID
-        cursor.execute("SELECT id FROM stores WHERE store_name = ?", (store_name,))
-        store_id = cursor.fetchone()[0]
-        
         # Calculate expiration times
         now = datetime.now()
         access_expires = now + timedelta(seconds=tokens.get('expires_in', 7200))
         refresh_expires = now + timedelta(days=365)  # eBay refresh tokens last ~18 months
         
-        # Save tokens
-        cursor.execute("""
-            INSERT OR REPLACE INTO oauth_tokens 
-            (store_id, access_token, refresh_token, token_expires_at, refresh_expires_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (store_id, tokens['access_token'], tokens.get('refresh_token'), 
-              access_expires, refresh_expires))
-        
-        conn.commit()
-        conn.close()
+        conn = self._get_connection()
+        with self._db_lock, conn:
+            # Get store ID
+            cursor = conn.execute("SELECT id FROM stores WHERE store_name = ?", (store_name,))
+            store_id = cursor.fetchone()[0]
+            
+            # Save tokens
+            conn.execute("""
+                INSERT OR REPLACE INTO oauth_tokens 
+                (store_id, access_token, refresh_token, token_expires_at, refresh_expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (store_id, tokens['access_token'], tokens.get('refresh_token'), 
+                  access_expires, refresh_expires))
         
         logger.info(f"Tokens saved for store: {store_name}")
     
     def list_stores(self) -> List[Dict[str, Any]]:
         """List all configured stores."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT s.id, s.store_name, s.ebay_username, s.status, 
-                   s.total_listings, s.total_sales,
-                   t.token_expires_at
-            FROM stores s
-            LEFT JOIN oauth_tokens t ON s.id = t.store_id
-            ORDER BY s.created_at DESC
-        """)
+        conn = self._get_connection()
+        with self._db_lock:
+            # Expiry is stored as local time, so compare against local 'now'
+            rows = conn.execute("""
+                SELECT s.id, s.store_name, s.ebay_username, s.status, 
+                       s.total_listings, s.total_sales,
+                       CASE WHEN t.token_expires_at > datetime('now', 'localtime')
+                            THEN 1 ELSE 0 END AS token_valid
+                FROM stores s
+                LEFT JOIN oauth_tokens t ON s.id = t.store_id
+                ORDER BY s.created_at DESC
+            """).fetchall()
         
-        stores = []
-        for row in cursor.fetchall():
-            stores.append({
-                'id': row[0],
-                'store_name': row[1],
-                'ebay_username': row[2],
-                'status': row[3],
-                'total_listings': row[4],
-                'total_sales': row[5],
-                'token_valid': row[6] and datetime.fromisoformat(row[6]) > datetime.now()
-            })
-        
-        conn.close()
-        return stores
+        return [dict(row, token_valid=bool(row['token_valid'])) for row in rows]
     
     def run_server(self, port: int = 8080):
         """Run OAuth callback server."""
         logger.info(f"Starting OAuth callback server on port {port}")
-        self.app.run(host='localhost', port=port, debug=False)
+        if serve is not None:
+            serve(self.app, host='localhost', port=port, threads=4)
+        else:
+            # Fallback: threaded Werkzeug server, callbacks don't serialize
+            self.app.run(host='localhost', port=port, debug=False, threaded=True)
 
 
 def main():
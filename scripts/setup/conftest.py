@@ -0,0 +1,30 @@
+"""
+Shared fixtures for setup.sh and install_ai_models.sh tests
+"""
+
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).parent
+SCRIPTS = ['setup.sh', 'install_ai_models.sh']
+
+@pytest.fixture(scope="session")
+def script_dir():
+    """Directory holding the scripts under test"""
+    return SCRIPT_DIR
+
+@pytest.fixture(scope="session")
+def script_names():
+    """Scripts covered by script_meta and bash_syntax_results"""
+    return SCRIPTS
+
+@pytest.fixture(scope="session")
+def setup_script(read_script):
+    """Content of setup.sh, read once per session"""
+    return read_script(SCRIPT_DIR, 'setup.sh')
+
+@pytest.fixture(scope="session")
+def install_ai_models_script(read_script):
+    """Content of install_ai_models.sh, read once per session"""
+    return read_script(SCRIPT_DIR, 'install_ai_models.sh')
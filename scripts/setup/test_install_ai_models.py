@@ -3,91 +3,55 @@
 Test for install_ai_models.sh
 """
 
-import os
-import subprocess
+import re
 import pytest
 
-def test_install_ai_models_script_exists():
+# Common mock data patterns, matched case-insensitively in one pass
+MOCK_DATA = re.compile(r'MEGA_TREASURE_SHOP|test_|dummy|mock', re.IGNORECASE)
+
+def test_install_ai_models_script_exists(script_meta):
     """Test that install_ai_models.sh exists"""
-    assert os.path.exists('install_ai_models.sh')
+    assert 'install_ai_models.sh' in script_meta
 
-def test_install_ai_models_script_is_executable():
+def test_install_ai_models_script_is_executable(script_meta):
     """Test that install_ai_models.sh is executable"""
-    assert os.access('install_ai_models.sh', os.X_OK)
+    assert script_meta['install_ai_models.sh'].st_mode & 0o111
 
-def test_install_ai_models_script_syntax():
+def test_install_ai_models_script_syntax(bash_syntax_results):
     """Test bash script syntax"""
-    result = subprocess.run(['bash', '-n', 'install_ai_models.sh'], capture_output=True, text=True)
+    result = bash_syntax_results['install_ai_models.sh']
     assert result.returncode == 0, f"Syntax error: {result.stderr}"
 
-def test_install_ai_models_script_has_shebang():
+def test_install_ai_models_script_has_shebang(install_ai_models_script):
     """Test that script has proper shebang"""
-    with open('install_ai_models.sh', 'r') as f:
-        first_line = f.readline().strip()
+    first_line = install_ai_models_script.split('\n', 1)[0].strip()
     assert first_line == '#!/bin/bash'
 
-def test_script_installs_required_models():
-    """Test that script installs all required models"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    # Check for required models
-    assert 'llama3.2:3b' in content
-    assert 'nomic-embed-text' in content
-    assert 'codellama:7b' in content
-
-def test_script_uses_docker_exec():
-    """Test that script uses docker exec correctly"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'docker exec dropush-ollama' in content
-    assert 'ollama pull' in content
-
-def test_script_waits_for_service():
-    """Test that script waits for Ollama to be ready"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'sleep' in content
-    assert 'Waiting for Ollama' in content
-
-def test_script_verifies_installation():
-    """Test that script verifies model installation"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'ollama list' in content
-    assert 'Verifying installed models' in content
-
-def test_script_has_informative_output():
-    """Test that script provides user feedback"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'Installing AI models' in content
-    assert 'successfully' in content
-    assert 'Models available:' in content
-
-def test_script_documents_model_purposes():
-    """Test that script documents what each model is for"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    assert 'general purpose' in content
-    assert 'embeddings' in content
-    assert 'code generation' in content
-
-def test_no_mock_data():
+# Tokens install_ai_models.sh must contain, keyed by the behaviour they cover
+REQUIRED_TOKENS = {
+    'script_installs_required_models': ['llama3.2:3b', 'nomic-embed-text', 'codellama:7b'],
+    'script_uses_docker_exec': ['docker exec dropush-ollama', 'ollama pull'],
+    'script_waits_for_service': ['sleep', 'Waiting for Ollama'],
+    'script_verifies_installation': ['ollama list', 'Verifying installed models'],
+    'script_has_informative_output': ['Installing AI models', 'successfully', 'Models available:'],
+    'script_documents_model_purposes': ['general purpose', 'embeddings', 'code generation'],
+}
+
+@pytest.fixture(scope="module")
+def found_tokens(install_ai_models_script, scan_tokens):
+    """Required tokens present in install_ai_models.sh, found in a single pass"""
+    return scan_tokens(install_ai_models_script, [t for tokens in REQUIRED_TOKENS.values() for t in tokens])
+
+@pytest.mark.parametrize('check', REQUIRED_TOKENS)
+def test_install_ai_models_required_tokens(check, found_tokens):
+    """Test that script contains the tokens required by each check"""
+    missing = set(REQUIRED_TOKENS[check]) - found_tokens
+    assert not missing, f"install_ai_models.sh is missing: {sorted(missing)}"
+
+def test_no_mock_data(install_ai_models_script):
     """Test that script has no mock/hardcoded data"""
-    with open('install_ai_models.sh', 'r') as f:
-        content = f.read()
-    
-    # Check for common mock data patterns
-    assert 'MEGA_TREASURE_SHOP' not in content
-    assert 'test_' not in content.lower()
-    assert 'dummy' not in content.lower()
-    assert 'mock' not in content.lower()
+    match = MOCK_DATA.search(install_ai_models_script)
+    assert match is None, f"Mock data found: {match.group()}"
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -3,93 +3,57 @@
 Test for setup.sh
 """
 
-import os
-import subprocess
+import re
 import pytest
 
-def test_setup_script_exists():
+# Common mock data patterns, matched case-insensitively in one pass
+MOCK_DATA = re.compile(r'MEGA_TREASURE_SHOP|test_store|dummy|mock', re.IGNORECASE)
+
+def test_setup_script_exists(script_meta):
     """Test that setup.sh exists"""
-    assert os.path.exists('setup.sh')
+    assert 'setup.sh' in script_meta
 
-def test_setup_script_is_executable():
+def test_setup_script_is_executable(script_meta):
     """Test that setup.sh is executable"""
-    assert os.access('setup.sh', os.X_OK)
+    assert script_meta['setup.sh'].st_mode & 0o111
 
-def test_setup_script_syntax():
+def test_setup_script_syntax(bash_syntax_results):
     """Test bash script syntax"""
-    result = subprocess.run(['bash', '-n', 'setup.sh'], capture_output=True, text=True)
+    result = bash_syntax_results['setup.sh']
     assert result.returncode == 0, f"Syntax error: {result.stderr}"
 
-def test_setup_script_has_shebang():
+def test_setup_script_has_shebang(setup_script):
     """Test that script has proper shebang"""
-    with open('setup.sh', 'r') as f:
-        first_line = f.readline().strip()
+    first_line = setup_script.split('\n', 1)[0].strip()
     assert first_line == '#!/bin/bash'
 
-def test_setup_script_checks_prerequisites():
-    """Test that script checks for Docker and SQLite"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'command -v docker' in content
-    assert 'command -v sqlite3' in content
-
-def test_setup_script_has_error_handling():
-    """Test that script has proper error handling"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'set -e' in content
-
-def test_setup_script_creates_env():
-    """Test that script handles .env creation"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert '.env.template' in content
-    assert 'docker/.env' in content
-
-def test_setup_script_initializes_database():
-    """Test that script initializes database"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'init_db.sh' in content
-    assert 'Initializing database' in content
-
-def test_setup_script_starts_docker():
-    """Test that script starts Docker services"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'docker-compose up -d' in content
-
-def test_setup_script_installs_ai_models():
-    """Test that script installs AI models"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'install_ai_models.sh' in content
-
-def test_setup_script_sets_cron_jobs():
-    """Test that script sets up cron jobs"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'crontab' in content
-    assert 'backup.sh' in content
-    assert 'health_check.sh' in content
-
-def test_setup_script_has_completion_message():
-    """Test that script has proper completion message"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    assert 'Setup complete!' in content
-    assert 'http://localhost:5678' in content
-    assert 'Next steps:' in content
-
-def test_no_mock_data():
+# Tokens setup.sh must contain, keyed by the behaviour they cover
+REQUIRED_TOKENS = {
+    'setup_script_checks_prerequisites': ['command -v docker', 'command -v sqlite3'],
+    'setup_script_has_error_handling': ['set -e'],
+    'setup_script_creates_env': ['.env.template', 'docker/.env'],
+    'setup_script_initializes_database': ['init_db.sh', 'Initializing database'],
+    'setup_script_starts_docker': ['docker-compose up -d'],
+    'setup_script_installs_ai_models': ['install_ai_models.sh'],
+    'setup_script_sets_cron_jobs': ['crontab', 'backup.sh', 'health_check.sh'],
+    'setup_script_has_completion_message': ['Setup complete!', 'http://localhost:5678', 'Next steps:'],
+}
+
+@pytest.fixture(scope="module")
+def found_tokens(setup_script, scan_tokens):
+    """Required tokens present in setup.sh, found in a single pass"""
+    return scan_tokens(setup_script, [t for tokens in REQUIRED_TOKENS.values() for t in tokens])
+
+@pytest.mark.parametrize('check', REQUIRED_TOKENS)
+def test_setup_required_tokens(check, found_tokens):
+    """Test that script contains the tokens required by each check"""
+    missing = set(REQUIRED_TOKENS[check]) - found_tokens
+    assert not missing, f"setup.sh is missing: {sorted(missing)}"
+
+def test_no_mock_data(setup_script):
     """Test that script has no mock/hardcoded data"""
-    with open('setup.sh', 'r') as f:
-        content = f.read()
-    # Check for common mock data patterns
-    assert 'MEGA_TREASURE_SHOP' not in content
-    assert 'test_store' not in content
-    assert 'dummy' not in content.lower()
-    assert 'mock' not in content.lower()
+    match = MOCK_DATA.search(setup_script)
+    assert match is None, f"Mock data found: {match.group()}"
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
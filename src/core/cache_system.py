@@ -4,15 +4,95 @@ Basato su: aioredis/aioredis-py e leonsk/cachier
 Ref: https://github.com/aio-libs/aioredis-py
 """
 import asyncio
+import logging
+import math
+import os
+import secrets
 import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
 import pickle
 import hashlib
-from typing import Optional, Any, Union, Callable
+import dataclasses
+import orjson
+from typing import Optional, Any, Union, Callable, Dict, List, Sequence
 from datetime import timedelta
-from functools import wraps
+from enum import Enum
+from functools import wraps, lru_cache
 import aiocache
 from aiocache import Cache
-from aiocache.serializers import PickleSerializer
+from aiocache.serializers import NullSerializer
+
+logger = logging.getLogger(__name__)
+
+# TTL massimo L1 senza invalidazioni da Redis
+L1_MAX_TTL = 300
+
+# Tag del primo byte dei valori in Redis
+_JSON_TAG = b'J'
+_PICKLE_TAG = b'P'
+# Tipi esatti che JSON rappresenta senza perdite (niente sottoclassi/Enum)
+_JSON_SCALARS = (str, int, bool, type(None))
+
+
+def _is_plain_json(value: Any) -> bool:
+    """True se il valore torna identico da orjson (dict/list/str/int/bool/None/float finiti)"""
+    value_type = type(value)
+    if value_type in _JSON_SCALARS:
+        return True
+    if value_type is float:
+        return math.isfinite(value)
+    if value_type is list:
+        return all(_is_plain_json(item) for item in value)
+    if value_type is dict:
+        return all(
+            type(k) is str and _is_plain_json(v)
+            for k, v in value.items()
+        )
+    return False
+
+
+def _serialize(value: Any) -> bytes:
+    """orjson per valori JSON puri, pickle per il resto (tuple, UUID, Enum, NaN...)"""
+    if _is_plain_json(value):
+        try:
+            return _JSON_TAG + orjson.dumps(value)
+        except TypeError:
+            # Interi oltre i 64 bit
+            pass
+    return _PICKLE_TAG + pickle.dumps(value, protocol=5)
+
+
+def _deserialize(raw_value: bytes) -> Any:
+    """Inverso di _serialize (accetta anche blob pickle senza tag)"""
+    tag = raw_value[:1]
+    if tag == _JSON_TAG:
+        return orjson.loads(raw_value[1:])
+    if tag == _PICKLE_TAG:
+        return pickle.loads(raw_value[1:])
+    return pickle.loads(raw_value)
+
+# Encoding canonico degli argomenti in make_key
+_KEY_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _key_default(obj: Any) -> Any:
+    """Tipi non JSON negli argomenti: solo forme canoniche, mai repr (indirizzi di memoria)"""
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if hasattr(obj, '__cache_key__'):
+        # Identità stabile dichiarata dall'oggetto (es. istanza su cui è decorato un metodo)
+        return obj.__cache_key__()
+    if isinstance(obj, type):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    if isinstance(obj, Enum):
+        return f"{type(obj).__qualname__}.{obj.name}"
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    raise TypeError(
+        f"{type(obj).__qualname__} non canonicalizzabile in una cache key: "
+        "definire __cache_key__() o passare key= a @cached"
+    )
 
 class MultiLevelCache:
     """
@@ -24,19 +104,112 @@ class MultiLevelCache:
         self.redis_url = redis_url
         self.default_ttl = default_ttl
         
-        # L1: In-memory cache
-        self.memory_cache = Cache(Cache.MEMORY, serializer=PickleSerializer())
+        # L1: In-memory cache (oggetti live, nessuna serializzazione)
+        self.memory_cache = Cache(Cache.MEMORY, serializer=NullSerializer())
         
         # L2: Redis cache (optional)
         self.redis_client = redis_client
         
-    async def initialize(self):
-        """Inizializza connessione Redis"""
+        # Client-side caching: con le invalidazioni di Redis L1 resta coerente
+        # e può tenere i valori per tutto il TTL
+        self._l1_max_ttl = L1_MAX_TTL
+        self._tracking_client: Optional[aioredis.Redis] = None
+        self._tracking_task: Optional[asyncio.Task] = None
+        # Incrementato a ogni invalidazione: un GET su L2 partito prima
+        # di un'invalidazione non ripopola L1 con un valore forse vecchio
+        self._invalidation_epoch = 0
+        
+    async def initialize(self, client_tracking: bool = False, tracking_prefixes: Sequence[str] = ()):
+        """
+        Inizializza connessione Redis
+        
+        client_tracking (opt-in) alza il TTL di L1 a default_ttl: conviene
+        solo con tracking_prefixes limitati alle chiavi lette spesso.
+        """
         self.redis_client = await aioredis.from_url(
             self.redis_url,
             encoding="utf-8",
             decode_responses=False
         )
+        if client_tracking:
+            await self._enable_client_tracking(tracking_prefixes)
+            
+    async def _enable_client_tracking(self, prefixes: Sequence[str] = ()):
+        """
+        Attiva CLIENT TRACKING (Redis 6+) in modalità BCAST sui prefissi
+        indicati (tutte le chiavi se vuoto), con le invalidazioni rediritte
+        su una connessione pub/sub dedicata.
+        Se il server non lo supporta resta il comportamento standard.
+        """
+        client_name = f"dropush-l1-{secrets.token_hex(4)}"
+        try:
+            # Nessun retry: una riconnessione cambierebbe il client id rediretto
+            self._tracking_client = aioredis.from_url(
+                self.redis_url,
+                client_name=client_name,
+                single_connection_client=True,
+                retry=Retry(NoBackoff(), 0)
+            )
+            pubsub = self._tracking_client.pubsub()
+            await pubsub.subscribe('__redis__:invalidate')
+            
+            clients = await self._tracking_client.client_list()
+            redirect_id = next(
+                int(c['id']) for c in clients
+                if c.get('name') == client_name and int(c.get('sub', 0)) > 0
+            )
+            await self._tracking_client.client_tracking_on(
+                clientid=redirect_id, bcast=True, prefix=list(prefixes)
+            )
+        except Exception as e:
+            logger.warning(f"Redis client tracking unavailable: {e}")
+            await self._disable_client_tracking()
+            return
+            
+        self._tracking_task = asyncio.create_task(self._listen_invalidations(pubsub))
+        self._l1_max_ttl = self.default_ttl
+        
+    async def _listen_invalidations(self, pubsub):
+        """Rimuove da L1 le chiavi invalidate da Redis"""
+        try:
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                self._invalidation_epoch += 1
+                keys = message['data']
+                if keys is None:
+                    # FLUSHDB/FLUSHALL
+                    await self.memory_cache.clear()
+                    continue
+                for key in keys:
+                    await self.memory_cache.delete(key.decode() if isinstance(key, bytes) else key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Invalidazioni perse: L1 non è più affidabile
+            logger.warning(f"Redis invalidation stream lost, disabling client tracking: {e}")
+            self._l1_max_ttl = L1_MAX_TTL
+            await self.memory_cache.clear()
+            
+    async def _disable_client_tracking(self):
+        """Ferma il listener e chiude la connessione di tracking"""
+        self._l1_max_ttl = L1_MAX_TTL
+        if self._tracking_task:
+            self._tracking_task.cancel()
+            try:
+                await self._tracking_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._tracking_task = None
+        if self._tracking_client:
+            await self._tracking_client.aclose()
+            self._tracking_client = None
+            
+    async def close(self):
+        """Chiude le connessioni Redis"""
+        await self._disable_client_tracking()
+        if self.redis_client:
+            await self.redis_client.aclose()
         
     async def get(self, key: str) -> Optional[Any]:
         """Get con fallback L1 -> L2"""
@@ -47,11 +220,13 @@ class MultiLevelCache:
             
         # Try L2
         if self.redis_client:
+            epoch = self._invalidation_epoch
             raw_value = await self.redis_client.get(key)
             if raw_value:
-                value = pickle.loads(raw_value)
-                # Populate L1
-                await self.memory_cache.set(key, value, ttl=300)  # 5 min in memory
+                value = _deserialize(raw_value)
+                # Populate L1 (solo se nessuna invalidazione è arrivata durante il GET)
+                if epoch == self._invalidation_epoch:
+                    await self.memory_cache.set(key, value, ttl=self._l1_max_ttl)
                 return value
                 
         return None
@@ -61,12 +236,46 @@ class MultiLevelCache:
         ttl = ttl or self.default_ttl
         
         # Set L1
-        await self.memory_cache.set(key, value, ttl=min(ttl, 300))
+        await self.memory_cache.set(key, value, ttl=min(ttl, self._l1_max_ttl))
+        
+        # Set L2
+        if self.redis_client:
+            await self.redis_client.setex(key, ttl, _serialize(value))
+            
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get batch: L1 con multi_get, miss letti da L2 in un solo MGET"""
+        values = await self.memory_cache.multi_get(keys)
+        missing = [i for i, value in enumerate(values) if value is None]
+        
+        if missing and self.redis_client:
+            epoch = self._invalidation_epoch
+            raw_values = await self.redis_client.mget([keys[i] for i in missing])
+            
+            hits = []
+            for i, raw_value in zip(missing, raw_values):
+                if raw_value:
+                    values[i] = _deserialize(raw_value)
+                    hits.append((keys[i], values[i]))
+                    
+            # Populate L1 (solo se nessuna invalidazione è arrivata durante l'MGET)
+            if hits and epoch == self._invalidation_epoch:
+                await self.memory_cache.multi_set(hits, ttl=self._l1_max_ttl)
+                    
+        return values
+        
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None):
+        """Set batch su entrambi i livelli, L2 in un solo round-trip"""
+        ttl = ttl or self.default_ttl
+        
+        # Set L1
+        await self.memory_cache.multi_set(list(items.items()), ttl=min(ttl, self._l1_max_ttl))
         
         # Set L2
         if self.redis_client:
-            serialized = pickle.dumps(value)
-            await self.redis_client.setex(key, ttl, serialized)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, _serialize(value))
+                await pipe.execute()
             
     async def delete(self, key: str):
         """Delete da entrambi i livelli"""
@@ -75,25 +284,45 @@ class MultiLevelCache:
             await self.redis_client.delete(key)
             
     def make_key(self, prefix: str, *args, **kwargs) -> str:
-        """Genera cache key deterministico"""
-        key_data = f"{prefix}:{str(args)}:{str(sorted(kwargs.items()))}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        """Genera cache key deterministico: prefix leggibile + digest a 64 bit"""
+        # JSON canonico (chiavi ordinate): argomenti uguali -> stessi byte,
+        # a differenza di pickle che dipende dalla condivisione degli oggetti.
+        # Argomenti non canonicalizzabili sollevano TypeError: una chiave
+        # instabile non colpirebbe mai L2
+        buf = orjson.dumps((args, kwargs), option=_KEY_OPTIONS, default=_key_default)
+        # No hash(): randomizzato per processo, e L2 (Redis) è condiviso
+        return f"{prefix}:{hashlib.blake2b(buf, digest_size=8).hexdigest()}"
 
-def cached(ttl: int = 3600, key_prefix: str = None):
+def cached(ttl: int = 3600, key_prefix: str = None, key: Optional[Callable[..., Any]] = None):
     """
     Decorator per caching automatico
     Ispirato a leonsk/cachier
+
+    key: callable opzionale che riceve gli argomenti della chiamata e ne
+    restituisce la parte rilevante per la chiave. Senza key tutti gli
+    argomenti (self/cls compresi) entrano nel digest: le istanze devono
+    esporre __cache_key__().
     """
     def decorator(func: Callable):
+        # qualname: metodi omonimi di classi diverse restano distinti
+        prefix = key_prefix or func.__qualname__
+        
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Skip cache if requested
             if kwargs.pop('skip_cache', False):
                 return await func(*args, **kwargs)
                 
-            # Generate cache key
-            prefix = key_prefix or func.__name__
-            cache_key = cache.make_key(prefix, *args, **kwargs)
+            cache = get_cache()
+            
+            # Generate cache key (senza argomenti basta il prefix)
+            if key is not None:
+                cache_key = cache.make_key(prefix, key(*args, **kwargs))
+            elif not args and not kwargs:
+                cache_key = prefix
+            else:
+                cache_key = cache.make_key(prefix, *args, **kwargs)
             
             # Try cache
             cached_value = await cache.get(cache_key)
@@ -108,5 +337,8 @@ def cached(ttl: int = 3600, key_prefix: str = None):
         return wrapper
     return decorator
 
-# Global cache instance
-cache = MultiLevelCache(redis_url="redis://localhost:6379")
+# Global cache instance (creata al primo utilizzo)
+@lru_cache(maxsize=None)
+def get_cache() -> MultiLevelCache:
+    """Get global cache instance"""
+    return MultiLevelCache(redis_url=os.environ.get('REDIS_URL', 'redis://localhost:6379'))
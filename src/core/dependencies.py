@@ -3,15 +3,26 @@ Dependency Injection Container Async
 Basato su: tiangolo/fastapi e aiomisc patterns
 Ref: https://github.com/tiangolo/fastapi
 """
-from typing import Any, Dict, Type, TypeVar, Protocol, Optional, Callable, Union
-from abc import ABC, abstractmethod
+from typing import Any, Dict, Protocol, Optional, Callable
 import asyncio
-from functools import lru_cache
+import sys
+from functools import wraps
+import inspect
 import logging
 
 logger = logging.getLogger(__name__)
 
-T = TypeVar('T')
+# Python 3.12+: i task partono subito, chi termina senza sospendersi
+# non passa dallo scheduler
+_eager_task_factory = getattr(asyncio, 'eager_task_factory', None)
+
+
+def create_eager_task(coro) -> asyncio.Task:
+    """Crea un task eager se supportato, altrimenti un task normale"""
+    loop = asyncio.get_running_loop()
+    if _eager_task_factory is not None:
+        return _eager_task_factory(loop, coro)
+    return loop.create_task(coro)
 
 
 class ServiceProtocol(Protocol):
@@ -20,6 +31,16 @@ class ServiceProtocol(Protocol):
     async def stop(self) -> None: ...
 
 
+class _ServiceEntry:
+    """Registrazione di un servizio: factory, flag singleton e istanza"""
+    __slots__ = ('factory', 'singleton', 'instance')
+    
+    def __init__(self, factory: Callable, singleton: bool):
+        self.factory = factory
+        self.singleton = singleton
+        self.instance = None
+
+
 class DIContainer:
     """
     Dependency Injection Container async-first con lifecycle management
@@ -27,9 +48,7 @@ class DIContainer:
     """
     
     def __init__(self):
-        self._services: Dict[str, Any] = {}
-        self._factories: Dict[str, Callable] = {}
-        self._singletons: Dict[str, Any] = {}
+        self._registry: Dict[str, _ServiceEntry] = {}
         self._is_started = False
     
     def register(
@@ -46,9 +65,7 @@ class DIContainer:
             factory: Factory function per creare il servizio
             singleton: Se True, crea una sola istanza
         """
-        self._factories[name] = factory
-        if singleton:
-            self._singletons[name] = None
+        self._registry[sys.intern(name)] = _ServiceEntry(factory, singleton)
     
     async def resolve(self, name: str) -> Any:
         """
@@ -60,21 +77,21 @@ class DIContainer:
         Returns:
             Istanza del servizio
         """
-        # Se è un singleton già creato, restituiscilo
-        if name in self._singletons and self._singletons[name] is not None:
-            return self._singletons[name]
-        
-        # Se non c'è factory, errore
-        if name not in self._factories:
+        # Un solo lookup: entry con factory, flag singleton e istanza
+        entry = self._registry.get(name)
+        if entry is None:
             raise ValueError(f"Service '{name}' not registered")
         
+        # Se è un singleton già creato, restituiscilo
+        if entry.instance is not None:
+            return entry.instance
+        
         # Crea istanza
-        factory = self._factories[name]
-        instance = factory()
+        instance = entry.factory()
         
         # Se è un singleton, salvalo
-        if name in self._singletons:
-            self._singletons[name] = instance
+        if entry.singleton:
+            entry.instance = instance
         
         return instance
     
@@ -86,12 +103,14 @@ class DIContainer:
         logger.info("Starting DI container services...")
         
         # Risolvi tutti i singleton
-        for name in self._singletons:
-            if self._singletons[name] is None:
-                self._singletons[name] = await self.resolve(name)
-        
-        # Avvia servizi che implementano start()
-        for name, service in self._singletons.items():
+        for name, entry in self._registry.items():
+            if entry.singleton and entry.instance is None:
+                await self.resolve(name)
+        
+        # Avvia servizi che implementano start(), in ordine di registrazione:
+        # un servizio può dipendere da quelli registrati prima
+        for name, entry in self._registry.items():
+            service = entry.instance
             if service and hasattr(service, 'start'):
                 logger.info(f"Starting service: {name}")
                 await service.start()
@@ -107,7 +126,8 @@ class DIContainer:
         logger.info("Stopping DI container services...")
         
         # Ferma in ordine inverso
-        for name, service in reversed(list(self._singletons.items())):
+        for name in reversed(self._registry):
+            service = self._registry[name].instance
             if service and hasattr(service, 'stop'):
                 logger.info(f"Stopping service: {name}")
                 try:
@@ -120,13 +140,14 @@ class DIContainer:
     
     def get_service(self, name: str) -> Any:
         """Get service sincrono (per compatibilità)"""
-        if name in self._singletons and self._singletons[name] is not None:
-            return self._singletons[name]
-        
-        if name not in self._factories:
+        entry = self._registry.get(name)
+        if entry is None:
             raise ValueError(f"Service '{name}' not registered")
         
-        return self._factories[name]()
+        if entry.instance is not None:
+            return entry.instance
+        
+        return entry.factory()
 
 
 # Alias per compatibilità
@@ -155,11 +176,20 @@ def inject(container: DIContainer):
             ...
     """
     def decorator(func):
+        # Parametri Depends calcolati una volta sola, alla decorazione
+        deps = [
+            (index, param.name, param.default.service_name)
+            for index, param in enumerate(inspect.signature(func).parameters.values())
+            if isinstance(param.default, Depends)
+        ]
+        
+        @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Risolvi dipendenze
-            for key, value in kwargs.items():
-                if hasattr(value, '__name__') and value.__name__ == 'Depends':
-                    service_name = value.args[0]
+            # Risolvi dipendenze non passate dal chiamante
+            for index, key, service_name in deps:
+                if index < len(args):
+                    continue
+                if key not in kwargs or isinstance(kwargs[key], Depends):
                     kwargs[key] = await container.resolve(service_name)
             
             return await func(*args, **kwargs)
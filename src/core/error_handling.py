@@ -91,6 +91,10 @@ def with_error_handling(func):
         try:
             return await func(*args, **kwargs)
         except Exception as e:
+            if not error_handler._initialized:
+                # Sentry disabilitato: solo log, senza formattare il contesto
+                error_handler.capture_exception(e)
+                raise
             error_handler.capture_exception(e, {
                 'function': func.__name__,
                 'args': str(args),
@@ -25,6 +25,7 @@ class ListingConfig(BaseSettings):
     model_title: str = Field('salesforce/bart-large-mnli')
     model_description: str = Field('microsoft/DialoGPT-medium', alias='MODEL_DESC')
     model_sentiment: str = Field('distilbert-base-multilingual-cased')
+    fast_keywords: bool = Field(False)  # TF-IDF al posto della NER anche su GPU
     
     # Template Configuration
     template_base_path: str = Field('./templates', alias='TEMPLATE_PATH')
@@ -46,6 +47,11 @@ class ListingConfig(BaseSettings):
             raise ValueError('Redis URL must start with redis:// or rediss://')
         return v
     
+    def override(self, **changes) -> 'ListingConfig':
+        """Copia con override fidati (per-request/hot-reload) senza rileggere
+        .env e senza rivalidare: nessun round-trip di serializzazione"""
+        return self.model_copy(update=changes)
+    
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding='utf-8',
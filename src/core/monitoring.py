@@ -9,7 +9,7 @@ from prometheus_client import (
 )
 import time
 from functools import wraps
-from typing import Callable, Any
+from typing import Callable, Any, Dict, Iterable, Optional, Tuple
 import asyncio
 
 # Define metrics
@@ -56,6 +56,19 @@ business_metrics = Gauge(
     ['metric_name']
 )
 
+# Metriche generiche della pipeline (batch processor, GPU), per nome
+pipeline_events_total = Counter(
+    'pipeline_events_total',
+    'Pipeline counters',
+    ['metric_name']
+)
+
+pipeline_values = Gauge(
+    'pipeline_values',
+    'Pipeline gauges',
+    ['metric_name']
+)
+
 class MetricsCollector:
     """Collector centralizzato per metriche"""
     
@@ -69,13 +82,48 @@ class MetricsCollector:
             start_http_server(self.port)
             self._server_started = True
             
+    async def increment(self, name: str, value: float = 1, tags: Optional[Dict[str, str]] = None):
+        """Incrementa un contatore della pipeline (tags ignorati: label fisse)"""
+        pipeline_events_total.labels(metric_name=name).inc(value)
+        
+    async def gauge(self, name: str, value: float, tags: Optional[Dict[str, str]] = None):
+        """Imposta un gauge della pipeline"""
+        pipeline_values.labels(metric_name=name).set(value)
+        
+    async def submit_many(self, entries: Iterable[Tuple[str, str, float]]):
+        """
+        Invia più metriche in una sola chiamata
+        
+        Args:
+            entries: tuple (name, kind, value) con kind 'gauge' o 'counter'
+        """
+        for name, kind, value in entries:
+            if kind == 'gauge':
+                pipeline_values.labels(metric_name=name).set(value)
+            else:
+                pipeline_events_total.labels(metric_name=name).inc(value)
+            
     @staticmethod
     def track_listing_creation(marketplace: str, category: str):
         """Decorator per tracking creazione listing"""
+        # Child metrics risolti una volta, non a ogni chiamata
+        created = {
+            status: listing_created_total.labels(
+                marketplace=marketplace,
+                category=category,
+                status=status
+            )
+            for status in ("success", "failed")
+        }
+        duration = listing_creation_duration.labels(
+            marketplace=marketplace,
+            step="total"
+        )
+        
         def decorator(func: Callable) -> Callable:
             @wraps(func)
             async def async_wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = time.perf_counter()
                 status = "success"
                 
                 try:
@@ -86,20 +134,12 @@ class MetricsCollector:
                     raise
                 finally:
                     # Record metrics
-                    listing_created_total.labels(
-                        marketplace=marketplace,
-                        category=category,
-                        status=status
-                    ).inc()
-                    
-                    listing_creation_duration.labels(
-                        marketplace=marketplace,
-                        step="total"
-                    ).observe(time.time() - start_time)
+                    created[status].inc()
+                    duration.observe(time.perf_counter() - start_time)
                     
             @wraps(func)
             def sync_wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = time.perf_counter()
                 status = "success"
                 
                 try:
@@ -109,16 +149,8 @@ class MetricsCollector:
                     status = "failed"
                     raise
                 finally:
-                    listing_created_total.labels(
-                        marketplace=marketplace,
-                        category=category,
-                        status=status
-                    ).inc()
-                    
-                    listing_creation_duration.labels(
-                        marketplace=marketplace,
-                        step="total"
-                    ).observe(time.time() - start_time)
+                    created[status].inc()
+                    duration.observe(time.perf_counter() - start_time)
                     
             return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
         return decorator
@@ -126,6 +158,15 @@ class MetricsCollector:
     @staticmethod
     def track_api_request(endpoint: str, method: str):
         """Decorator per tracking API requests"""
+        requests_by_status = {
+            status: api_requests_total.labels(
+                endpoint=endpoint,
+                method=method,
+                status=status
+            )
+            for status in ("success", "error")
+        }
+        
         def decorator(func: Callable) -> Callable:
             @wraps(func)
             async def wrapper(*args, **kwargs):
@@ -137,27 +178,23 @@ class MetricsCollector:
                     status = "error"
                     raise
                 finally:
-                    api_requests_total.labels(
-                        endpoint=endpoint,
-                        method=method,
-                        status=status
-                    ).inc()
+                    requests_by_status[status].inc()
             return wrapper
         return decorator
         
     @staticmethod
     def track_cache(cache_type: str):
         """Track cache hits/misses"""
+        hit_counter = cache_hits_total.labels(cache_type=cache_type, hit="hit")
+        miss_counter = cache_hits_total.labels(cache_type=cache_type, hit="miss")
+        
         def decorator(func: Callable) -> Callable:
             @wraps(func)
             async def wrapper(*args, **kwargs):
                 # Assuming function returns (value, hit)
                 result, hit = await func(*args, **kwargs)
                 
-                cache_hits_total.labels(
-                    cache_type=cache_type,
-                    hit="hit" if hit else "miss"
-                ).inc()
+                (hit_counter if hit else miss_counter).inc()
                 
                 return result
             return wrapper
@@ -171,13 +208,13 @@ class MetricsCollector:
     @staticmethod
     def track_ai_operation(model: str, operation: str):
         """Track AI model operations"""
+        # Child metric risolto una volta, non a ogni chiamata
+        child = ai_model_predictions.labels(model=model, operation=operation)
+        
         def decorator(func: Callable) -> Callable:
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                with ai_model_predictions.labels(
-                    model=model,
-                    operation=operation
-                ).time():
+                with child.time():
                     return await func(*args, **kwargs)
             return wrapper
         return decorator
@@ -14,6 +14,7 @@ from tenacity import (
     before_sleep_log
 )
 import logging
+from functools import lru_cache
 from typing import Type, Tuple, Optional
 from requests.exceptions import HTTPError, ConnectionError, Timeout
 
@@ -37,9 +38,14 @@ class DatabaseError(Exception):
     pass
 
 class RetryManager:
-    """Manager centralizzato per retry policies"""
+    """Manager centralizzato per retry policies
+    
+    I decorator sono costruiti una volta per configurazione (lru_cache):
+    la stessa config restituisce la stessa istanza.
+    """
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def standard_retry(
         max_attempts: int = 5,
         wait_min: int = 1,
@@ -57,6 +63,7 @@ class RetryManager:
         )
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def api_retry():
         """Retry specifico per API calls"""
         return retry(
@@ -72,6 +79,7 @@ class RetryManager:
         )
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def database_retry():
         """Retry per operazioni database"""
         return retry(
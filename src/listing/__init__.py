@@ -2,9 +2,10 @@
 from .template_engine import AdvancedTemplateEngine
 from .template_factory import TemplateFactory, TemplateBuilder
 from .ai_optimizer import AIListingOptimizer, OptimizationResult
-from .sales_predictor import SalesPredictor
+from .sales_predictor import SalesPredictor, FastSeasonalPredictor
 from .publisher import PublisherProtocol, BasePublisher, PublishResult, PublishStatus
 from .ebay_publisher import EbayPublisher
+from .ebay_client import EbayTradingClient
 from .queue_manager import PublishingQueue, Priority
 
 __all__ = [
@@ -14,11 +15,13 @@ __all__ = [
     'AIListingOptimizer',
     'OptimizationResult',
     'SalesPredictor',
+    'FastSeasonalPredictor',
     'PublisherProtocol',
     'BasePublisher',
     'PublishResult',
     'PublishStatus',
     'EbayPublisher',
+    'EbayTradingClient',
     'PublishingQueue',
     'Priority'
 ]
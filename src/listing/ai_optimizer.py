@@ -17,10 +17,99 @@ from transformers import (
 )
 from typing import Dict, List, Optional, Tuple, Any
 import asyncio
+import contextlib
+import hashlib
+import json
+import functools
+import importlib.util
+import threading
+import weakref
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-import numpy as np
 from src.core.listing_config import ListingConfig
-from src.core.cache_system import cache
+from src.core.cache_system import get_cache
+
+# int8 su GPU solo se bitsandbytes è installato (opzionale)
+_HAS_BITSANDBYTES = importlib.util.find_spec("bitsandbytes") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _cuda_device() -> int:
+    """Device per le pipeline; probe CUDA (cuInit) una sola volta per processo"""
+    return 0 if torch.cuda.is_available() else -1
+
+
+@functools.lru_cache(maxsize=None)
+def _cuda_dtype() -> torch.dtype:
+    """
+    Precisione ridotta su GPU (come _autocast_dtype in gpu_optimizer):
+    BF16 solo dove supportato (Ampere+), FP16 su T4/V100 e precedenti
+    """
+    return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+
+# Parole che alzano il CTR del titolo
+_CTR_MAGIC_WORDS = ('nuovo', 'offerta', 'gratis')
+_CONFIDENCE_FIELDS = ('name', 'description', 'features', 'category')
+
+# Prompt descrizione per lingua (tokenizzati una volta, vedi _prompt_ids)
+PROMPTS: Dict[str, str] = {
+    "it": "Descrivi questo prodotto in modo accattivante:",
+    "en": "Describe this product in an engaging way:",
+    "de": "Beschreiben Sie dieses Produkt ansprechend:",
+    "fr": "Décrivez ce produit de manière attrayante:",
+    "es": "Describe este producto de manera atractiva:"
+}
+
+# Keywords aggiuntive per categoria
+_CATEGORY_KEYWORDS: Dict[str, frozenset] = {
+    "jewelry": frozenset(("gioielli", "elegante", "regalo")),
+    "electronics": frozenset(("tecnologia", "innovativo", "smart")),
+}
+
+
+def _ctr_kernel(title_len: int, has_magic_word: bool, n_keywords: int, sentiment: float) -> float:
+    """Stima CTR dalle feature già estratte"""
+    # Base CTR
+    ctr = 0.02  # 2% base
+    
+    # Title factors
+    if title_len < 60:
+        ctr += 0.005  # Short titles perform better
+    if has_magic_word:
+        ctr += 0.01
+        
+    # Keyword factors
+    ctr += min(n_keywords * 0.001, 0.01)  # More keywords = better
+    
+    # Sentiment factor
+    ctr += sentiment * 0.01
+    
+    return min(ctr, 0.15)  # Cap at 15%
+
+
+def _confidence_kernel(present: int, description_len: int, n_features: int) -> float:
+    """Confidence score dalle feature già estratte"""
+    score = 0.5  # Base
+    
+    # Data completeness
+    score += (present / len(_CONFIDENCE_FIELDS)) * 0.3
+    
+    # Data quality
+    if description_len > 100:
+        score += 0.1
+    if n_features >= 3:
+        score += 0.1
+        
+    return min(score, 1.0)
+
+
+def _fingerprint(data: Dict[str, Any]) -> str:
+    """Digest stabile tra processi (hash() è randomizzato per interprete)"""
+    canonical = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
 
 @dataclass
 class OptimizationResult:
@@ -39,46 +128,131 @@ class AIListingOptimizer:
     
     def __init__(self, config: ListingConfig, cache: Optional[Any] = None):
         self.config = config
-        self.cache = cache or cache
-        self.device = 0 if torch.cuda.is_available() else -1
-        self._models_loaded = False
+        self.cache = cache or get_cache()
+        self.device = _cuda_device()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Serializza il primo caricamento dei modelli tra i worker
+        self._load_lock = threading.Lock()
+        # Su GPU pesi e attivazioni in BF16 (FP16 se la GPU non lo supporta)
+        self._dtype = _cuda_dtype() if self.device >= 0 else None
         
     async def initialize(self):
-        """Inizializza modelli AI async"""
-        await asyncio.get_event_loop().run_in_executor(
-            None, self._load_models
-        )
-        
-    def _load_models(self):
-        """Carica modelli HuggingFace"""
-        # Title Generation - BART
-        self.title_generator = pipeline(
+        """Inizializza l'executor; i modelli si caricano al primo uso"""
+        if self._executor is None:
+            # Un worker per modello in parallelo (title, description, keywords)
+            self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="ai-optimizer")
+            # Il finalizer referenzia solo l'executor, non self: niente cicli
+            self._executor_finalizer = weakref.finalize(self, self._executor.shutdown, wait=False)
+        
+    async def shutdown(self):
+        """Chiude l'executor; un successivo optimize_listing lo ricrea"""
+        if self._executor is not None:
+            self._executor_finalizer.detach()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        
+    # Modelli HuggingFace lazy: caricati al primo accesso, dal thread
+    # dell'executor, così i processi che non li usano non li allocano
+    
+    @cached_property
+    def title_generator(self):
+        """Title Generation - BART"""
+        return pipeline(
             "summarization",
             model=self.config.model_title,
             device=self.device,
+            torch_dtype=self._dtype,
             max_length=80,
             min_length=30
         )
         
-        # Description Generation - DialoGPT
-        self.desc_tokenizer = AutoTokenizer.from_pretrained(self.config.model_description)
-        self.desc_model = AutoModelForCausalLM.from_pretrained(self.config.model_description)
-        
-        # Sentiment Analysis - DistilBERT Multilingual
-        self.sentiment_analyzer = pipeline(
+    @cached_property
+    def desc_tokenizer(self):
+        """Tokenizer Description Generation - DialoGPT"""
+        return AutoTokenizer.from_pretrained(self.config.model_description)
+        
+    @cached_property
+    def desc_model(self):
+        """Description Generation - DialoGPT (int8 su GPU con bitsandbytes)"""
+        if self.device >= 0 and _HAS_BITSANDBYTES:
+            return AutoModelForCausalLM.from_pretrained(
+                self.config.model_description,
+                load_in_8bit=True,
+                device_map="auto"
+            )
+        return AutoModelForCausalLM.from_pretrained(self.config.model_description)
+        
+    @cached_property
+    def sentiment_analyzer(self):
+        """Sentiment Analysis - DistilBERT Multilingual, pesi int8"""
+        if self.device < 0:
+            # CPU: quantizzazione dinamica dei layer Linear
+            model = torch.quantization.quantize_dynamic(
+                AutoModelForSequenceClassification.from_pretrained(self.config.model_sentiment),
+                {torch.nn.Linear},
+                dtype=torch.qint8
+            )
+            return pipeline(
+                "sentiment-analysis",
+                model=model,
+                tokenizer=self.config.model_sentiment,
+                device=self.device
+            )
+        if _HAS_BITSANDBYTES:
+            model = AutoModelForSequenceClassification.from_pretrained(
+                self.config.model_sentiment,
+                load_in_8bit=True,
+                device_map="auto"
+            )
+            return pipeline(
+                "sentiment-analysis",
+                model=model,
+                tokenizer=self.config.model_sentiment
+            )
+        return pipeline(
             "sentiment-analysis",
             model=self.config.model_sentiment,
-            device=self.device
+            device=self.device,
+            torch_dtype=self._dtype
         )
         
-        # Keyword Extraction
-        self.keyword_extractor = pipeline(
+    @cached_property
+    def keyword_extractor(self):
+        """Keyword Extraction"""
+        return pipeline(
             "token-classification",
             model="dslim/bert-base-NER",
-            device=self.device
+            device=self.device,
+            torch_dtype=self._dtype,
+            # Entità già aggregate a livello di parola (niente frammenti ##)
+            aggregation_strategy="simple",
+            batch_size=8
         )
         
-        self._models_loaded = True
+    @contextlib.contextmanager
+    def _infer_ctx(self):
+        """Inference senza autograd; autocast BF16/FP16 su GPU"""
+        with torch.inference_mode():
+            if self.device >= 0:
+                with torch.autocast("cuda", dtype=self._dtype):
+                    yield
+            else:
+                yield
+        
+    def _model(self, name: str):
+        """Modello lazy con double-checked locking: caricato una sola volta
+        anche con richieste concorrenti su un worker appena avviato"""
+        model = self.__dict__.get(name)
+        if model is None:
+            with self._load_lock:
+                model = getattr(self, name)
+        return model
+        
+    def _infer(self, model_name: str, *args, **kwargs):
+        """Esegue un modello nel thread dell'executor (carica al primo uso)"""
+        model = self._model(model_name)
+        with self._infer_ctx():
+            return model(*args, **kwargs)
         
     async def optimize_listing(
         self,
@@ -89,20 +263,23 @@ class AIListingOptimizer:
         """
         Ottimizza listing completo con AI
         """
-        if not self._models_loaded:
+        if self._executor is None:
             await self.initialize()
             
         # Check cache
         if self.cache:
-            cache_key = f"ai_opt:{hash(str(product_data))}:{target_marketplace}:{language}"
+            cache_key = f"ai_opt:{_fingerprint(product_data)}:{target_marketplace}:{language}"
             cached = await self.cache.get(cache_key)
             if cached:
                 return OptimizationResult(**cached)
                 
-        # Generate optimized components
-        title = await self._generate_title(product_data, target_marketplace)
-        description = await self._generate_description(product_data, language)
-        keywords = await self._extract_keywords(product_data)
+        # Generate optimized components (indipendenti tra loro, in parallelo)
+        title, description, keywords = await asyncio.gather(
+            self._generate_title(product_data, target_marketplace),
+            self._generate_description(product_data, language),
+            self._extract_keywords(product_data)
+        )
+        # Sentiment dipende dalla descrizione
         sentiment = await self._analyze_sentiment(description)
         ctr = self._estimate_ctr(title, keywords, sentiment)
         
@@ -134,9 +311,9 @@ class AIListingOptimizer:
         """
         
         # Generate with BART
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: self.title_generator(context, max_length=80, do_sample=False)
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            functools.partial(self._infer, "title_generator", context, max_length=80, do_sample=False)
         )
         
         title = result[0]['summary_text']
@@ -156,35 +333,15 @@ class AIListingOptimizer:
     async def _generate_description(self, product_data: Dict, language: str) -> str:
         """Genera descrizione persuasiva multilingua"""
         # Prepare prompt based on language
-        prompts = {
-            "it": "Descrivi questo prodotto in modo accattivante:",
-            "en": "Describe this product in an engaging way:",
-            "de": "Beschreiben Sie dieses Produkt ansprechend:",
-            "fr": "Décrivez ce produit de manière attrayante:",
-            "es": "Describe este producto de manera atractiva:"
-        }
-        
-        prompt = prompts.get(language, prompts["en"])
-        context = f"{prompt}\n{product_data.get('name', '')}\n"
-        
-        # Tokenize
-        inputs = self.desc_tokenizer.encode(context, return_tensors="pt")
-        
-        # Generate
-        with torch.no_grad():
-            outputs = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.desc_model.generate(
-                    inputs,
-                    max_length=500,
-                    num_beams=5,
-                    temperature=0.8,
-                    do_sample=True,
-                    top_p=0.9
-                )
-            )
-            
-        description = self.desc_tokenizer.decode(outputs[0], skip_special_tokens=True)
+        if language not in PROMPTS:
+            language = "en"
+        name = product_data.get('name', '')
+        context = f"{PROMPTS[language]}\n{name}\n"
+        
+        # Tokenize, generate e decode nel thread dell'executor
+        description = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._generate_text, language, name
+        )
         
         # Clean and format
         description = description.replace(context, "").strip()
@@ -203,36 +360,62 @@ class AIListingOptimizer:
             
         return description
         
+    @cached_property
+    def _prompt_ids(self) -> Dict[str, torch.Tensor]:
+        """Prompt per lingua già tokenizzati"""
+        return {
+            lang: self.desc_tokenizer.encode(prompt, return_tensors="pt")
+            for lang, prompt in PROMPTS.items()
+        }
+        
+    def _generate_text(self, language: str, name: str) -> str:
+        """Generazione DialoGPT sincrona (eseguita nell'executor)"""
+        tokenizer = self._model("desc_tokenizer")
+        model = self._model("desc_model")
+        
+        # Tokenize: solo il nome, il prompt è già codificato
+        name_ids = tokenizer.encode(f"\n{name}\n", return_tensors="pt")
+        inputs = torch.cat([self._model("_prompt_ids")[language], name_ids], dim=1).to(model.device)
+        
+        # Generate
+        with self._infer_ctx():
+            outputs = model.generate(
+                inputs,
+                max_length=500,
+                num_beams=5,
+                temperature=0.8,
+                do_sample=True,
+                top_p=0.9
+            )
+            
+        return tokenizer.decode(outputs[0], skip_special_tokens=True)
+        
     async def _extract_keywords(self, product_data: Dict) -> List[str]:
         """Estrae keywords rilevanti con NER"""
         text = f"{product_data.get('name', '')} {product_data.get('description', '')}"
         
         # Extract entities
-        entities = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: self.keyword_extractor(text)
+        entities = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._infer, "keyword_extractor", text
         )
         
         # Extract unique keywords
-        keywords = set()
-        for entity in entities:
-            if entity['score'] > 0.8:
-                keywords.add(entity['word'].lower())
+        keywords = {entity['word'].lower() for entity in entities if entity['score'] > 0.8}
                 
         # Add category-specific keywords
-        category = product_data.get('category', '').lower()
-        if category == "jewelry":
-            keywords.update(['gioielli', 'elegante', 'regalo'])
-        elif category == "electronics":
-            keywords.update(['tecnologia', 'innovativo', 'smart'])
+        extra = _CATEGORY_KEYWORDS.get(product_data.get('category', '').lower())
+        if extra:
+            keywords |= extra
             
         return list(keywords)[:10]  # Max 10 keywords
         
     async def _analyze_sentiment(self, text: str) -> float:
         """Analizza sentiment del testo"""
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: self.sentiment_analyzer(text[:512])  # Truncate for model
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            self._infer,
+            "sentiment_analyzer",
+            text[:512]  # Truncate for model
         )
         
         # Convert to score 0-1
@@ -248,36 +431,15 @@ class AIListingOptimizer:
             
     def _estimate_ctr(self, title: str, keywords: List[str], sentiment: float) -> float:
         """Stima CTR basato su features"""
-        # Base CTR
-        ctr = 0.02  # 2% base
-        
-        # Title factors
-        if len(title) < 60:
-            ctr += 0.005  # Short titles perform better
-        if any(word in title.lower() for word in ['nuovo', 'offerta', 'gratis']):
-            ctr += 0.01
-            
-        # Keyword factors
-        ctr += min(len(keywords) * 0.001, 0.01)  # More keywords = better
-        
-        # Sentiment factor
-        ctr += sentiment * 0.01
-        
-        return min(ctr, 0.15)  # Cap at 15%
+        title_lower = title.lower()
+        has_magic_word = any(word in title_lower for word in _CTR_MAGIC_WORDS)
+        return _ctr_kernel(len(title), has_magic_word, len(keywords), sentiment)
         
     def _calculate_confidence(self, product_data: Dict) -> float:
         """Calcola confidence score"""
-        score = 0.5  # Base
-        
-        # Data completeness
-        required_fields = ['name', 'description', 'features', 'category']
-        present = sum(1 for f in required_fields if product_data.get(f))
-        score += (present / len(required_fields)) * 0.3
-        
-        # Data quality
-        if len(product_data.get('description', '')) > 100:
-            score += 0.1
-        if len(product_data.get('features', [])) >= 3:
-            score += 0.1
-            
-        return min(score, 1.0)
+        present = sum(1 for f in _CONFIDENCE_FIELDS if product_data.get(f))
+        return _confidence_kernel(
+            present,
+            len(product_data.get('description', '')),
+            len(product_data.get('features', []))
+        )
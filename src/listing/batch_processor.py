@@ -4,15 +4,14 @@ Ottimizzato per throughput elevato (target: 1000+ listings/minuto)
 Basato su: asyncio.gather, concurrent.futures, backpressure control
 """
 import asyncio
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-from typing import List, Dict, Any, Optional, Callable, TypeVar, Union, AsyncGenerator
+from typing import List, Dict, Any, Optional, Callable, TypeVar, Union, AsyncGenerator, Tuple
 from dataclasses import dataclass
 import time
 import logging
-from functools import partial
-import multiprocessing as mp
+import os
+import random
 
-from src.core.dependencies import DIContainer
+from src.core.dependencies import DIContainer, create_eager_task
 from src.listing.ai_optimizer import AIListingOptimizer, OptimizationResult
 from src.listing.template_engine import AdvancedTemplateEngine
 from src.core.monitoring import MetricsCollector
@@ -36,12 +35,85 @@ class BatchResult:
 class BatchConfig:
     """Configurazione batch processing"""
     batch_size: int = 100
-    max_workers: int = mp.cpu_count()
+    max_workers: int = 32  # thread: costo per worker trascurabile
     max_concurrent_batches: int = 4
     enable_gpu: bool = True
     timeout_per_item: float = 5.0
     retry_failed: bool = True
     backpressure_threshold: int = 1000
+    max_batch_wait_s: float = 0.05  # stream: flush finestra parziale dopo questo tempo
+    auto_tune: bool = True  # adatta batch_size al throughput osservato
+    gpu_batch_multiplier: int = 4  # GPU: costo fisso alto, batch più grandi
+    gpu_complexity_threshold: int = 200  # item più complessi vanno su GPU
+    min_gpu_batch: int = 8  # sotto questa soglia il costo fisso GPU non rende
+
+
+@dataclass(slots=True)
+class Product:
+    """Campi del prodotto usati dalla pipeline GPU, accesso per attributo"""
+    title: str
+    description: str
+    category: str = 'General'
+    
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'Product':
+        return cls(
+            item.get('title', ''),
+            item.get('description', ''),
+            item.get('category', 'General')
+        )
+
+
+class BatchSizeTuner:
+    """
+    Hill climbing sul batch size guidato dal throughput osservato
+    
+    Continua nella stessa direzione finché il throughput sale, inverte
+    quando scende, resta fermo sul plateau. Override da env:
+    - DROPUSH_BATCH_SIZE: batch size fisso (disabilita il tuning)
+    - DROPUSH_BATCH_MULTIPLE: arrotonda il batch size a un multiplo
+    """
+    
+    STEP = 1.25
+    TOLERANCE = 0.05
+    
+    def __init__(self, initial: int, min_size: int = 1, max_size: int = 10000):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.multiple = max(1, int(os.environ.get('DROPUSH_BATCH_MULTIPLE', 1)))
+        
+        fixed = os.environ.get('DROPUSH_BATCH_SIZE')
+        self.enabled = fixed is None
+        self.size = self._round(int(fixed) if fixed else initial)
+        
+        self._direction = 1
+        self._last_throughput: Optional[float] = None
+    
+    def _round(self, size: float) -> int:
+        size = max(self.min_size, min(self.max_size, int(size)))
+        return max(self.multiple, size // self.multiple * self.multiple)
+    
+    def update(self, throughput: float) -> int:
+        """Registra il throughput del batch size corrente e sceglie il prossimo"""
+        if not self.enabled or throughput <= 0:
+            return self.size
+        
+        last = self._last_throughput
+        self._last_throughput = throughput
+        
+        if last is not None:
+            if throughput < last * (1 - self.TOLERANCE):
+                self._direction = -self._direction
+            elif throughput <= last * (1 + self.TOLERANCE):
+                # Plateau: il batch size corrente va bene
+                return self.size
+        
+        factor = self.STEP if self._direction > 0 else 1 / self.STEP
+        new_size = self._round(self.size * factor)
+        if new_size == self.size:
+            new_size = self._round(self.size + self._direction * self.multiple)
+        self.size = new_size
+        return self.size
 
 
 class BatchProcessor:
@@ -49,7 +121,7 @@ class BatchProcessor:
     Batch processor ad alte performance per listing automation
     
     Features:
-    - Elaborazione parallela multi-processo
+    - Elaborazione concorrente async (I/O bound)
     - Backpressure control per evitare memory overflow
     - GPU acceleration quando disponibile
     - Retry automatico su failure
@@ -64,20 +136,28 @@ class BatchProcessor:
         self.container = container
         self.config = config or BatchConfig()
         
-        # Executor pools
-        self.process_pool = ProcessPoolExecutor(max_workers=self.config.max_workers)
-        self.thread_pool = ThreadPoolExecutor(max_workers=self.config.max_workers * 2)
-        
         # Components
         self.ai_optimizer = AIListingOptimizer(container)
         self.template_engine = AdvancedTemplateEngine(container)
         self.metrics = container.resolve('metrics')
+        # Task metriche in volo (riferimento forte fino al completamento)
+        self._background_tasks: set = set()
         
-        # Backpressure control
-        self._processing_semaphore = asyncio.Semaphore(
-            self.config.backpressure_threshold
-        )
+        # Backpressure control: contatore + Condition, capacità ridimensionabile
         self._active_tasks = 0
+        self._capacity = self.config.backpressure_threshold
+        self._capacity_cond = asyncio.Condition()
+        
+        # GPU optimizer creato una volta sola, al primo batch GPU
+        self._gpu_optimizer = None
+        self._gpu_available: Optional[bool] = None
+        self._gpu_init_lock = asyncio.Lock()
+        
+        # Batch size adattivo, separato per CPU e GPU
+        self._cpu_sizer = BatchSizeTuner(self.config.batch_size)
+        self._gpu_sizer = BatchSizeTuner(
+            self.config.batch_size * self.config.gpu_batch_multiplier
+        )
         
         # Performance tracking
         self._start_time = None
@@ -105,42 +185,80 @@ class BatchProcessor:
         
         logger.info(f"Starting batch processing of {len(products)} products")
         
-        # Dividi in sub-batches
-        batches = self._create_batches(products)
-        
-        # Process batches concurrently
-        results = await self._process_batches_concurrent(
-            batches,
-            optimization_params
-        )
+        # Dividi in sub-batches (stesso tuner anche per l'update finale)
+        sizer = self._batch_sizer()
+        batches = self._create_batches(products, sizer)
         
-        # Aggregate results
+        # Aggregate results man mano che arrivano
         successful = []
         failed = []
         
-        for batch_results in results:
+        async for result in self._process_results(batches, optimization_params):
+            if isinstance(result, OptimizationResult):
+                successful.append(result)
+            else:
+                failed.append(result)
+        
+        total_time, throughput = await self._record_metrics()
+        
+        # Tuning solo se l'input ha riempito almeno un batch completo
+        if self.config.auto_tune and len(products) >= sizer.size:
+            sizer.update(throughput)
+        
+        return BatchResult(
+            successful=successful,
+            failed=failed,
+            total_time=total_time,
+            throughput=throughput,
+            metadata={
+                'total_items': len(products),
+                'batch_count': len(batches),
+                'workers_used': self.config.max_workers,
+                'gpu_enabled': self.config.enable_gpu
+            }
+        )
+    
+    async def _process_results(
+        self,
+        batches: List[List[Dict[str, Any]]],
+        optimization_params: Optional[Dict[str, Any]]
+    ) -> AsyncGenerator[Union[OptimizationResult, Dict[str, Any]], None]:
+        """
+        Yield dei risultati appena ogni sub-batch termina: i successi
+        escono subito, i falliti vengono riprovati alla fine
+        """
+        failed = []
+        
+        # Process batches concurrently
+        async for batch_results in self._process_batches_concurrent(
+            batches,
+            optimization_params
+        ):
             for result in batch_results:
                 if isinstance(result, OptimizationResult):
-                    successful.append(result)
                     self._processed_count += 1
+                    yield result
                 else:
                     failed.append(result)
                     self._failed_count += 1
         
         # Retry failed if configured
         if self.config.retry_failed and failed:
-            retry_results = await self._retry_failed_items(
+            recovered, failed = await self._retry_failed_items(
                 failed,
                 optimization_params
             )
+            self._processed_count += len(recovered)
+            self._failed_count = len(failed)
             
-            for result in retry_results:
-                if isinstance(result, OptimizationResult):
-                    successful.append(result)
-                    failed.remove(result)
-                    self._processed_count += 1
-                    self._failed_count -= 1
+            for result in recovered:
+                yield result
         
+        for result in failed:
+            yield result
+    
+    async def _record_metrics(self) -> tuple:
+        """Log e metriche di fine elaborazione, ritorna (total_time, throughput)"""
         # Calculate metrics
         total_time = time.time() - self._start_time
         throughput = self._processed_count / total_time if total_time > 0 else 0
@@ -154,29 +272,34 @@ class BatchProcessor:
         )
         
         # Update metrics
-        await self.metrics.gauge('batch.throughput', throughput)
-        await self.metrics.increment('batch.processed', self._processed_count)
-        await self.metrics.increment('batch.failed', self._failed_count)
+        # Fire-and-forget: il BatchResult non aspetta l'I/O delle metriche
+        task = asyncio.create_task(self.metrics.submit_many([
+            ('batch.throughput', 'gauge', throughput),
+            ('batch.processed', 'counter', self._processed_count),
+            ('batch.failed', 'counter', self._failed_count)
+        ]))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
         
-        return BatchResult(
-            successful=successful,
-            failed=failed,
-            total_time=total_time,
-            throughput=throughput,
-            metadata={
-                'total_items': len(products),
-                'batch_count': len(batches),
-                'workers_used': self.config.max_workers,
-                'gpu_enabled': self.config.enable_gpu
-            }
-        )
+        return total_time, throughput
+    
+    def _batch_sizer(self) -> BatchSizeTuner:
+        """
+        Tuner del path attivo: quello GPU (batch_size * gpu_batch_multiplier)
+        solo dopo che il GPU optimizer è stato caricato su un device reale
+        """
+        gpu_optimizer = self._gpu_optimizer
+        if self.config.enable_gpu and gpu_optimizer is not None and gpu_optimizer.device != "cpu":
+            return self._gpu_sizer
+        return self._cpu_sizer
     
     def _create_batches(
         self,
-        items: List[T]
+        items: List[T],
+        sizer: Optional[BatchSizeTuner] = None
     ) -> List[List[T]]:
         """Divide items in batches ottimizzati"""
-        batch_size = self.config.batch_size
+        batch_size = (sizer or self._batch_sizer()).size
         return [
             items[i:i + batch_size]
             for i in range(0, len(items), batch_size)
@@ -186,23 +309,30 @@ class BatchProcessor:
         self,
         batches: List[List[Dict[str, Any]]],
         optimization_params: Optional[Dict[str, Any]]
-    ) -> List[List[Union[OptimizationResult, Dict[str, Any]]]]:
-        """Processa batches con concurrency control"""
+    ) -> AsyncGenerator[List[Union[OptimizationResult, Dict[str, Any]]], None]:
+        """Processa batches con concurrency control, yield in ordine di completamento"""
         semaphore = asyncio.Semaphore(self.config.max_concurrent_batches)
         
         async def process_with_semaphore(batch):
             async with semaphore:
-                return await self._process_single_batch(
-                    batch,
-                    optimization_params
-                )
+                try:
+                    return await self._process_single_batch(
+                        batch,
+                        optimization_params
+                    )
+                except Exception as e:
+                    return [
+                        {'error': str(e), 'item': item, 'type': 'batch_error'}
+                        for item in batch
+                    ]
         
         tasks = [
-            process_with_semaphore(batch)
+            create_eager_task(process_with_semaphore(batch))
             for batch in batches
         ]
         
-        return await asyncio.gather(*tasks, return_exceptions=False)
+        for future in asyncio.as_completed(tasks):
+            yield await future
     
     async def _process_single_batch(
         self,
@@ -210,86 +340,86 @@ class BatchProcessor:
         optimization_params: Optional[Dict[str, Any]]
     ) -> List[Union[OptimizationResult, Dict[str, Any]]]:
         """Processa singolo batch con parallelizzazione"""
+        if not self.config.enable_gpu:
+            return await self._process_items_cpu(batch, optimization_params)
         
-        # Se GPU disponibile e batch grande, usa GPU processing
-        if self.config.enable_gpu and len(batch) > 20:
-            return await self._process_batch_gpu(batch, optimization_params)
+        # Routing per complessità: item pesanti su GPU, semplici su CPU
+        threshold = self.config.gpu_complexity_threshold
+        gpu_batch = []
+        cpu_batch = []
+        for item in batch:
+            if self._estimate_complexity(item) > threshold:
+                gpu_batch.append(item)
+            else:
+                cpu_batch.append(item)
         
-        # Altrimenti usa CPU multi-processing
-        loop = asyncio.get_event_loop()
+        if len(gpu_batch) < self.config.min_gpu_batch:
+            return await self._process_items_cpu(batch, optimization_params)
+        if not cpu_batch:
+            return await self._process_batch_gpu(gpu_batch, optimization_params)
         
-        # Prepare partial function for multiprocessing
-        process_func = partial(
-            self._process_item_cpu,
-            optimization_params=optimization_params
+        gpu_results, cpu_results = await asyncio.gather(
+            self._process_batch_gpu(gpu_batch, optimization_params),
+            self._process_items_cpu(cpu_batch, optimization_params)
         )
-        
-        # Run in process pool
+        return gpu_results + cpu_results
+    
+    @staticmethod
+    def _estimate_complexity(item: Dict[str, Any]) -> int:
+        """Stima costo di ottimizzazione (~token) di un item"""
+        return (
+            len(item.get('title', ''))
+            + len(item.get('description', '')) // 4
+            + len(item.get('features', ())) * 8
+        )
+    
+    async def _process_items_cpu(
+        self,
+        batch: List[Dict[str, Any]],
+        optimization_params: Optional[Dict[str, Any]]
+    ) -> List[Union[OptimizationResult, Dict[str, Any]]]:
+        """Processa item come task async: il lavoro per item è I/O bound"""
         futures = []
         for item in batch:
-            # Acquire semaphore for backpressure
-            await self._processing_semaphore.acquire()
-            
-            future = loop.run_in_executor(
-                self.process_pool,
-                process_func,
-                item
-            )
+            # Acquire slot for backpressure (rilasciato a fine item)
+            await self._acquire_slot()
             
-            # Release semaphore when done
-            future.add_done_callback(
-                lambda f: self._processing_semaphore.release()
+            future = create_eager_task(
+                self._run_item(item, optimization_params)
             )
             
             futures.append(future)
         
-        # Wait for all with timeout
+        # Ogni task porta con sé il proprio item: niente lookup per l'errore
         results = []
         for future in asyncio.as_completed(futures):
-            try:
-                result = await asyncio.wait_for(
-                    future,
-                    timeout=self.config.timeout_per_item
-                )
-                results.append(result)
-            except asyncio.TimeoutError:
-                results.append({
-                    'error': 'Timeout',
-                    'item': batch[futures.index(future)]
-                })
-            except Exception as e:
-                results.append({
-                    'error': str(e),
-                    'item': batch[futures.index(future)]
-                })
+            results.append(await future)
         
         return results
     
-    def _process_item_cpu(
+    async def _run_item(
         self,
         item: Dict[str, Any],
         optimization_params: Optional[Dict[str, Any]]
     ) -> Union[OptimizationResult, Dict[str, Any]]:
-        """Processa singolo item su CPU (per multiprocessing)"""
+        """Ottimizza un item con timeout; errori legati all'item, slot sempre rilasciato"""
         try:
-            # Crea nuovo event loop per il processo
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # Esegui ottimizzazione
-            result = loop.run_until_complete(
-                self._optimize_single_item(item, optimization_params)
+            return await asyncio.wait_for(
+                self._optimize_single_item(item, optimization_params),
+                timeout=self.config.timeout_per_item
             )
-            
-            loop.close()
-            return result
-            
+        except asyncio.TimeoutError:
+            return {
+                'error': 'Timeout',
+                'item': item
+            }
         except Exception as e:
             return {
                 'error': str(e),
-                'item': item,
-                'type': 'processing_error'
+                'item': item
             }
+        finally:
+            await self._release_slot()
     
     async def _process_batch_gpu(
         self,
@@ -298,63 +428,66 @@ class BatchProcessor:
     ) -> List[Union[OptimizationResult, Dict[str, Any]]]:
         """Processa batch usando GPU acceleration"""
         try:
-            # Importa GPU optimizer
-            from src.listing.gpu_optimizer import GPUBatchOptimizer
-            
-            gpu_optimizer = GPUBatchOptimizer(self.container)
-            
-            # Prepara batch per GPU
-            titles = [item.get('title', '') for item in batch]
-            descriptions = [item.get('description', '') for item in batch]
-            categories = [item.get('category', 'General') for item in batch]
-            
-            # Ottimizza in batch su GPU
-            optimized_titles = await gpu_optimizer.optimize_titles_batch(
-                titles,
-                categories
-            )
-            
-            optimized_descriptions = await gpu_optimizer.generate_descriptions_batch(
-                titles,
-                descriptions,
-                categories
-            )
+            gpu_optimizer = await self._get_gpu_optimizer()
+            if gpu_optimizer is None:
+                return await self._process_items_cpu(batch, optimization_params)
             
-            keywords_batch = await gpu_optimizer.extract_keywords_batch(
-                [f"{t} {d}" for t, d in zip(titles, descriptions)]
-            )
+            # Prepara batch per GPU: conversione una volta, poi solo attributi
+            products = [Product.from_item(item) for item in batch]
+            titles = [p.title for p in products]
+            descriptions = [p.description for p in products]
+            categories = [p.category for p in products]
             
-            # Costruisci risultati
-            results = []
-            for i, item in enumerate(batch):
+            # Ottimizza su GPU per micro-batch: i risultati si costruiscono
+            # mentre il micro-batch successivo è ancora sul device
+            results: List[Union[OptimizationResult, Dict[str, Any]]] = [None] * len(batch)
+            async for i, title, description, keywords in gpu_optimizer.optimize_all_stream(
+                titles, descriptions, categories
+            ):
                 try:
-                    result = OptimizationResult(
-                        title=optimized_titles[i],
-                        description=optimized_descriptions[i],
-                        keywords=keywords_batch[i],
+                    results[i] = OptimizationResult(
+                        title=title,
+                        description=description,
+                        keywords=keywords,
                         sentiment_score=0.0,  # TODO: batch sentiment
                         metadata={
                             'processed_on': 'GPU',
                             'batch_index': i
                         }
                     )
-                    results.append(result)
                 except Exception as e:
-                    results.append({
+                    results[i] = {
                         'error': str(e),
-                        'item': item,
+                        'item': batch[i],
                         'type': 'gpu_processing_error'
-                    })
+                    }
             
             return results
             
-        except ImportError:
-            logger.warning("GPU optimizer not available, falling back to CPU")
-            return await self._process_single_batch(batch, optimization_params)
         except Exception as e:
             logger.error(f"GPU batch processing failed: {e}")
             # Fallback to CPU
-            return await self._process_single_batch(batch, optimization_params)
+            return await self._process_items_cpu(batch, optimization_params)
+    
+    async def _get_gpu_optimizer(self):
+        """GPU optimizer condiviso (modelli e contesto CUDA inizializzati una volta)"""
+        if self._gpu_optimizer is not None or self._gpu_available is False:
+            return self._gpu_optimizer
+        
+        async with self._gpu_init_lock:
+            if self._gpu_optimizer is None and self._gpu_available is None:
+                try:
+                    # Importa GPU optimizer
+                    from src.listing.gpu_optimizer import GPUBatchOptimizer
+                except ImportError:
+                    logger.warning("GPU optimizer not available, falling back to CPU")
+                    self._gpu_available = False
+                    return None
+                
+                self._gpu_optimizer = GPUBatchOptimizer(self.container)
+                self._gpu_available = True
+        
+        return self._gpu_optimizer
     
     async def _optimize_single_item(
         self,
@@ -375,38 +508,53 @@ class BatchProcessor:
         self,
         failed_items: List[Dict[str, Any]],
         optimization_params: Optional[Dict[str, Any]]
-    ) -> List[Union[OptimizationResult, Dict[str, Any]]]:
-        """Riprova items falliti con strategia di backoff"""
+    ) -> Tuple[List[OptimizationResult], List[Dict[str, Any]]]:
+        """
+        Riprova items falliti con strategia di backoff
+        
+        Returns:
+            (recuperati, ancora falliti)
+        """
         logger.info(f"Retrying {len(failed_items)} failed items")
         
-        retry_results = []
+        # Backpressure sui retry: stesso ordine di grandezza dei task attivi
+        semaphore = asyncio.Semaphore(self.config.max_concurrent_batches * 4)
+        timeout = self.config.timeout_per_item * 2
         
-        for item in failed_items:
-            # Extract original item data
-            original_item = item.get('item', item)
-            
-            # Wait with exponential backoff
-            await asyncio.sleep(0.1)
-            
-            try:
-                # Retry with extended timeout
-                result = await asyncio.wait_for(
-                    self._optimize_single_item(
-                        original_item,
-                        optimization_params
-                    ),
-                    timeout=self.config.timeout_per_item * 2
-                )
-                retry_results.append(result)
-            except Exception as e:
-                logger.error(f"Retry failed for item: {e}")
-                retry_results.append({
-                    'error': f"Retry failed: {str(e)}",
-                    'item': original_item,
-                    'type': 'retry_failed'
-                })
-        
-        return retry_results
+        async def retry_one(original_item):
+            async with semaphore:
+                # Jitter per non colpire il downstream tutti insieme
+                await asyncio.sleep(random.uniform(0, 0.2))
+                
+                try:
+                    # Retry with extended timeout
+                    return await asyncio.wait_for(
+                        self._optimize_single_item(
+                            original_item,
+                            optimization_params
+                        ),
+                        timeout=timeout
+                    )
+                except Exception as e:
+                    logger.error(f"Retry failed for item: {e}")
+                    return {
+                        'error': f"Retry failed: {str(e)}",
+                        'item': original_item,
+                        'type': 'retry_failed'
+                    }
+        
+        recovered = []
+        still_failed = []
+        
+        tasks = [retry_one(item.get('item', item)) for item in failed_items]
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            if isinstance(result, OptimizationResult):
+                recovered.append(result)
+            else:
+                still_failed.append(result)
+        
+        return recovered, still_failed
     
     async def process_stream(
         self,
@@ -419,33 +567,87 @@ class BatchProcessor:
         """
         window = []
         window_size = self.config.batch_size
+        deadline = None
         
-        async for item in item_generator:
-            window.append(item)
-            
-            if len(window) >= window_size:
-                # Process window
-                batch_result = await self.process_batch(
-                    window,
-                    optimization_params
-                )
+        # Dynamic batching: la finestra parte quando è piena oppure quando
+        # scade max_batch_wait_s dal suo primo item
+        iterator = item_generator.__aiter__()
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                
+                if done:
+                    next_item, pending = pending, None
+                    try:
+                        item = next_item.result()
+                    except StopAsyncIteration:
+                        break
+                    
+                    window.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.config.max_batch_wait_s
+                    if len(window) < window_size and time.monotonic() < deadline:
+                        continue
                 
-                # Yield successful results
-                for result in batch_result.successful:
+                # Process window (piena o scaduta)
+                async for result in self._process_window(window, optimization_params):
                     yield result
                 
                 # Clear window
                 window = []
+                deadline = None
+        finally:
+            if pending is not None:
+                pending.cancel()
         
         # Process remaining items
         if window:
-            batch_result = await self.process_batch(
-                window,
-                optimization_params
-            )
-            
-            for result in batch_result.successful:
+            async for result in self._process_window(window, optimization_params):
+                yield result
+    
+    async def _process_window(
+        self,
+        window: List[Dict[str, Any]],
+        optimization_params: Optional[Dict[str, Any]]
+    ) -> AsyncGenerator[OptimizationResult, None]:
+        """Processa una finestra dello stream, yield dei soli successi"""
+        self._start_time = time.time()
+        self._processed_count = 0
+        self._failed_count = 0
+        
+        async for result in self._process_results(
+            self._create_batches(window),
+            optimization_params
+        ):
+            if isinstance(result, OptimizationResult):
                 yield result
+        
+        await self._record_metrics()
+    
+    async def _acquire_slot(self):
+        """Attende uno slot libero sotto la soglia di backpressure"""
+        async with self._capacity_cond:
+            await self._capacity_cond.wait_for(
+                lambda: self._active_tasks < self._capacity
+            )
+            self._active_tasks += 1
+    
+    async def _release_slot(self):
+        """Libera uno slot e sveglia un waiter"""
+        async with self._capacity_cond:
+            self._active_tasks -= 1
+            self._capacity_cond.notify(1)
+    
+    async def resize(self, capacity: int):
+        """Cambia la soglia di backpressure a runtime"""
+        async with self._capacity_cond:
+            self._capacity = capacity
+            self._capacity_cond.notify_all()
     
     def get_performance_stats(self) -> Dict[str, Any]:
         """Ottieni statistiche performance correnti"""
@@ -470,6 +672,10 @@ class BatchProcessor:
     
     async def shutdown(self):
         """Cleanup resources"""
-        self.process_pool.shutdown(wait=True)
-        self.thread_pool.shutdown(wait=True)
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self._gpu_optimizer is not None:
+            self._gpu_optimizer.clear_cache()
+            self._gpu_optimizer = None
+        await self.ai_optimizer.shutdown()
         logger.info("BatchProcessor shutdown complete")
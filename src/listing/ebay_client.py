@@ -0,0 +1,115 @@
+"""
+Client asincrono per eBay Trading API
+Un solo httpx.AsyncClient per tutta la vita del publisher (keep-alive + HTTP/2)
+"""
+import importlib.util
+import logging
+from typing import Dict, Any, Optional
+from xml.sax.saxutils import escape
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 richiede il pacchetto h2 (httpx[http2])
+_HAS_H2 = importlib.util.find_spec("h2") is not None
+
+TRADING_API_URL = "https://api.ebay.com/ws/api.dll"
+_EBAY_NS = "urn:ebay:apis:eBLBaseComponents"
+_END_ITEM_TMPL = (
+    f'<EndItemRequest xmlns="{_EBAY_NS}">'
+    "<ItemID>{item_id}</ItemID><EndingReason>NotAvailable</EndingReason>"
+    "</EndItemRequest>"
+)
+
+
+class EbayTradingClient:
+    """Chiamate Trading API (AddItem, AddItems, ReviseItem, EndItem)"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.url = config.get('ebay_api_url', TRADING_API_URL)
+        self.headers = {
+            'Content-Type': 'text/xml',
+            'X-EBAY-API-SITEID': str(config.get('ebay_site_id', 101)),  # eBay.it
+            'X-EBAY-API-COMPATIBILITY-LEVEL': str(config.get('ebay_compat_level', 1193)),
+            'X-EBAY-API-IAF-TOKEN': config.get('ebay_token', ''),
+        }
+        self.max_connections = config.get('ebay_max_connections', 64)
+        self._client = None
+
+    @property
+    def client(self):
+        """httpx.AsyncClient condiviso, creato alla prima chiamata"""
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                http2=_HAS_H2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections // 2
+                ),
+                timeout=httpx.Timeout(30),
+                headers=self.headers
+            )
+            if not _HAS_H2:
+                logger.info("h2 non installato, eBay client in HTTP/1.1 keep-alive")
+        return self._client
+
+    async def add_item(self, xml_data: str) -> Dict[str, Any]:
+        return await self._call('AddItem', xml_data)
+
+    async def add_items(self, xml_data: str) -> Dict[str, Any]:
+        return await self._call('AddItems', xml_data)
+
+    async def revise_item(self, xml_data: str) -> Dict[str, Any]:
+        return await self._call('ReviseItem', xml_data)
+
+    async def end_item(self, item_id: str) -> Dict[str, Any]:
+        return await self._call('EndItem', _END_ITEM_TMPL.format(item_id=escape(item_id)))
+
+    async def aclose(self):
+        """Chiude il pool di connessioni"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _call(self, call_name: str, xml_data: str) -> Dict[str, Any]:
+        response = await self.client.post(
+            self.url,
+            content=xml_data.encode('utf-8'),
+            headers={'X-EBAY-API-CALL-NAME': call_name}
+        )
+        response.raise_for_status()
+        return _parse_response(response.content)
+
+
+def _parse_response(content: bytes) -> Dict[str, Any]:
+    """Risposta XML -> dict con Ack, ItemID, Errors e container AddItems"""
+    root = ET.fromstring(content)
+    result = _parse_node(root)
+
+    containers = root.findall(f'{{{_EBAY_NS}}}AddItemResponseContainer')
+    if containers:
+        result['AddItemResponseContainer'] = [_parse_node(c) for c in containers]
+    return result
+
+
+def _parse_node(node: ET.Element) -> Dict[str, Any]:
+    ns = f'{{{_EBAY_NS}}}'
+    parsed: Dict[str, Any] = {}
+
+    for field in ('Ack', 'ItemID', 'CorrelationID'):
+        value: Optional[str] = node.findtext(ns + field)
+        if value is not None:
+            parsed[field] = value
+
+    # Primo errore bloccante (o il primo in assoluto)
+    errors = node.findall(ns + 'Errors')
+    if errors:
+        blocking = [e for e in errors if e.findtext(ns + 'SeverityCode') == 'Error']
+        error = (blocking or errors)[0]
+        parsed['Errors'] = {
+            'ErrorCode': error.findtext(ns + 'ErrorCode'),
+            'LongMessage': error.findtext(ns + 'LongMessage') or error.findtext(ns + 'ShortMessage')
+        }
+    return parsed
@@ -2,19 +2,60 @@
 eBay Publisher implementation
 Integra con eBay API esistente
 """
-from typing import Dict, Any, Optional
-import xml.etree.ElementTree as ET
+import asyncio
+from typing import Dict, Any, Optional, List, Set, Tuple
+from xml.sax.saxutils import escape
 from datetime import datetime
 from src.listing.publisher import BasePublisher, PublishResult, PublishStatus
+from src.listing.ebay_client import EbayTradingClient
 from src.core.retry_manager import RetryManager
 
+# Struttura XML fissa: varia solo il testo delle foglie, quindi template
+# con campi pre-escaped invece di costruire un albero ElementTree
+_EBAY_NS = "urn:ebay:apis:eBLBaseComponents"
+
+_ITEM_TMPL = (
+    "<Item>"
+    "<Title>{title}</Title>"
+    "<Description><![CDATA[{description}]]></Description>"
+    "<PrimaryCategory><CategoryID>{category_id}</CategoryID></PrimaryCategory>"
+    '<StartPrice currencyID="EUR">{price}</StartPrice>'
+    "<ConditionID>{condition}</ConditionID>"
+    "<Quantity>{quantity}</Quantity>"
+    "<ListingDuration>{duration}</ListingDuration>"
+    "<PaymentMethods>PayPal</PaymentMethods>"
+    "<ReturnPolicy><ReturnsAcceptedOption>ReturnsAccepted</ReturnsAcceptedOption></ReturnPolicy>"
+    "<ShippingDetails><ShippingType>Flat</ShippingType></ShippingDetails>"
+    "</Item>"
+)
+
+_ADD_ITEM_TMPL = f'<AddItemRequest xmlns="{_EBAY_NS}">{{item}}</AddItemRequest>'
+_ADD_ITEMS_TMPL = f'<AddItemsRequest xmlns="{_EBAY_NS}">{{containers}}</AddItemsRequest>'
+_ADD_ITEMS_CONTAINER_TMPL = "<AddItemRequestContainer><MessageID>{message_id}</MessageID>{item}</AddItemRequestContainer>"
+_REVISE_ITEM_TMPL = f'<ReviseItemRequest xmlns="{_EBAY_NS}"><Item>{{fields}}</Item></ReviseItemRequest>'
+
+
+def _cdata(text: str) -> str:
+    """Contenuto CDATA: spezza eventuali ']]>' nel testo"""
+    return text.replace("]]>", "]]]]><![CDATA[>")
+
+# Limite eBay di item per singola chiamata AddItems
+ADD_ITEMS_MAX = 5
+
 class EbayPublisher(BasePublisher):
     """Publisher per eBay con API Trading"""
     
     def __init__(self, config: Dict[str, Any], retry_manager: Optional[RetryManager] = None, ebay_client: Any = None):
         super().__init__(config, retry_manager)
         self.marketplace_name = "ebay"
-        self.ebay_client = ebay_client
+        # Client (e pool di connessioni) condiviso per add/revise/end
+        self.ebay_client = ebay_client or EbayTradingClient(config)
+        # Finestra (s) per accorpare publish singoli in chiamate AddItems; 0 = disattivo
+        self._batch_window = config.get('publish_batch_window', 0)
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Riferimenti forti ai task di invio: il loop tiene solo weakref
+        self._send_tasks: Set[asyncio.Task] = set()
         
     async def validate_listing(self, listing: Dict[str, Any]) -> bool:
         """Valida listing per eBay"""
@@ -36,92 +77,131 @@ class EbayPublisher(BasePublisher):
         
     async def _do_publish(self, listing: Dict[str, Any]) -> PublishResult:
         """Pubblica su eBay via API"""
+        if self._batch_window > 0:
+            return await self._enqueue(listing)
+            
         try:
             # Prepare eBay XML
             xml_data = self._build_ebay_xml(listing)
             
             # Call eBay API
             response = await self.ebay_client.add_item(xml_data)
-            
-            if response.get('Ack') == 'Success':
-                return PublishResult(
-                    listing_id=response.get('ItemID'),
-                    marketplace=self.marketplace_name,
-                    status=PublishStatus.PUBLISHED,
-                    url=f"https://www.ebay.it/itm/{response.get('ItemID')}",
-                    published_at=datetime.now()
-                )
-            else:
-                return PublishResult(
-                    listing_id="",
-                    marketplace=self.marketplace_name,
-                    status=PublishStatus.FAILED,
-                    error=response.get('Errors', {}).get('LongMessage', 'Unknown error')
-                )
+            return self._to_result(response)
                 
         except Exception as e:
+            return self._failed(str(e))
+            
+    async def _do_publish_many(self, listings: List[Dict[str, Any]]) -> List[PublishResult]:
+        """Pubblica via AddItems, ADD_ITEMS_MAX listing per chiamata"""
+        chunks = [listings[i:i + ADD_ITEMS_MAX] for i in range(0, len(listings), ADD_ITEMS_MAX)]
+        results = await asyncio.gather(*(self._add_items(chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+        
+    async def _add_items(self, listings: List[Dict[str, Any]]) -> List[PublishResult]:
+        """Singola chiamata AddItems per un gruppo di listing"""
+        try:
+            response = await self.ebay_client.add_items(self._build_add_items_xml(listings))
+        except Exception as e:
+            return [self._failed(str(e)) for _ in listings]
+            
+        containers = response.get('AddItemResponseContainer', [])
+        if isinstance(containers, dict):
+            containers = [containers]
+            
+        # I container di risposta riportano il MessageID come CorrelationID;
+        # non hanno Ack proprio: ItemID presente = pubblicato
+        by_id = {
+            str(c.get('CorrelationID')): {'Ack': 'Success' if c.get('ItemID') else 'Failure', **c}
+            for c in containers
+        }
+        fallback = response.get('Errors', {}).get('LongMessage', 'Missing response container')
+        
+        return [
+            self._to_result(by_id[str(i)]) if str(i) in by_id else self._failed(fallback)
+            for i in range(len(listings))
+        ]
+        
+    async def _enqueue(self, listing: Dict[str, Any]) -> PublishResult:
+        """Accoda un publish singolo nel prossimo AddItems"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((listing, future))
+        
+        if len(self._pending) >= ADD_ITEMS_MAX:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._batch_window, self._flush)
+            
+        return await future
+        
+    def _flush(self):
+        """Invia i publish accodati"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+            
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._send_pending(pending))
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+            
+    async def _send_pending(self, pending: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        try:
+            results = await self._do_publish_many([listing for listing, _ in pending])
+        except Exception as e:
+            # Nessun chiamante resta appeso: l'errore arriva a ogni publish accodato
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+                
+    def _to_result(self, response: Dict[str, Any]) -> PublishResult:
+        """Converte la risposta eBay (o un container AddItems) in PublishResult"""
+        # Ack 'Warning': item messo online, con avvisi non bloccanti
+        if response.get('Ack') in ('Success', 'Warning'):
             return PublishResult(
-                listing_id="",
+                listing_id=response.get('ItemID'),
                 marketplace=self.marketplace_name,
-                status=PublishStatus.FAILED,
-                error=str(e)
+                status=PublishStatus.PUBLISHED,
+                url=f"https://www.ebay.it/itm/{response.get('ItemID')}",
+                published_at=datetime.now()
             )
+        return self._failed(response.get('Errors', {}).get('LongMessage', 'Unknown error'))
+        
+    def _failed(self, error: str) -> PublishResult:
+        return PublishResult(
+            listing_id="",
+            marketplace=self.marketplace_name,
+            status=PublishStatus.FAILED,
+            error=error
+        )
             
     def _build_ebay_xml(self, listing: Dict[str, Any]) -> str:
         """Costruisce XML per eBay AddItem"""
-        root = ET.Element("AddItemRequest")
-        root.set("xmlns", "urn:ebay:apis:eBLBaseComponents")
-        
-        # Add required fields
-        item = ET.SubElement(root, "Item")
-        
-        # Title
-        title_elem = ET.SubElement(item, "Title")
-        title_elem.text = listing['title']
-        
-        # Description
-        desc_elem = ET.SubElement(item, "Description")
-        desc_elem.text = f"<![CDATA[{listing['description']}]]>"
-        
-        # Category
-        cat_elem = ET.SubElement(item, "PrimaryCategory")
-        cat_id = ET.SubElement(cat_elem, "CategoryID")
-        cat_id.text = str(listing['category_id'])
-        
-        # Price
-        price_elem = ET.SubElement(item, "StartPrice")
-        price_elem.text = str(listing['price'])
-        price_elem.set("currencyID", "EUR")
-        
-        # Condition
-        condition_elem = ET.SubElement(item, "ConditionID")
-        condition_elem.text = str(listing.get('condition', '1000'))  # New by default
-        
-        # Quantity
-        quantity_elem = ET.SubElement(item, "Quantity")
-        quantity_elem.text = str(listing.get('quantity', 1))
-        
-        # Listing Duration
-        duration_elem = ET.SubElement(item, "ListingDuration")
-        duration_elem.text = listing.get('duration', 'GTC')  # Good Till Cancelled
-        
-        # Payment Methods
-        payment_elem = ET.SubElement(item, "PaymentMethods")
-        payment_elem.text = "PayPal"
-        
-        # Return Policy
-        return_policy = ET.SubElement(item, "ReturnPolicy")
-        returns_accepted = ET.SubElement(return_policy, "ReturnsAcceptedOption")
-        returns_accepted.text = "ReturnsAccepted"
-        
-        # Shipping Details
-        shipping = ET.SubElement(item, "ShippingDetails")
-        shipping_type = ET.SubElement(shipping, "ShippingType")
-        shipping_type.text = "Flat"
-        
-        # Add more fields as needed...
-        
-        return ET.tostring(root, encoding='unicode')
+        return _ADD_ITEM_TMPL.format(item=self._build_item_xml(listing))
+        
+    def _build_add_items_xml(self, listings: List[Dict[str, Any]]) -> str:
+        """Costruisce XML per eBay AddItems (max ADD_ITEMS_MAX item)"""
+        return _ADD_ITEMS_TMPL.format(containers="".join(
+            _ADD_ITEMS_CONTAINER_TMPL.format(message_id=i, item=self._build_item_xml(listing))
+            for i, listing in enumerate(listings)
+        ))
+        
+    def _build_item_xml(self, listing: Dict[str, Any]) -> str:
+        """Elemento <Item> di un listing"""
+        return _ITEM_TMPL.format(
+            title=escape(listing['title']),
+            description=_cdata(listing['description']),
+            category_id=escape(str(listing['category_id'])),
+            price=escape(str(listing['price'])),
+            condition=escape(str(listing.get('condition', '1000'))),  # New by default
+            quantity=escape(str(listing.get('quantity', 1))),
+            duration=escape(listing.get('duration', 'GTC'))  # Good Till Cancelled
+        )
         
     async def update(self, listing_id: str, updates: Dict[str, Any]) -> bool:
         """Aggiorna listing esistente"""
@@ -148,25 +228,22 @@ class EbayPublisher(BasePublisher):
             
     def _build_revise_xml(self, listing_id: str, updates: Dict[str, Any]) -> str:
         """Costruisce XML per ReviseItem"""
-        root = ET.Element("ReviseItemRequest")
-        root.set("xmlns", "urn:ebay:apis:eBLBaseComponents")
-        
-        item = ET.SubElement(root, "Item")
-        
         # Item ID
-        item_id = ET.SubElement(item, "ItemID")
-        item_id.text = listing_id
+        fields = [f"<ItemID>{escape(listing_id)}</ItemID>"]
         
         # Add updated fields
         if 'title' in updates:
-            title_elem = ET.SubElement(item, "Title")
-            title_elem.text = updates['title']
+            fields.append(f"<Title>{escape(updates['title'])}</Title>")
             
         if 'price' in updates:
-            price_elem = ET.SubElement(item, "StartPrice")
-            price_elem.text = str(updates['price'])
-            price_elem.set("currencyID", "EUR")
+            fields.append(f'<StartPrice currencyID="EUR">{escape(str(updates["price"]))}</StartPrice>')
             
         # Add more update fields as needed...
         
-        return ET.tostring(root, encoding='unicode')
+        return _REVISE_ITEM_TMPL.format(fields="".join(fields))
+        
+    async def close(self):
+        """Rilascia le connessioni del client eBay"""
+        aclose = getattr(self.ebay_client, 'aclose', None)
+        if aclose is not None:
+            await aclose()
@@ -9,19 +9,134 @@ from transformers import (
     AutoTokenizer,
     AutoModelForSeq2SeqLM,
     AutoModelForCausalLM,
-    AutoModelForSequenceClassification
+    AutoModelForSequenceClassification,
+    AutoModelForTokenClassification
 )
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncGenerator, Awaitable, Callable, Iterator, TypeVar
 import logging
+import re
+import time
 import asyncio
-from functools import lru_cache
+import contextlib
+import functools
+import hashlib
+import importlib.util
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+try:
+    from torch.nn.attention import sdpa_kernel, SDPBackend
+except ImportError:  # PyTorch < 2.3
+    sdpa_kernel = None
+
 from src.core.dependencies import DIContainer
 from src.core.monitoring import MetricsCollector
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+# Limite voci della cache di tokenizzazione (svuotata quando piena)
+_TOK_CACHE_MAX = 100_000
+
+# FlashAttention-2 solo se il pacchetto flash-attn è installato
+_HAS_FLASH_ATTN = importlib.util.find_spec("flash_attn") is not None
+_HAS_BITSANDBYTES = importlib.util.find_spec("bitsandbytes") is not None
+
+# Modelli di sola classificazione: pesi int8 senza perdita rilevante
+_INT8_PIPELINE_MODELS = {
+    "ner": AutoModelForTokenClassification,
+    "sentiment-analysis": AutoModelForSequenceClassification,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _autocast_dtype(device: str) -> Optional[torch.dtype]:
+    """
+    Dtype di autocast supportato dall'hardware, None = resta in FP32
+    
+    FP16 su CUDA; BF16 su CPU solo con AVX512-BF16/AMX e su MPS solo se
+    la versione di torch/macOS lo gestisce (altrimenti più lento o assente).
+    """
+    if device == "cuda":
+        return torch.float16
+    if device == "cpu":
+        cpu = torch.cpu
+        has_bf16 = (
+            getattr(cpu, "_is_avx512_bf16_supported", lambda: False)()
+            or getattr(cpu, "_is_amx_tile_supported", lambda: False)()
+        )
+        return torch.bfloat16 if has_bf16 else None
+    if device == "mps":
+        try:
+            torch.ones(1, dtype=torch.bfloat16, device="mps")
+        except (RuntimeError, TypeError):
+            return None
+        return torch.bfloat16
+    return None
+
+def _length_order(texts: List[str]) -> np.ndarray:
+    """Permutazione che ordina i testi per lunghezza (proxy dei token)"""
+    return np.argsort([len(text) for text in texts], kind="stable")
+
+
+def _restore_order(values: List[T], order: np.ndarray) -> List[T]:
+    """Inverte la permutazione di _length_order sui risultati"""
+    restored = [None] * len(values)
+    for value, index in zip(values, order.tolist()):
+        restored[index] = value
+    return restored
+
+
+def _top_keywords(entities: List[Dict[str, Any]], max_keywords: int, min_score: float = 0.8) -> List[str]:
+    """Entità uniche ordinate per score, fino a max_keywords"""
+    keywords: Dict[str, None] = {}
+    for ent in sorted(entities, key=lambda ent: ent['score'], reverse=True):
+        if ent['score'] <= min_score or len(keywords) == max_keywords:
+            break
+        keywords.setdefault(ent['word'].replace('##', ''), None)
+    return list(keywords)
+
+
+_WORD_RE = re.compile(r"[^\W\d_]{2,}")
+_STOP_WORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+al allo alla ai agli alle che con da dal dalla dei del della delle di e ed gli il in la le lo nel nella
+non per piu più si su sul sulla tra un una uno
+""".split())
+
+
+def _tfidf_keywords(texts: List[str], max_keywords: int) -> List[List[str]]:
+    """
+    Keywords approssimate via TF-IDF (unigrammi + bigrammi) sul batch
+    
+    Nessun modello da caricare: IDF smussato come TfidfVectorizer,
+    top-K termini per documento.
+    """
+    docs = []
+    for text in texts:
+        words = [w for w in _WORD_RE.findall(text.lower()) if w not in _STOP_WORDS]
+        docs.append(Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])]))
+    
+    df = Counter(term for doc in docs for term in doc)
+    n_docs = len(docs)
+    
+    keywords = []
+    for doc in docs:
+        if not doc:
+            keywords.append([])
+            continue
+        terms = list(doc)
+        tf = np.fromiter(doc.values(), dtype=np.float64, count=len(terms))
+        idf = np.log((1 + n_docs) / (1 + np.fromiter((df[t] for t in terms), dtype=np.float64, count=len(terms)))) + 1
+        scores = tf * idf
+        top = np.argsort(-scores, kind='stable')[:max_keywords]
+        keywords.append([terms[i] for i in top])
+    return keywords
+
 
 class GPUOptimizer:
     """
@@ -29,6 +144,9 @@ class GPUOptimizer:
     Supporta CUDA (NVIDIA) e MPS (Apple Silicon)
     """
     
+    # torch.compile del forward dei modelli al caricamento (GPUBatchOptimizer)
+    _compile_enabled = False
+    
     def __init__(self, container: DIContainer):
         self.container = container
         self.config = container.resolve('config')
@@ -37,13 +155,35 @@ class GPUOptimizer:
         # Detect best device
         self.device = self._detect_best_device()
         logger.info(f"GPU Optimizer using device: {self.device}")
+        if self.device == "cuda":
+            self._enable_fast_math()
         
         # Model cache
         self._models = {}
+        # Serializza il caricamento di modelli e pipeline tra i thread worker
+        self._load_lock = threading.Lock()
         self._tokenizers = {}
+        # Pipeline HF per (task, modello), costruite al primo uso
+        self._pipelines: Dict[Tuple[str, str], Any] = {}
+        # input_ids per (tokenizer, testo): ogni testo tokenizzato una volta
+        self._tok_cache: Dict[Tuple[int, str], List[int]] = {}
+        self._shared_tokenizers: Dict[str, Any] = {}
+        self._tok_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gpu-tokenize")
+        weakref.finalize(self, self._tok_executor.shutdown, wait=False)
+        # Un solo thread per i micro-batch di optimize_all_stream
+        self._stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu-stream")
+        weakref.finalize(self, self._stream_executor.shutdown, wait=False)
+        # Stream dedicato alle copie host -> device
+        self._h2d_stream = torch.cuda.Stream() if self.device == "cuda" else None
         
         # Batch settings ottimizzati per device
         self.batch_config = self._get_optimal_batch_config()
+        
+        # Un CUDA stream per passo: i kernel dei tre modelli si sovrappongono
+        self._streams = {
+            name: torch.cuda.Stream()
+            for name in ("title", "desc", "keywords", "sentiment")
+        } if self.device == "cuda" else {}
     
     def _detect_best_device(self) -> str:
         """Rileva il miglior device disponibile"""
@@ -68,6 +208,15 @@ class GPUOptimizer:
             logger.warning("No GPU detected, using CPU")
             return "cpu"
     
+    @staticmethod
+    def _enable_fast_math():
+        """Shape ripetute e sola inference: autotuning cuDNN, TF32, flash SDPA"""
+        torch.backends.cudnn.benchmark = True
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+        torch.set_float32_matmul_precision('high')
+        torch.backends.cuda.enable_flash_sdp(True)
+    
     def _get_optimal_batch_config(self) -> Dict[str, int]:
         """Determina configurazione batch ottimale per device"""
         if self.device == "cuda":
@@ -115,38 +264,285 @@ class GPUOptimizer:
                 'max_length': 128
             }
     
-    @lru_cache(maxsize=3)
     def _get_model(self, model_name: str, model_type: str):
-        """Carica e cacha modelli"""
+        """Carica e cacha modelli (unica cache: self._models per istanza)"""
         cache_key = f"{model_type}_{model_name}"
         
         if cache_key not in self._models:
-            logger.info(f"Loading model {model_name} to {self.device}")
-            
-            if model_type == "seq2seq":
-                model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-            elif model_type == "causal":
-                model = AutoModelForCausalLM.from_pretrained(model_name)
-            elif model_type == "classification":
-                model = AutoModelForSequenceClassification.from_pretrained(model_name)
-            else:
-                raise ValueError(f"Unknown model type: {model_type}")
-            
-            # Move to device
-            model = model.to(self.device)
-            
-            # Optimization for inference
-            model.eval()
-            if self.device == "cuda":
-                model = model.half()  # FP16 for faster inference
-            
-            self._models[cache_key] = model
-            
-            # Load tokenizer
-            self._tokenizers[cache_key] = AutoTokenizer.from_pretrained(model_name)
+            # Un solo caricamento anche con più thread worker sullo stesso modello
+            with self._load_lock:
+                if cache_key not in self._models:
+                    self._load_model(cache_key, model_name, model_type)
         
         return self._models[cache_key], self._tokenizers[cache_key]
     
+    def _load_model(self, cache_key: str, model_name: str, model_type: str):
+        """Caricamento effettivo, chiamato con _load_lock acquisito"""
+        logger.info(f"Loading model {model_name} to {self.device}")
+        
+        if model_type == "seq2seq":
+            model = self._load_with_attention(AutoModelForSeq2SeqLM, model_name)
+        elif model_type == "causal":
+            model = self._load_with_attention(AutoModelForCausalLM, model_name)
+        elif model_type == "classification":
+            model = self._load_with_attention(AutoModelForSequenceClassification, model_name)
+        else:
+            raise ValueError(f"Unknown model type: {model_type}")
+        
+        # Move to device
+        model = model.to(self.device)
+        
+        # Optimization for inference (precisione ridotta via autocast)
+        model.eval()
+        if self._compile_enabled:
+            self._compile_forward(cache_key, model)
+        
+        # Load tokenizer (condiviso tra modelli con lo stesso vocabolario)
+        tokenizer = self._load_tokenizer(model_name)
+        if model_type == "causal" and tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        self._tokenizers[cache_key] = tokenizer
+        
+        # Pubblicato per ultimo: chi lo vede trova anche il tokenizer
+        self._models[cache_key] = model
+    
+    @contextlib.contextmanager
+    def _infer_ctx(self, autocast: bool = True):
+        """Inference senza autograd; autocast FP16 su CUDA, BF16 su MPS/CPU se supportato"""
+        dtype = _autocast_dtype(self.device) if autocast else None
+        with torch.inference_mode(), (
+            torch.autocast(device_type=self.device, dtype=dtype)
+            if dtype is not None else contextlib.nullcontext()
+        ):
+            yield
+    
+    def _pipeline_ctx(self):
+        """Contesto per le pipeline di classificazione"""
+        # Su CPU i Linear int8 dinamici accettano solo input FP32
+        return self._infer_ctx(autocast=self.device != "cpu")
+    
+    async def _on_stream(self, name: str, step: Callable[..., Awaitable[T]], *args) -> T:
+        """
+        Esegue un passo batch sul proprio CUDA stream, in un thread dedicato
+        
+        Lo stream corrente è per-thread: ogni passo lancia i kernel sul suo
+        stream senza bloccare gli altri, il risultato torna dopo synchronize().
+        Senza CUDA il passo gira direttamente sul loop.
+        """
+        stream = self._streams.get(name)
+        if stream is None:
+            return await step(*args)
+        
+        def run():
+            with torch.cuda.stream(stream):
+                result = asyncio.run(step(*args))
+            stream.synchronize()
+            return result
+        
+        return await asyncio.to_thread(run)
+    
+    @staticmethod
+    async def _run_unique(step: Callable[..., Awaitable[List[T]]], *columns: List[Any]) -> List[T]:
+        """
+        Esegue un passo batch solo sulle righe distinte, poi riespande
+        
+        Feed con prodotti ripetuti (varianti, re-import) non ritokenizzano
+        né ricalcolano lo stesso input.
+        """
+        positions: Dict[Tuple, int] = {}
+        inverse = [positions.setdefault(row, len(positions)) for row in zip(*columns)]
+        if len(positions) == len(inverse):
+            return await step(*columns)
+        
+        unique_columns = [list(column) for column in zip(*positions)]
+        results = await step(*unique_columns)
+        return [results[i] for i in inverse]
+    
+    def _get_pipeline(self, task: str, model_name: str):
+        """Pipeline HF memoizzata: modello caricato una volta per processo"""
+        key = (task, model_name)
+        pipe = self._pipelines.get(key)
+        if pipe is None:
+            with self._load_lock:
+                pipe = self._pipelines.get(key)
+                if pipe is None:
+                    logger.info(f"Loading {task} pipeline {model_name} to {self.device}")
+                    pipe = pipeline(
+                        task,
+                        batch_size=self.batch_config['sentiment_batch'],
+                        **self._pipeline_model_kwargs(task, model_name)
+                    )
+                    self._pipelines[key] = pipe
+        return pipe
+    
+    def _pipeline_model_kwargs(self, task: str, model_name: str) -> Dict[str, Any]:
+        """Modello per la pipeline: int8 per classificazione dove supportato"""
+        auto_cls = _INT8_PIPELINE_MODELS.get(task)
+        
+        if auto_cls is not None and self.device == "cpu":
+            # CPU: quantizzazione dinamica dei layer Linear (VNNI/AVX512)
+            model = torch.quantization.quantize_dynamic(
+                auto_cls.from_pretrained(model_name),
+                {torch.nn.Linear},
+                dtype=torch.qint8
+            )
+            return {'model': model, 'tokenizer': model_name, 'device': -1}
+        
+        if (
+            auto_cls is not None
+            and self.device == "cuda"
+            and _HAS_BITSANDBYTES
+            and torch.cuda.get_device_capability(0) >= (7, 5)
+        ):
+            # GPU con INT8 tensor core: bitsandbytes, placement via device_map
+            model = auto_cls.from_pretrained(model_name, load_in_8bit=True, device_map="auto")
+            return {'model': model, 'tokenizer': model_name}
+        
+        # MPS o GPU senza int8: precisione ridotta via autocast
+        return {'model': model_name, 'device': 0 if self.device == "cuda" else -1}
+    
+    def _load_tokenizer(self, model_name: str):
+        """
+        Tokenizer fast, una sola istanza per vocabolario
+        
+        Modelli della stessa famiglia condividono istanza e cache degli
+        input_ids (_tok_cache è indicizzata per tokenizer).
+        """
+        tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        if not tokenizer.is_fast:
+            return tokenizer
+        
+        # Impronta: vocabolario, merges, normalizer e token speciali
+        fingerprint = hashlib.blake2b(
+            tokenizer.backend_tokenizer.to_str().encode(),
+            digest_size=16
+        ).hexdigest()
+        return self._shared_tokenizers.setdefault(fingerprint, tokenizer)
+    
+    def _load_with_attention(self, auto_cls, model_name: str):
+        """from_pretrained col backend di attention più veloce supportato"""
+        implementations = ["sdpa", "eager"]
+        if _HAS_FLASH_ATTN and self.device == "cuda":
+            implementations.insert(0, "flash_attention_2")
+        
+        for implementation in implementations:
+            try:
+                return auto_cls.from_pretrained(model_name, attn_implementation=implementation)
+            except (ValueError, ImportError) as e:
+                # Architettura senza supporto per questo backend
+                logger.debug(f"{model_name}: {implementation} non disponibile ({e})")
+        
+        return auto_cls.from_pretrained(model_name)
+    
+    @contextlib.contextmanager
+    def _generate_ctx(self):
+        """_infer_ctx più kernel SDPA fusi (flash / mem-efficient) su CUDA, MATH come fallback"""
+        with self._infer_ctx():
+            if self.device == "cuda" and sdpa_kernel is not None:
+                # MATH copre dtype/mask/head-dim non supportati dai kernel fusi
+                with sdpa_kernel([SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION, SDPBackend.MATH]):
+                    yield
+            else:
+                yield
+    
+    def _compile_forward(self, key: str, model):
+        """Compila il forward chiamato a ogni step di generate()"""
+        try:
+            logger.info(f"Compiling model {key} forward with torch.compile")
+            # dynamic: lunghezze variabili senza ricompilare a ogni shape
+            model.forward = torch.compile(model.forward, mode="reduce-overhead", dynamic=True)
+        except Exception as e:
+            logger.warning(f"Model compilation failed: {e}")
+    
+    def _generate_cache_kwargs(self) -> Dict[str, Any]:
+        """KV cache statica per i modelli compilati: shape fisse per i CUDA Graph"""
+        if self._compile_enabled:
+            return {'use_cache': True, 'cache_implementation': 'static'}
+        return {}
+    
+    def _tokenize(self, tokenizer, texts: List[str], padding_side: str = "right"):
+        """
+        Tokenizza un sub-batch riusando gli input_ids già calcolati
+        
+        Solo i testi mai visti passano dal tokenizer (una chiamata unica),
+        poi il batch viene paddato: padding='longest', multiplo di 8 per i
+        Tensor Core.
+        """
+        tok_id = id(tokenizer)
+        cache = self._tok_cache
+        # Copia locale: la cache può essere svuotata da un altro thread
+        ids: Dict[str, List[int]] = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            cached = cache.get((tok_id, text))
+            if cached is None:
+                missing.append(text)
+            else:
+                ids[text] = cached
+        
+        if missing:
+            if len(cache) + len(missing) > _TOK_CACHE_MAX:
+                cache.clear()
+            encoded = tokenizer(
+                missing,
+                max_length=self.batch_config['max_length'],
+                truncation=True
+            )
+            for text, input_ids in zip(missing, encoded['input_ids']):
+                ids[text] = cache[(tok_id, text)] = input_ids
+        
+        return tokenizer.pad(
+            {'input_ids': [ids[text] for text in texts]},
+            padding='longest',
+            pad_to_multiple_of=8,  # dimensioni allineate ai Tensor Core
+            padding_side=padding_side,  # per chiamata: il tokenizer può essere condiviso
+            return_tensors="pt"
+        )
+    
+    def _encoded_batches(
+        self,
+        tokenizer,
+        inputs: List[str],
+        batch_size: int,
+        padding_side: str = "right"
+    ) -> Iterator[Dict[str, torch.Tensor]]:
+        """
+        Sub-batch tokenizzati e già sul device
+        
+        Il sub-batch successivo viene tokenizzato in background mentre il
+        chiamante esegue generate() sul corrente.
+        """
+        def submit(start: int):
+            return self._tok_executor.submit(
+                self._tokenize, tokenizer, inputs[start:start + batch_size], padding_side
+            )
+        
+        pending = submit(0) if inputs else None
+        for start in range(0, len(inputs), batch_size):
+            encoded = pending.result()
+            next_start = start + batch_size
+            pending = submit(next_start) if next_start < len(inputs) else None
+            yield self._to_device(encoded)
+    
+    def _to_device(self, encoded) -> Dict[str, torch.Tensor]:
+        """H2D: su CUDA da memoria pinned, copia asincrona su stream dedicato"""
+        if self.device != "cuda":
+            return {k: v.to(self.device) for k, v in encoded.items()}
+        
+        compute_stream = torch.cuda.current_stream()
+        with torch.cuda.stream(self._h2d_stream):
+            on_device = {
+                k: v.pin_memory().to(self.device, non_blocking=True)
+                for k, v in encoded.items()
+            }
+            copied = torch.cuda.Event()
+            copied.record()
+        # Lo stream di calcolo attende solo la copia, non l'host
+        compute_stream.wait_event(copied)
+        for tensor in on_device.values():
+            tensor.record_stream(compute_stream)
+        return on_device
+    
     async def optimize_titles_batch(
         self,
         titles: List[str],
@@ -173,24 +569,18 @@ class GPUOptimizer:
             for title, cat in zip(titles, categories)
         ]
         
+        # Sub-batch di lunghezza simile: padding quasi nullo
+        order = _length_order(inputs)
+        inputs = [inputs[i] for i in order]
+        
         # Process in sub-batches per gestire memoria
         batch_size = self.batch_config['title_batch']
         optimized_titles = []
         
-        for i in range(0, len(inputs), batch_size):
-            batch = inputs[i:i + batch_size]
-            
-            # Tokenize
-            encoded = tokenizer(
-                batch,
-                max_length=self.batch_config['max_length'],
-                truncation=True,
-                padding=True,
-                return_tensors="pt"
-            ).to(self.device)
-            
+        # Tokenize (prefetch del sub-batch successivo) + copia su device
+        for encoded in self._encoded_batches(tokenizer, inputs, batch_size):
             # Generate
-            with torch.no_grad():
+            with self._generate_ctx():
                 outputs = model.generate(
                     **encoded,
                     max_length=max_length,
@@ -203,10 +593,8 @@ class GPUOptimizer:
             decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
             optimized_titles.extend(decoded)
             
-            # Free memory
+            # Rilascia i riferimenti; il caching allocator riusa i blocchi
             del encoded, outputs
-            if self.device == "cuda":
-                torch.cuda.empty_cache()
         
         # Log performance
         await self.metrics.increment(
@@ -215,7 +603,7 @@ class GPUOptimizer:
             tags={'device': self.device}
         )
         
-        return optimized_titles
+        return _restore_order(optimized_titles, order)
     
     async def generate_descriptions_batch(
         self,
@@ -244,45 +632,43 @@ class GPUOptimizer:
             for title, desc, cat in zip(titles, original_descriptions, categories)
         ]
         
+        # Sub-batch di lunghezza simile: padding quasi nullo
+        order = _length_order(prompts)
+        prompts = [prompts[i] for i in order]
+        
         batch_size = self.batch_config['description_batch']
         generated_descriptions = []
         
-        for i in range(0, len(prompts), batch_size):
-            batch = prompts[i:i + batch_size]
-            
-            # Tokenize
-            encoded = tokenizer(
-                batch,
-                max_length=self.batch_config['max_length'],
-                truncation=True,
-                padding=True,
-                return_tensors="pt"
-            ).to(self.device)
-            
+        # Tokenize (prefetch del sub-batch successivo) + copia su device
+        # Generazione batch: prompt paddati a sinistra, stessa colonna di fine
+        for encoded in self._encoded_batches(tokenizer, prompts, batch_size, padding_side="left"):
             # Generate
-            with torch.no_grad():
+            with self._generate_ctx():
                 outputs = model.generate(
                     **encoded,
                     max_new_tokens=200,
                     temperature=0.8,
                     top_p=0.9,
-                    do_sample=True
+                    do_sample=True,
+                    pad_token_id=tokenizer.pad_token_id,
+                    return_dict_in_generate=True,
+                    output_scores=False,
+                    **self._generate_cache_kwargs()
                 )
             
-            # Extract generated part only
+            # Extract generated part only: con left padding ogni prompt
+            # termina alla stessa colonna, un unico taglio vale per tutte le righe
             input_length = encoded['input_ids'].shape[1]
-            generated_ids = outputs[:, input_length:]
+            generated_ids = outputs.sequences[:, input_length:]
             
             # Decode
             decoded = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
             generated_descriptions.extend(decoded)
             
-            # Free memory
+            # Rilascia i riferimenti; il caching allocator riusa i blocchi
             del encoded, outputs, generated_ids
-            if self.device == "cuda":
-                torch.cuda.empty_cache()
         
-        return generated_descriptions
+        return _restore_order(generated_descriptions, order)
     
     async def extract_keywords_batch(
         self,
@@ -299,40 +685,111 @@ class GPUOptimizer:
         Returns:
             Lista di liste keywords
         """
+        # Su CPU la NER è il passo più costoso: TF-IDF sul batch
+        if self.device not in ("cuda", "mps") or self.config.fast_keywords:
+            return _tfidf_keywords(texts, max_keywords)
+        
         # Usa NER pipeline per keyword extraction
         try:
-            ner_pipeline = pipeline(
-                "ner",
-                model="dslim/bert-base-NER",
-                device=0 if self.device == "cuda" else -1
-            )
+            ner_pipeline = self._get_pipeline("ner", "dslim/bert-base-NER")
+            
+            # Sub-batch di lunghezza simile: padding quasi nullo
+            order = _length_order(texts)
+            sorted_texts = [texts[i] for i in order]
             
-            batch_size = self.batch_config['sentiment_batch']
             all_keywords = []
             
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                
-                # Run NER
-                batch_entities = ner_pipeline(batch)
-                
-                # Extract unique entities as keywords
-                for entities in batch_entities:
-                    keywords = list(set([
-                        ent['word'].replace('##', '')
-                        for ent in entities
-                        if ent['score'] > 0.8
-                    ]))[:max_keywords]
-                    
-                    all_keywords.append(keywords)
+            # Run NER: input da generatore, la pipeline batcha (batch_size)
+            # e restituisce le entità testo per testo senza bufferizzarle
+            with self._pipeline_ctx():
+                for entities in ner_pipeline(text for text in sorted_texts):
+                    all_keywords.append(_top_keywords(entities, max_keywords))
             
-            return all_keywords
+            return _restore_order(all_keywords, order)
             
         except Exception as e:
             logger.error(f"Keyword extraction failed: {e}")
             # Fallback semplice
             return [text.split()[:max_keywords] for text in texts]
     
+    async def optimize_all_batch(
+        self,
+        titles: List[str],
+        descriptions: List[str],
+        categories: List[str]
+    ) -> Tuple[List[str], List[str], List[List[str]]]:
+        """
+        Titoli, descrizioni e keywords in un'unica chiamata
+        
+        I tre modelli (seq2seq, causal, NER) non condividono encoder né
+        tokenizer, quindi non c'è un forward pass comune da fondere: qui si
+        prepara l'input una volta sola, ogni passo vede solo gli input
+        distinti e i tre passi partono insieme.
+        
+        Returns:
+            (titoli ottimizzati, descrizioni generate, keywords per prodotto)
+        """
+        texts = [f"{t} {d}" for t, d in zip(titles, descriptions)]
+        
+        optimized_titles, optimized_descriptions, keywords = await asyncio.gather(
+            self._on_stream(
+                "title", self._run_unique, self.optimize_titles_batch, titles, categories
+            ),
+            self._on_stream(
+                "desc", self._run_unique, self.generate_descriptions_batch,
+                titles, descriptions, categories
+            ),
+            self._on_stream("keywords", self._run_unique, self.extract_keywords_batch, texts)
+        )
+        return optimized_titles, optimized_descriptions, keywords
+    
+    async def optimize_all_stream(
+        self,
+        titles: List[str],
+        descriptions: List[str],
+        categories: List[str]
+    ) -> AsyncGenerator[Tuple[int, str, str, List[str]], None]:
+        """
+        Come optimize_all_batch, ma per micro-batch
+        
+        I micro-batch girano uno alla volta su un unico thread worker (il
+        calcolo su device non blocca il loop) e il successivo parte prima di
+        restituire il corrente: il chiamante costruisce i risultati mentre il
+        device lavora. Se il consumer si ferma, il micro-batch già partito non
+        si può interrompere: termina sul worker e il risultato è scartato.
+        
+        Yields:
+            (indice, titolo ottimizzato, descrizione, keywords)
+        """
+        step = self.batch_config['description_batch']
+        
+        def run_chunk(start: int):
+            end = start + step
+            return asyncio.run(self.optimize_all_batch(
+                titles[start:end],
+                descriptions[start:end],
+                categories[start:end]
+            ))
+        
+        loop = asyncio.get_running_loop()
+        
+        def launch(start: int) -> asyncio.Future:
+            return loop.run_in_executor(self._stream_executor, run_chunk, start)
+        
+        pending = launch(0) if titles else None
+        try:
+            for start in range(0, len(titles), step):
+                chunk_titles, chunk_descriptions, chunk_keywords = await pending
+                pending = launch(start + step) if start + step < len(titles) else None
+                
+                for offset, (title, description, keywords) in enumerate(
+                    zip(chunk_titles, chunk_descriptions, chunk_keywords)
+                ):
+                    yield start + offset, title, description, keywords
+        finally:
+            if pending is not None:
+                pending.cancel()
+    
     async def analyze_sentiment_batch(
         self,
         texts: List[str]
@@ -346,34 +803,24 @@ class GPUOptimizer:
         Returns:
             Lista sentiment scores (-1 a 1)
         """
-        model_name = self.config.model_sentiment
-        
-        # Crea pipeline sentiment
-        sentiment_pipeline = pipeline(
+        sentiment_pipeline = self._get_pipeline(
             "sentiment-analysis",
-            model=model_name,
-            device=0 if self.device == "cuda" else -1
+            self.config.model_sentiment
         )
         
-        batch_size = self.batch_config['sentiment_batch']
-        all_sentiments = []
+        # Analyze: la pipeline batcha internamente (batch_size)
+        with self._pipeline_ctx():
+            results = sentiment_pipeline(texts)
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            
-            # Analyze
-            results = sentiment_pipeline(batch)
-            
-            # Convert to normalized scores
-            for result in results:
-                if result['label'] == 'POSITIVE':
-                    score = result['score']
-                else:
-                    score = -result['score']
-                
-                all_sentiments.append(score)
-        
-        return all_sentiments
+        # Convert to normalized scores: segno dal label, vettoriale
+        count = len(results)
+        positive = np.fromiter(
+            (result['label'] == 'POSITIVE' for result in results), dtype=bool, count=count
+        )
+        scores = np.fromiter(
+            (result['score'] for result in results), dtype=np.float64, count=count
+        )
+        return np.where(positive, scores, -scores).tolist()
     
     def get_memory_usage(self) -> Dict[str, float]:
         """Ottieni utilizzo memoria GPU"""
@@ -391,10 +838,15 @@ class GPUOptimizer:
             }
     
     def clear_cache(self):
-        """Pulisci cache GPU"""
+        """
+        Restituisce al driver la memoria GPU cachata
+        
+        Da usare solo tra fasi (es. a fine process_massive_batch o allo
+        shutdown), mai nei loop: svuotare il caching allocator obbliga le
+        allocazioni successive a ripassare dal driver.
+        """
         if self.device == "cuda":
             torch.cuda.empty_cache()
-            torch.cuda.synchronize()
             logger.info("GPU cache cleared")
 
 
@@ -415,13 +867,16 @@ class GPUBatchOptimizer(GPUOptimizer):
             self._compile_models()
     
     def _compile_models(self):
-        """Compila modelli per performance ottimali (PyTorch 2.0+)"""
-        try:
-            for key, model in self._models.items():
-                logger.info(f"Compiling model {key} with torch.compile")
-                self._models[key] = torch.compile(model, mode="reduce-overhead")
-        except Exception as e:
-            logger.warning(f"Model compilation failed: {e}")
+        """
+        Compila modelli per performance ottimali (PyTorch 2.0+)
+        
+        Si compila il forward, non il modulo: generate() è un loop Python
+        che chiama il forward a ogni token. I modelli caricati dopo vengono
+        compilati da _get_model.
+        """
+        self._compile_enabled = True
+        for key, model in self._models.items():
+            self._compile_forward(key, model)
     
     async def process_massive_batch(
         self,
@@ -459,37 +914,51 @@ class GPUBatchOptimizer(GPUOptimizer):
         descriptions = [p.get('description', '') for p in products]
         categories = [p.get('category', 'General') for p in products]
         
-        # Process in parallelo
+        texts = [f"{t} {d}" for t, d in zip(titles, descriptions)]
+        
+        # Process in parallelo, ogni passo solo sugli input distinti
         tasks = [
-            self.optimize_titles_batch(titles, categories),
-            self.generate_descriptions_batch(titles, descriptions, categories),
-            self.extract_keywords_batch([f"{t} {d}" for t, d in zip(titles, descriptions)]),
-            self.analyze_sentiment_batch(descriptions)
+            self._on_stream(
+                "title", self._run_unique, self.optimize_titles_batch, titles, categories
+            ),
+            self._on_stream(
+                "desc", self._run_unique, self.generate_descriptions_batch,
+                titles, descriptions, categories
+            ),
+            self._on_stream("keywords", self._run_unique, self.extract_keywords_batch, texts),
+            self._on_stream(
+                "sentiment", self._run_unique, self.analyze_sentiment_batch, descriptions
+            )
         ]
         
-        results = await asyncio.gather(*tasks)
+        (
+            optimized_titles,
+            optimized_descriptions,
+            keywords_list,
+            sentiments
+        ) = await asyncio.gather(*tasks)
         
-        optimized_titles = results[0]
-        optimized_descriptions = results[1]
-        keywords_list = results[2]
-        sentiments = results[3]
+        # Metadata identici per tutto il batch: calcolati una volta, copiati per prodotto
+        metadata = {
+            'device': self.device,
+            'level': optimization_level,
+            'timestamp': time.monotonic_ns()
+        }
         
         # Combina risultati
-        optimized_products = []
-        for i, product in enumerate(products):
-            optimized = product.copy()
-            optimized.update({
-                'optimized_title': optimized_titles[i],
-                'optimized_description': optimized_descriptions[i],
-                'keywords': keywords_list[i],
-                'sentiment_score': sentiments[i],
-                'optimization_metadata': {
-                    'device': self.device,
-                    'level': optimization_level,
-                    'timestamp': asyncio.get_event_loop().time()
-                }
-            })
-            optimized_products.append(optimized)
+        optimized_products = [
+            {
+                **product,
+                'optimized_title': title,
+                'optimized_description': description,
+                'keywords': keywords,
+                'sentiment_score': sentiment,
+                'optimization_metadata': metadata.copy()
+            }
+            for product, title, description, keywords, sentiment in zip(
+                products, optimized_titles, optimized_descriptions, keywords_list, sentiments
+            )
+        ]
         
         # Log stats
         memory_stats = self.get_memory_usage()
@@ -75,10 +75,30 @@ class BasePublisher(ABC):
         # Publish
         return await self._do_publish(listing)
         
+    async def publish_many(self, listings: List[Dict[str, Any]]) -> List[PublishResult]:
+        """Pubblica una lista di listing, risultati nello stesso ordine"""
+        valid = await asyncio.gather(*(self.validate_listing(listing) for listing in listings))
+        to_publish = [listing for listing, ok in zip(listings, valid) if ok]
+        published = iter(await self._do_publish_many(to_publish) if to_publish else ())
+        
+        return [
+            next(published) if ok else PublishResult(
+                listing_id="",
+                marketplace=self.marketplace_name,
+                status=PublishStatus.FAILED,
+                error="Validation failed"
+            )
+            for ok in valid
+        ]
+        
     @abstractmethod
     async def _do_publish(self, listing: Dict[str, Any]) -> PublishResult:
         """Implementazione specifica pubblicazione"""
         pass
+        
+    async def _do_publish_many(self, listings: List[Dict[str, Any]]) -> List[PublishResult]:
+        """Pubblicazione multipla; i marketplace con endpoint batch la sovrascrivono"""
+        return list(await asyncio.gather(*(self._do_publish(listing) for listing in listings)))
 
 
 class MultiPlatformPublisher:
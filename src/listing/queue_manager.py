@@ -3,10 +3,13 @@ Queue manager per pubblicazioni asincrone
 Basato su: asyncio patterns e priority queue
 """
 import asyncio
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Deque
 from dataclasses import dataclass, field
 from datetime import datetime
 import heapq
+from collections import deque
+import itertools
+import time
 from enum import Enum
 from src.listing.publisher import PublishResult, PublishStatus
 
@@ -17,27 +20,38 @@ class Priority(Enum):
     HIGH = 1
     URGENT = 0
 
+# Ordine di inserimento: spareggio stabile a parità di priorità
+_enqueue_counter = itertools.count()
+
+# Backoff retry: 5 minuti per tentativo, in nanosecondi
+_RETRY_DELAY_NS = 5 * 60 * 1_000_000_000
+
 @dataclass(order=True)
 class QueueItem:
-    """Item in coda con priorità"""
+    """Item in coda con priorità (FIFO a parità di priorità)"""
     priority: int
-    scheduled_at: datetime = field(compare=False)
+    scheduled_at_ns: int = field(compare=False)  # time.monotonic_ns()
     listing: Dict[str, Any] = field(compare=False)
     marketplace: str = field(compare=False)
     retries: int = field(default=0, compare=False)
+    seq: int = field(default_factory=lambda: next(_enqueue_counter))
 
 class PublishingQueue:
     """
     Coda pubblicazioni con priorità e scheduling
     """
     
-    def __init__(self, max_concurrent: int = 5):
+    def __init__(self, max_concurrent: int = 5, max_results: int = 10_000):
         self.queue: List[QueueItem] = []
         self.max_concurrent = max_concurrent
         self.active_tasks: Dict[str, asyncio.Task] = {}
-        self.results: Dict[str, PublishResult] = {}
+        # Solo gli ultimi max_results risultati: memoria limitata
+        self.results: Deque[PublishResult] = deque(maxlen=max_results)
         self._running = False
         self._publishers: Dict[str, Any] = {}
+        # Scheduler event-driven: risvegliato da nuovi item e task conclusi
+        self._wakeup = asyncio.Event()
+        self._slot_free = asyncio.Semaphore(max_concurrent)
         
     def register_publisher(self, marketplace: str, publisher: Any):
         """Registra publisher per marketplace"""
@@ -51,60 +65,120 @@ class PublishingQueue:
         scheduled_at: Optional[datetime] = None
     ) -> str:
         """Aggiungi listing alla coda"""
+        # Scheduling su clock monotono: datetime convertito una volta sola
+        scheduled_at_ns = time.monotonic_ns()
+        if scheduled_at is not None:
+            delay = (scheduled_at - datetime.now()).total_seconds()
+            scheduled_at_ns += max(0, int(delay * 1_000_000_000))
+        
         item = QueueItem(
             priority=priority.value,
-            scheduled_at=scheduled_at or datetime.now(),
+            scheduled_at_ns=scheduled_at_ns,
             listing=listing,
             marketplace=marketplace
         )
         
         # Generate queue ID
-        queue_id = f"{marketplace}_{datetime.now().timestamp()}"
+        queue_id = f"{marketplace}_{item.seq}"
         
         # Add to priority queue
         heapq.heappush(self.queue, item)
+        self._wakeup.set()
         
         # Start processing if not running
-        if not self._running:
-            asyncio.create_task(self._process_queue())
+        self._ensure_running()
             
         return queue_id
         
+    async def add_many(
+        self,
+        listings: Iterable[Dict[str, Any]],
+        marketplace: str,
+        priority: Priority = Priority.NORMAL,
+        scheduled_at: Optional[datetime] = None
+    ) -> List[str]:
+        """Aggiungi più listing in blocco: un solo heapify e un solo risveglio"""
+        scheduled_at_ns = time.monotonic_ns()
+        if scheduled_at is not None:
+            delay = (scheduled_at - datetime.now()).total_seconds()
+            scheduled_at_ns += max(0, int(delay * 1_000_000_000))
+        
+        items = [
+            QueueItem(
+                priority=priority.value,
+                scheduled_at_ns=scheduled_at_ns,
+                listing=listing,
+                marketplace=marketplace
+            )
+            for listing in listings
+        ]
+        if not items:
+            return []
+        
+        self.queue.extend(items)
+        heapq.heapify(self.queue)
+        self._wakeup.set()
+        self._ensure_running()
+        
+        return [f"{marketplace}_{item.seq}" for item in items]
+        
+    def _ensure_running(self):
+        """Avvia lo scheduler se non è già attivo"""
+        if not self._running:
+            self._running = True
+            asyncio.create_task(self._process_queue())
+        
     async def _process_queue(self):
         """Processa coda con concorrenza limitata"""
         self._running = True
         
-        while self.queue or self.active_tasks:
+        while self._running and (self.queue or self.active_tasks):
+            if not self.queue:
+                # Solo task attivi: attende un nuovo item o la fine di un task
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+                
             # Check for scheduled items ready to process
-            now = datetime.now()
+            wait_ns = self.queue[0].scheduled_at_ns - time.monotonic_ns()
+            if wait_ns > 0:
+                # Wait until next scheduled item (o un item più urgente)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait_ns / 1_000_000_000)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+                
+            # Start new task when a slot is free
+            await self._slot_free.acquire()
+            if not self.queue or self.queue[0].scheduled_at_ns > time.monotonic_ns():
+                # Coda cambiata mentre si attendeva lo slot
+                self._slot_free.release()
+                continue
+                
+            item = heapq.heappop(self.queue)
+            task_id = f"{item.marketplace}_{item.seq}"
+            
+            # Create publish task
+            task = asyncio.create_task(
+                self._publish_item(item)
+            )
+            self.active_tasks[task_id] = task
             
-            # Start new tasks if under limit
-            while self.queue and len(self.active_tasks) < self.max_concurrent:
-                # Peek at next item
-                if self.queue[0].scheduled_at <= now:
-                    item = heapq.heappop(self.queue)
-                    task_id = f"{item.marketplace}_{id(item)}"
-                    
-                    # Create publish task
-                    task = asyncio.create_task(
-                        self._publish_item(item)
-                    )
-                    self.active_tasks[task_id] = task
-                    
-                    # Add callback to clean up
-                    task.add_done_callback(
-                        lambda t, tid=task_id: self.active_tasks.pop(tid, None)
-                    )
-                else:
-                    # Wait until next scheduled item
-                    wait_time = (self.queue[0].scheduled_at - now).total_seconds()
-                    await asyncio.sleep(min(wait_time, 1))
-                    
-            # Wait a bit before checking again
-            await asyncio.sleep(0.1)
+            # Add callback to clean up
+            task.add_done_callback(
+                lambda t, tid=task_id: self._on_task_done(tid)
+            )
             
         self._running = False
         
+    def _on_task_done(self, task_id: str):
+        """Libera lo slot e risveglia lo scheduler"""
+        self.active_tasks.pop(task_id, None)
+        self._slot_free.release()
+        self._wakeup.set()
+        
     async def _publish_item(self, item: QueueItem) -> PublishResult:
         """Pubblica singolo item con gestione errori"""
         publisher = self._get_publisher(item.marketplace)
@@ -119,7 +193,7 @@ class PublishingQueue:
         
         try:
             result = await publisher.publish(item.listing)
-            self.results[id(item)] = result
+            self.results.append(result)
             return result
             
         except Exception as e:
@@ -127,8 +201,7 @@ class PublishingQueue:
             if item.retries < 3:
                 item.retries += 1
                 # Schedule retry with exponential backoff
-                from datetime import timedelta
-                item.scheduled_at = datetime.now() + timedelta(minutes=5 * item.retries)
+                item.scheduled_at_ns = time.monotonic_ns() + _RETRY_DELAY_NS * item.retries
                 heapq.heappush(self.queue, item)
                 
             return PublishResult(
@@ -154,9 +227,10 @@ class PublishingQueue:
         
     async def get_results(self, limit: int = 100) -> List[PublishResult]:
         """Ottieni ultimi risultati"""
-        # Return last N results
-        results_list = list(self.results.values())
-        return results_list[-limit:]
+        # Return last N results: dalla coda del deque, O(limit)
+        latest = list(itertools.islice(reversed(self.results), limit))
+        latest.reverse()
+        return latest
         
     async def clear_queue(self):
         """Svuota coda"""
@@ -165,8 +239,9 @@ class PublishingQueue:
     async def pause(self):
         """Pausa processamento"""
         self._running = False
+        self._wakeup.set()
         
     async def resume(self):
         """Riprendi processamento"""
-        if not self._running and self.queue:
-            asyncio.create_task(self._process_queue())
+        if self.queue:
+            self._ensure_running()
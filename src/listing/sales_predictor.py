@@ -3,12 +3,169 @@ Sales prediction con Facebook Prophet
 Basato su: facebook/prophet
 Ref: https://github.com/facebook/prophet
 """
+import prophet
 from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
 import pandas as pd
 import numpy as np
+import functools
+import hashlib
+import logging
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
+BASE_DAILY_SALES = 10  # Base sales per new product
+
+# Category multipliers
+CATEGORY_MULTIPLIERS = {
+    'jewelry': 1.5,
+    'electronics': 2.0,
+    'home': 1.2,
+    'health': 1.8
+}
+
+# Price elasticity per fascia: < 20, 20-100, > 100
+PRICE_MULTIPLIERS = (1.5, 1.0, 0.7)
+_PRICE_MULTIPLIERS_ARR = np.array(PRICE_MULTIPLIERS)
+
+def _price_bucket(price) -> int:
+    """Fascia di prezzo come int (anche per scalari numpy); NaN resta nella fascia centrale"""
+    return int(not price < 20) + int(price > 100)
+
+# Competition factor
+COMPETITION_MULTIPLIERS = {
+    'low': 1.3,
+    'high': 0.8
+}
+
+# Parametri del modello Prophet: entrano anche nella chiave della cache su disco
+PROPHET_PARAMS = {
+    'changepoint_prior_scale': 0.05,
+    'seasonality_mode': 'multiplicative',
+    'yearly_seasonality': True,
+    'weekly_seasonality': True,
+    'daily_seasonality': False
+}
+PROPHET_MONTHLY_SEASONALITY = {'name': 'monthly', 'period': 30.5, 'fourier_order': 5}
+PROPHET_HOLIDAYS_COUNTRY = 'IT'
+
+# Stagionalità (periodo in giorni, ordine di Fourier) come nel modello Prophet
+SEASONALITIES = (
+    (365.25, 10),  # yearly
+    (7.0, 3),      # weekly
+    (30.5, 5),     # monthly
+)
+
+_DESIGN_WIDTH = 2 + 2 * sum(order for _, order in SEASONALITIES)
+
+def _fourier_design(t: np.ndarray, span: float) -> np.ndarray:
+    """Matrice (N, D): intercetta, trend lineare, sin/cos per ogni stagionalità"""
+    X = np.empty((t.shape[0], _DESIGN_WIDTH), dtype=np.float64)
+    X[:, 0] = 1.0
+    np.divide(t, span, out=X[:, 1])
+    
+    col = 2
+    for period, order in SEASONALITIES:
+        # Angoli scritti nelle colonne sin, cos calcolato prima di sovrascriverli
+        angles = X[:, col:col + order]
+        np.multiply.outer(t, 2 * np.pi * np.arange(1, order + 1) / period, out=angles)
+        np.cos(angles, out=X[:, col + order:col + 2 * order])
+        np.sin(angles, out=angles)
+        col += 2 * order
+    return X
+
+class FastSeasonalPredictor:
+    """
+    Trend lineare + stagionalità di Fourier con un solo np.linalg.lstsq
+    Alternativa leggera a Prophet per scoring su scala catalogo
+    """
+    
+    def __init__(self):
+        self.beta: Optional[np.ndarray] = None
+        self.sigma = 0.0
+        self.start: Optional[pd.Timestamp] = None
+        self.span = 1.0
+        self.history: Optional[pd.Series] = None
+        
+    def fit(self, historical_data: pd.DataFrame) -> 'FastSeasonalPredictor':
+        """Expected columns: ds (date), y (sales)"""
+        ds = pd.to_datetime(historical_data['ds'])
+        y = historical_data['y'].to_numpy(dtype=np.float64)
+        
+        self.start = ds.min()
+        t = self._days(ds)
+        self.span = max(float(t.max()), 1.0)
+        
+        X = _fourier_design(t, self.span)
+        self.beta, *_ = np.linalg.lstsq(X, y, rcond=None)
+        
+        residuals = y - X @ self.beta
+        self.sigma = float(residuals.std())
+        self.history = ds
+        return self
+        
+    def predict(self, periods: int = 30, include_history: bool = False) -> pd.DataFrame:
+        """Stesso formato di Prophet: ds, yhat, yhat_lower, yhat_upper"""
+        if self.beta is None:
+            raise ValueError("Model not trained")
+        
+        future = pd.date_range(self.history.max(), periods=periods + 1, freq='D')[1:]
+        if include_history:
+            future = pd.DatetimeIndex(self.history).append(future)
+        
+        yhat = _fourier_design(self._days(future), self.span) @ self.beta
+        interval = 1.96 * self.sigma
+        
+        return pd.DataFrame({
+            'ds': future,
+            'yhat': yhat,
+            'yhat_lower': yhat - interval,
+            'yhat_upper': yhat + interval
+        })
+        
+    def _days(self, ds) -> np.ndarray:
+        """Giorni (float) dall'inizio dello storico"""
+        return np.asarray((ds - self.start) / pd.Timedelta(days=1), dtype=np.float64)
+
+@functools.lru_cache(maxsize=4096)
+def _potential(
+    category: str,
+    price_bucket: int,
+    competition: str,
+    has_market_data: bool
+) -> Tuple[float, float, float, float, float]:
+    """
+    Stima per prodotto nuovo, memoizzata: l'input ha poche combinazioni distinte
+    
+    Returns:
+        (daily, monthly, confidence, category_impact, price_impact)
+    """
+    category_impact = CATEGORY_MULTIPLIERS.get(category, 1.0)
+    
+    # Price elasticity: low price = higher volume, high price = lower volume
+    multiplier = category_impact * PRICE_MULTIPLIERS[price_bucket]
+    
+    # Competition factor
+    multiplier *= COMPETITION_MULTIPLIERS.get(competition, 1.0)
+    
+    # Calculate estimates
+    estimated_daily = BASE_DAILY_SALES * multiplier
+    estimated_monthly = estimated_daily * 30
+    
+    # Confidence based on data availability
+    confidence = 0.8 if has_market_data else 0.5
+    
+    return (
+        round(estimated_daily, 1),
+        round(estimated_monthly, 1),
+        confidence,
+        category_impact,
+        multiplier / category_impact
+    )
+
 class SalesPredictor:
     """
     Predittore vendite basato su Prophet + features custom
@@ -22,29 +179,66 @@ class SalesPredictor:
         """
         Train model su dati storici
         Expected columns: ds (date), y (sales)
+        
+        Con backend='fast' usa FastSeasonalPredictor (nessun fit Stan).
+        Con prophet_cache attivo il modello fittato è salvato su disco,
+        indicizzato per hash dei dati: stessi dati, nessun nuovo fit.
         """
+        # Date parsate una volta al confine (Prophet le riconvertirebbe a ogni fit);
+        # anche l'hash della cache diventa indipendente dal formato delle date
+        if not pd.api.types.is_datetime64_any_dtype(historical_data['ds']):
+            historical_data = historical_data.assign(ds=pd.to_datetime(historical_data['ds'], cache=True))
+        
+        if self.config.get('backend', 'prophet') == 'fast':
+            self.model = FastSeasonalPredictor().fit(historical_data)
+            return
+        
+        cache_path = None
+        if self.config.get('prophet_cache', True):
+            cache_path = self._model_cache_path(historical_data)
+            if cache_path.exists():
+                try:
+                    self.model = model_from_json(cache_path.read_text())
+                    return
+                except Exception as e:
+                    # File corrotto o incompatibile: nuovo fit, poi sovrascritto
+                    logger.warning(f"Prophet model cache unreadable, refitting: {e}")
+        
         # Initialize Prophet with custom parameters
-        self.model = Prophet(
-            changepoint_prior_scale=0.05,
-            seasonality_mode='multiplicative',
-            yearly_seasonality=True,
-            weekly_seasonality=True,
-            daily_seasonality=False
-        )
+        self.model = Prophet(**PROPHET_PARAMS)
         
         # Add custom seasonalities
-        self.model.add_seasonality(
-            name='monthly',
-            period=30.5,
-            fourier_order=5
-        )
+        self.model.add_seasonality(**PROPHET_MONTHLY_SEASONALITY)
         
         # Add country holidays (Italy)
-        self.model.add_country_holidays(country_name='IT')
+        self.model.add_country_holidays(country_name=PROPHET_HOLIDAYS_COUNTRY)
         
         # Fit model
         self.model.fit(historical_data)
         
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                cache_path.write_text(model_to_json(self.model))
+            except OSError as e:
+                logger.warning(f"Prophet model cache write failed: {e}")
+    
+    def _model_cache_path(self, historical_data: pd.DataFrame) -> Path:
+        """Path del modello serializzato per questi dati storici, parametri e versione Prophet"""
+        hasher = hashlib.blake2b(
+            pd.util.hash_pandas_object(historical_data).values.tobytes(),
+            digest_size=16
+        )
+        hasher.update(repr((
+            prophet.__version__,
+            sorted(PROPHET_PARAMS.items()),
+            sorted(PROPHET_MONTHLY_SEASONALITY.items()),
+            PROPHET_HOLIDAYS_COUNTRY
+        )).encode())
+        digest = hasher.hexdigest()
+        cache_dir = Path(self.config.get('prophet_cache_dir', './.cache'))
+        return cache_dir / f"prophet_{digest}.json"
+        
     def predict(
         self,
         periods: int = 30,
@@ -53,6 +247,9 @@ class SalesPredictor:
         """Predici vendite future"""
         if not self.model:
             raise ValueError("Model not trained")
+        
+        if isinstance(self.model, FastSeasonalPredictor):
+            return self.model.predict(periods=periods, include_history=include_history)
             
         # Make future dataframe
         future = self.model.make_future_dataframe(
@@ -73,49 +270,58 @@ class SalesPredictor:
         """
         Analizza potenziale vendite per nuovo prodotto
         """
-        base_sales = 10  # Base sales per new product
-        
-        # Category multipliers
-        category_multipliers = {
-            'jewelry': 1.5,
-            'electronics': 2.0,
-            'home': 1.2,
-            'health': 1.8
-        }
-        
-        category = product_features.get('category', 'other')
-        multiplier = category_multipliers.get(category, 1.0)
-        
-        # Price elasticity
         price = product_features.get('price', 50)
-        if price < 20:
-            multiplier *= 1.5  # Low price = higher volume
-        elif price > 100:
-            multiplier *= 0.7  # High price = lower volume
-            
-        # Competition factor
-        competition = product_features.get('competition_level', 'medium')
-        if competition == 'low':
-            multiplier *= 1.3
-        elif competition == 'high':
-            multiplier *= 0.8
-            
-        # Calculate estimates
-        estimated_daily = base_sales * multiplier
-        estimated_monthly = estimated_daily * 30
+        estimated_daily, estimated_monthly, confidence, category_impact, price_impact = _potential(
+            product_features.get('category', 'other'),
+            _price_bucket(price),
+            product_features.get('competition_level', 'medium'),
+            market_data is not None and len(market_data) > 30
+        )
         
-        # Confidence based on data availability
-        confidence = 0.5
-        if market_data is not None and len(market_data) > 30:
-            confidence = 0.8
-            
         return {
-            'estimated_daily_sales': round(estimated_daily, 1),
-            'estimated_monthly_sales': round(estimated_monthly, 1),
+            'estimated_daily_sales': estimated_daily,
+            'estimated_monthly_sales': estimated_monthly,
             'confidence': confidence,
             'factors': {
-                'category_impact': category_multipliers.get(category, 1.0),
-                'price_impact': multiplier / category_multipliers.get(category, 1.0),
+                'category_impact': category_impact,
+                'price_impact': price_impact,
                 'competition_impact': 1.0
             }
         }
+        
+    def analyze_product_potential_batch(
+        self,
+        products: pd.DataFrame,
+        market_data: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """
+        Versione vettoriale di analyze_product_potential per interi cataloghi
+        Expected columns: category, price, competition_level
+        
+        Returns:
+            Copia del DataFrame con stime e fattori come colonne
+        """
+        # Un passaggio per colonna invece di N dict/branch Python
+        category_impact = products['category'].map(CATEGORY_MULTIPLIERS).fillna(1.0).to_numpy(dtype=np.float64)
+        
+        price = products['price'].fillna(50).to_numpy(dtype=np.float64)
+        multiplier = category_impact * _PRICE_MULTIPLIERS_ARR[(price >= 20).astype(np.intp) + (price > 100)]
+        multiplier *= (
+            products['competition_level'].map(COMPETITION_MULTIPLIERS).fillna(1.0).to_numpy(dtype=np.float64)
+        )
+        
+        estimated_daily = BASE_DAILY_SALES * multiplier
+        
+        # Confidence based on data availability
+        confidence = 0.8 if market_data is not None and len(market_data) > 30 else 0.5
+        
+        return products.assign(
+            estimated_daily_sales=np.round(estimated_daily, 1),
+            estimated_monthly_sales=np.round(estimated_daily * 30, 1),
+            confidence=confidence,
+            category_impact=category_impact,
+            # Stessi fattori di analyze_product_potential: la competizione
+            # rientra in price_impact, competition_impact resta 1.0
+            price_impact=multiplier / category_impact,
+            competition_impact=1.0
+        )
@@ -4,21 +4,42 @@ Basato su: cookiecutter/cookiecutter v2.5.0
 Ref: https://github.com/cookiecutter/cookiecutter
 """
 import os
-import json
+import functools
+import re
+import hashlib
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Literal, NamedTuple, Optional, List, Tuple, Union
 
-from cookiecutter.exceptions import CookiecutterException
-from pydantic import BaseModel, Field, ValidationError, field_validator, ConfigDict
+import orjson
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator, ConfigDict
 import jinja2
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+# Bytecode dei template compilati condiviso tra processi
+_JINJA_BYTECODE_DIR = Path('./.cache/jinja_bc')
+
+# Come cookiecutter: niente autoescape, newline finale preservato
+_COOKIECUTTER_ENV = Environment(keep_trailing_newline=True)
+
+# Render Jinja memoizzati per base_path
+_RENDER_MEMO_SIZE = 1024
+
+_VERSION_RE = re.compile(r"^\d+\.\d+\.\d+$")
 
 class TemplateConfig(BaseModel):
     """Configurazione template con validazione Pydantic"""
     template_id: str = Field(..., min_length=1, max_length=100)
-    category: str = Field(..., pattern="^(jewelry|electronics|home|health)$")
-    language: str = Field("it", pattern="^(it|en|de|fr|es)$")
-    version: str = Field("1.0.0", pattern=r"^\d+\.\d+\.\d+$")
+    # Literal: validati da pydantic-core con lookup, senza regex
+    category: Literal['jewelry', 'electronics', 'home', 'health']
+    language: Literal['it', 'en', 'de', 'fr', 'es'] = "it"
+    version: str = "1.0.0"
+    
+    @field_validator('version', mode='after')
+    @classmethod
+    def validate_version(cls, v):
+        if not _VERSION_RE.match(v):
+            raise ValueError('Version must be MAJOR.MINOR.PATCH')
+        return v
     
     model_config = ConfigDict(
         json_schema_extra = {
@@ -43,30 +64,32 @@ class TemplateData(BaseModel):
     @field_validator('features', 'benefits')
     @classmethod
     def validate_items(cls, v):
-        if isinstance(v, list):
-            for item in v:
-                if len(item) > 500:
-                    raise ValueError('Feature/benefit too long (max 500 chars)')
+        if v and max(map(len, v)) > 500:
+            raise ValueError('Feature/benefit too long (max 500 chars)')
         return v
 
+# Validatore core-schema costruito una volta sola
+_TEMPLATE_DATA_ADAPTER = TypeAdapter(TemplateData)
+_TEMPLATE_CONFIGS_ADAPTER = TypeAdapter(List[TemplateConfig])
+
 class TemplateRegistry:
     """Registry per gestione centralizzata dei template"""
     
     def __init__(self):
         self._templates: Dict[str, TemplateConfig] = {}
-        self._categories: Dict[str, List[str]] = {
-            'jewelry': [],
-            'electronics': [],
-            'home': [],
-            'health': []
+        # dict come insieme ordinato: membership O(1), ordine di registrazione
+        self._categories: Dict[str, Dict[str, None]] = {
+            'jewelry': {},
+            'electronics': {},
+            'home': {},
+            'health': {}
         }
     
     def register(self, config: TemplateConfig) -> None:
         """Registra un nuovo template"""
         self._templates[config.template_id] = config
         if config.category in self._categories:
-            if config.template_id not in self._categories[config.category]:
-                self._categories[config.category].append(config.template_id)
+            self._categories[config.category][config.template_id] = None
     
     def get(self, template_id: str) -> Optional[TemplateConfig]:
         """Ottiene configurazione template"""
@@ -74,13 +97,60 @@ class TemplateRegistry:
     
     def list_by_category(self, category: str) -> List[str]:
         """Lista template per categoria"""
-        return self._categories.get(category, [])
+        return list(self._categories.get(category, ()))
     
     def exists(self, template_id: str) -> bool:
         """Verifica se template esiste"""
         return template_id in self._templates
 
 
+class _SharedState(NamedTuple):
+    """Stato per base_path condiviso da tutte le istanze di AdvancedTemplateEngine"""
+    env: Environment
+    registry: Dict[str, TemplateConfig]
+    # Template Jinja compilati per percorso (categoria/template_id.j2)
+    compiled: Dict[str, jinja2.Template]
+    # Output Jinja memoizzato in-process per (percorso, dati)
+    rendered: Dict[Tuple[str, bytes], str]
+    # File dei template cookiecutter compilati per template_id
+    cc_templates: Dict[str, List[Tuple[str, jinja2.Template]]]
+
+
+@functools.lru_cache(maxsize=16)
+def _bootstrap(base_path: str) -> _SharedState:
+    """
+    Setup una volta per base_path (processo): directory, Environment e registry
+    
+    Environment, registry, compilati e memo dei render sono condivisi da
+    tutte le istanze sulla stessa base_path: una re-registrazione li
+    invalida per tutte.
+    """
+    root = Path(base_path)
+    for category in ('jewelry', 'electronics', 'home', 'health'):
+        (root / category).mkdir(parents=True, exist_ok=True)
+        
+    _JINJA_BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(base_path),
+        autoescape=select_autoescape(['html', 'xml']),
+        cache_size=400,
+        auto_reload=False,  # nessuno stat del file a ogni get_template
+        bytecode_cache=FileSystemBytecodeCache(str(_JINJA_BYTECODE_DIR))
+    )
+    
+    registry: Dict[str, TemplateConfig] = {}
+    registry_file = root / "registry.json"
+    if registry_file.exists():
+        configs = _TEMPLATE_CONFIGS_ADAPTER.validate_python(orjson.loads(registry_file.read_bytes()))
+        registry.update((config.template_id, config) for config in configs)
+    return _SharedState(env, registry, {}, {}, {})
+
+
+def _jinja_path(config: TemplateConfig) -> str:
+    """Percorso del template Jinja nel loader: cambia con la categoria"""
+    return f"{config.category}/{config.template_id}.j2"
+
+
 class AdvancedTemplateEngine:
     """
     Template engine enterprise con supporto multi-template,
@@ -90,39 +160,17 @@ class AdvancedTemplateEngine:
     def __init__(self, base_path: str = "./templates", cache: Optional[Any] = None):
         self.base_path = Path(base_path)
         self.cache = cache
-        self._ensure_directories()
-        
-        # Jinja2 environment per template semplici
-        self.jinja_env = Environment(
-            loader=FileSystemLoader(str(self.base_path)),
-            autoescape=select_autoescape(['html', 'xml']),
-            cache_size=50
-        )
         
-        # Template registry
-        self._registry: Dict[str, TemplateConfig] = {}
-        self._load_registry()
+        # Jinja2 environment per template semplici e template registry:
+        # directory e registry.json toccati una volta per base_path
+        # (anche compilati e memo dei render, vedi _SharedState)
+        shared = _bootstrap(str(self.base_path.resolve()))
+        self.jinja_env = shared.env
+        self._registry = shared.registry
+        self._compiled = shared.compiled
+        self._rendered = shared.rendered
+        self._cc_templates = shared.cc_templates
         
-    def _mock_cookiecutter(self, template, extra_context=None, no_input=True, output_dir=None):
-        """Mock cookiecutter per testing"""
-        return {"project_name": "mock_project", "files": []}
-
-    def _ensure_directories(self):
-        """Crea struttura directory se non esiste"""
-        dirs = ['jewelry', 'electronics', 'home', 'health']
-        for d in dirs:
-            (self.base_path / d).mkdir(parents=True, exist_ok=True)
-            
-    def _load_registry(self):
-        """Carica registry template da file"""
-        registry_file = self.base_path / "registry.json"
-        if registry_file.exists():
-            with open(registry_file) as f:
-                data = json.load(f)
-                for item in data:
-                    config = TemplateConfig(**item)
-                    self._registry[config.template_id] = config
-                    
     def register_template(self, config: TemplateConfig, template_dir: str):
         """Registra nuovo template"""
         # Validate template exists
@@ -130,25 +178,44 @@ class AdvancedTemplateEngine:
         if not template_path.exists():
             raise FileNotFoundError(f"Template not found: {template_path}")
             
+        # Re-registrazione: niente template compilati o render della versione precedente
+        self._invalidate_template(config, self._registry.get(config.template_id))
+            
         # Add to registry
         self._registry[config.template_id] = config
         self._save_registry()
         
+    def _invalidate_template(self, *configs: Optional[TemplateConfig]):
+        """Scarta compilati e render memoizzati dei template indicati"""
+        stale = {_jinja_path(config) for config in configs if config is not None}
+        for path in stale:
+            self._compiled.pop(path, None)
+        # In place: il memo è condiviso con le altre istanze
+        for key in [key for key in self._rendered if key[0] in stale]:
+            del self._rendered[key]
+        for config in configs:
+            if config is not None:
+                self._cc_templates.pop(config.template_id, None)
+        # auto_reload=False: anche l'Environment serve la versione in cache
+        if self.jinja_env.cache is not None:
+            self.jinja_env.cache.clear()
+        
     def _save_registry(self):
         """Salva registry su file"""
         registry_file = self.base_path / "registry.json"
-        data = [config.dict() for config in self._registry.values()]
-        with open(registry_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        data = [config.model_dump() for config in self._registry.values()]
+        registry_file.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
             
     async def render_template(
         self,
         template_id: str,
-        data: Dict[str, Any],
+        data: Union[Dict[str, Any], TemplateData],
         output_format: str = "html"
     ) -> str:
         """
         Render template con validazione e caching
+        
+        Un TemplateData già validato a monte non viene rivalidato.
         """
         # Validate template exists
         if template_id not in self._registry:
@@ -157,23 +224,33 @@ class AdvancedTemplateEngine:
         config = self._registry[template_id]
         
         # Validate data
-        try:
-            validated_data = TemplateData(**data, category=config.category)
-        except ValidationError as e:
-            raise ValueError(f"Invalid template data: {e}")
+        if isinstance(data, TemplateData):
+            validated_data = data
+            if data.category != config.category:
+                validated_data = data.model_copy(update={'category': config.category})
+        else:
+            try:
+                validated_data = _TEMPLATE_DATA_ADAPTER.validate_python(data | {'category': config.category})
+            except ValidationError as e:
+                raise ValueError(f"Invalid template data: {e}")
+            
+        # Un solo dump del modello, passato ai renderer
+        data_dump = validated_data.model_dump()
+        # JSON canonico: chiave stabile tra processi (hash() è randomizzato)
+        payload = orjson.dumps(data_dump, option=orjson.OPT_SORT_KEYS)
+            
+        # Jinja: template compilato + memo in-process, nessun roundtrip di cache
+        if output_format != "cookiecutter":
+            return await self._render_jinja(config, data_dump, payload)
             
         # Check cache
         if self.cache:
-            cache_key = f"template:{template_id}:{hash(str(validated_data.dict()))}"
+            cache_key = f"template:{template_id}:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
             cached = await self.cache.get(cache_key)
             if cached:
                 return cached
                 
-        # Render based on type
-        if output_format == "cookiecutter":
-            result = await self._render_cookiecutter(config, validated_data)
-        else:
-            result = await self._render_jinja(config, validated_data)
+        result = await self._render_cookiecutter(config, data_dump)
             
         # Cache result
         if self.cache:
@@ -181,36 +258,55 @@ class AdvancedTemplateEngine:
             
         return result
         
-    async def _render_cookiecutter(self, config: TemplateConfig, data: TemplateData) -> str:
-        """Render usando cookiecutter per template complessi"""
-        template_path = self.base_path / config.category / config.template_id
-        
+    async def _render_cookiecutter(self, config: TemplateConfig, data: Dict[str, Any]) -> str:
+        """Render in memoria dei file di un template cookiecutter (niente output su disco)"""
         try:
-            # Prepare context
-            context = {
-                'cookiecutter': data.dict()
-            }
+            templates = self._cc_templates.get(config.template_id)
+            if templates is None:
+                templates = self._cc_templates[config.template_id] = self._load_cookiecutter(config)
+                
+            context = {'cookiecutter': data}
+            return "".join(template.render(context) for _, template in templates)
             
-            # Render
-            output_dir = self._mock_cookiecutter(
-                str(template_path),
-                extra_context=context,
-                no_input=True,
-                output_dir="/tmp/rendered_templates"
-            )
+        except jinja2.TemplateError as e:
+            raise RuntimeError(f"Template rendering failed: {e}")
             
-            # Read rendered content
-            # (implementation depends on template structure)
+    def _load_cookiecutter(self, config: TemplateConfig) -> List[Tuple[str, jinja2.Template]]:
+        """Legge e compila una volta i file del template (ordine di percorso)"""
+        template_path = self.base_path / config.category / config.template_id
+        if not template_path.is_dir():
+            raise RuntimeError(f"Template rendering failed: {template_path} not found")
             
-        except CookiecutterException as e:
-            raise RuntimeError(f"Template rendering failed: {e}")
+        templates = []
+        for file_path in sorted(p for p in template_path.rglob('*') if p.is_file()):
+            try:
+                text = file_path.read_text(encoding='utf-8')
+            except UnicodeDecodeError:
+                continue  # file binari: copiati così come sono da cookiecutter
+            relpath = str(file_path.relative_to(template_path))
+            templates.append((relpath, _COOKIECUTTER_ENV.from_string(text)))
+        return templates
             
-    async def _render_jinja(self, config: TemplateConfig, data: TemplateData) -> str:
+    async def _render_jinja(self, config: TemplateConfig, data: Dict[str, Any], payload: bytes) -> str:
         """Render usando Jinja2 per template semplici"""
-        template_file = f"{config.category}/{config.template_id}.j2"
-        
+        # payload (JSON canonico di data) è la chiave hashable del memo
+        template_path = _jinja_path(config)
+        memo_key = (template_path, payload)
+        rendered = self._rendered.get(memo_key)
+        if rendered is not None:
+            return rendered
+            
         try:
-            template = self.jinja_env.get_template(template_file)
-            return template.render(**data.dict())
+            template = self._compiled.get(template_path)
+            if template is None:
+                template = self.jinja_env.get_template(template_path)
+                self._compiled[template_path] = template
+            rendered = template.render(data)
         except jinja2.TemplateError as e:
             raise RuntimeError(f"Jinja rendering failed: {e}")
+            
+        if len(self._rendered) >= _RENDER_MEMO_SIZE:
+            # Evict del più vecchio (dict in ordine di inserimento)
+            del self._rendered[next(iter(self._rendered))]
+        self._rendered[memo_key] = rendered
+        return rendered
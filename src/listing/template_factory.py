@@ -2,64 +2,86 @@
 Factory e Builder pattern per template - VERSIONE MOCK SENZA COOKIECUTTER
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Type, Optional, List, Any
+from typing import Dict, FrozenSet, Type, Optional, List, Any
 import json
 import os
 
+def _copy_structure(structure: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia della struttura di classe: liste incluse, il chiamante può modificarla"""
+    return {
+        key: value.copy() if isinstance(value, list) else value
+        for key, value in structure.items()
+    }
+
 class BaseTemplate(ABC):
     """Base class per tutti i template"""
     
+    # Campi obbligatori: subset test in C invece di N lookup
+    _REQUIRED: FrozenSet[str] = frozenset()
+    
     @abstractmethod
     def get_structure(self) -> Dict[str, Any]:
-        """Ritorna struttura template"""
+        """Ritorna struttura template (copia: modificabile dal chiamante)"""
         pass
         
     @abstractmethod
     def validate(self, data: Dict[str, Any]) -> bool:
         """Valida dati per template"""
         pass
+        
+    @classmethod
+    def validate_batch(cls, rows: List[Dict[str, Any]]) -> List[bool]:
+        """Come validate su più righe: True dove tutti i campi obbligatori sono presenti"""
+        required = cls._REQUIRED
+        return [required <= row.keys() for row in rows]
 
 class JewelryTemplate(BaseTemplate):
     """Template specifico per gioielli"""
     
+    _STRUCTURE: Dict[str, Any] = {
+        "title": "{product_name} - {material} {style}",
+        "sections": ["description", "features", "care_instructions"],
+        "required_fields": ["product_name", "material", "style"]
+    }
+    _REQUIRED = frozenset(_STRUCTURE["required_fields"])
+    
     def get_structure(self) -> Dict[str, Any]:
-        return {
-            "title": "{product_name} - {material} {style}",
-            "sections": ["description", "features", "care_instructions"],
-            "required_fields": ["product_name", "material", "style"]
-        }
+        return _copy_structure(self._STRUCTURE)
         
     def validate(self, data: Dict[str, Any]) -> bool:
-        required = ["product_name", "material", "style"]
-        return all(field in data for field in required)
+        return self._REQUIRED <= data.keys()
 
 class ElectronicsTemplate(BaseTemplate):
     """Template specifico per elettronica"""
     
+    _STRUCTURE: Dict[str, Any] = {
+        "title": "{brand} {product_name} - {model}",
+        "sections": ["specifications", "features", "warranty"],
+        "required_fields": ["product_name", "brand", "model"]
+    }
+    _REQUIRED = frozenset(_STRUCTURE["required_fields"])
+    
     def get_structure(self) -> Dict[str, Any]:
-        return {
-            "title": "{brand} {product_name} - {model}",
-            "sections": ["specifications", "features", "warranty"],
-            "required_fields": ["product_name", "brand", "model"]
-        }
+        return _copy_structure(self._STRUCTURE)
         
     def validate(self, data: Dict[str, Any]) -> bool:
-        required = ["product_name", "brand", "model"]
-        return all(field in data for field in required)
+        return self._REQUIRED <= data.keys()
 
 class HomeTemplate(BaseTemplate):
     """Template specifico per casa"""
     
+    _STRUCTURE: Dict[str, Any] = {
+        "title": "{product_name} - {category}",
+        "sections": ["description", "features", "dimensions"],
+        "required_fields": ["product_name", "category"]
+    }
+    _REQUIRED = frozenset(_STRUCTURE["required_fields"])
+    
     def get_structure(self) -> Dict[str, Any]:
-        return {
-            "title": "{product_name} - {category}",
-            "sections": ["description", "features", "dimensions"],
-            "required_fields": ["product_name", "category"]
-        }
+        return _copy_structure(self._STRUCTURE)
         
     def validate(self, data: Dict[str, Any]) -> bool:
-        required = ["product_name", "category"]
-        return all(field in data for field in required)
+        return self._REQUIRED <= data.keys()
 
 class TemplateFactory:
     """Factory per creazione template"""
@@ -69,17 +91,24 @@ class TemplateFactory:
         "electronics": ElectronicsTemplate,
         "home": HomeTemplate
     }
+    # Template stateless: una sola istanza (flyweight) per categoria
+    _instances: Dict[str, BaseTemplate] = {}
     
     @classmethod
     def register_template(cls, name: str, template_class: Type[BaseTemplate]):
         cls._templates[name] = template_class
+        cls._instances.pop(name, None)
         
     @classmethod
     def create_template(cls, category: str) -> BaseTemplate:
-        template_class = cls._templates.get(category.lower())
-        if not template_class:
-            raise ValueError(f"Template for category {category} not found")
-        return template_class()
+        key = category.lower()
+        instance = cls._instances.get(key)
+        if instance is None:
+            template_class = cls._templates.get(key)
+            if not template_class:
+                raise ValueError(f"Template for category {category} not found")
+            instance = cls._instances[key] = template_class()
+        return instance
         
     @classmethod
     def list_templates(cls) -> List[str]:
@@ -91,6 +120,8 @@ class TemplateBuilder:
     def __init__(self):
         self._title = ""
         self._sections = {}
+        # Intestazioni "## Nome" formattate una volta, all'aggiunta della sezione
+        self._headings: Dict[str, str] = {}
         self._metadata = {}
         
     def set_title(self, title: str) -> "TemplateBuilder":
@@ -99,6 +130,8 @@ class TemplateBuilder:
         
     def add_section(self, name: str, content: str) -> "TemplateBuilder":
         self._sections[name] = content
+        if name not in self._headings:
+            self._headings[name] = f"\n## {name.title()}\n"
         return self
         
     def set_metadata(self, key: str, value: Any) -> "TemplateBuilder":
@@ -106,17 +139,19 @@ class TemplateBuilder:
         return self
         
     def set_footer(self, footer: str) -> "TemplateBuilder":
-        self._sections["footer"] = footer
-        return self
+        return self.add_section("footer", footer)
         
     def build(self) -> str:
         """Costruisce il template finale"""
         template_parts = [self._title]
-        
-        for section_name, content in self._sections.items():
-            template_parts.append(f"\n## {section_name.title()}\n{content}")
-            
+        template_parts.extend(
+            self._headings[name] + content for name, content in self._sections.items()
+        )
         return "\n".join(template_parts)
+        
+    def build_bytes(self) -> bytes:
+        """Template finale già codificato UTF-8 (per scrittura su file/rete)"""
+        return self.build().encode("utf-8")
 
 # Mock cookiecutter function se importato
 def from_cookiecutter(*args, **kwargs):
@@ -3,6 +3,8 @@ Test finale dopo tutti i fix
 """
 import sys
 import os
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 
 # Aggiungi src al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -23,17 +25,22 @@ def test_all_imports():
         ("Batch Processor", "src.listing.batch_processor", "BatchProcessor"),
     ]
     
-    all_ok = True
-    for name, module_path, class_name in modules:
-        try:
-            module = __import__(module_path, fromlist=[class_name])
-            cls = getattr(module, class_name)
-            print(f"✅ {name}: {class_name}")
-        except Exception as e:
-            print(f"❌ {name}: {e}")
-            all_ok = False
+    # Import in parallel: disk I/O and extension loading overlap across modules
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(_check_import, modules))
     
-    return all_ok
+    print("\n".join(line for _, line in results))
+    return all(ok for ok, _ in results)
+
+def _check_import(entry):
+    """Import one module and look up its class; returns (ok, report line)"""
+    name, module_path, class_name = entry
+    try:
+        module = importlib.import_module(module_path)
+        getattr(module, class_name)
+        return True, f"✅ {name}: {class_name}"
+    except Exception as e:
+        return False, f"❌ {name}: {e}"
 
 def run_simple_test():
     """Esegue un test semplice del sistema"""
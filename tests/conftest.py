@@ -0,0 +1,41 @@
+"""
+Configurazione pytest condivisa per la suite listing
+"""
+import os
+import sys
+import types
+from unittest.mock import MagicMock, Mock
+
+# INTEGRATION=1: modelli e Prophet reali, nessuno stub
+INTEGRATION = os.environ.get('INTEGRATION') == '1'
+
+
+def _stub_pipeline(*args, **kwargs):
+    # summarization -> summary_text, text-generation -> generated_text
+    return Mock(return_value=[{'summary_text': 'Optimized Title', 'generated_text': 'Optimized Title'}])
+
+
+if not INTEGRATION:
+    # Prophet (pandas + Stan) stubbato prima che i test importino SalesPredictor:
+    # nessun import a freddo di più secondi alla collection
+    for _module in ('prophet', 'prophet.forecaster', 'prophet.serialize'):
+        sys.modules.setdefault(_module, MagicMock())
+    
+    # transformers stubbato una volta: il vero import (torch, tokenizers) e
+    # i patch('transformers.pipeline') per test non servono più
+    _transformers = types.ModuleType('transformers')
+    _transformers.pipeline = _stub_pipeline
+    # Auto* e altri simboli importati dai moduli listing
+    _transformers.__getattr__ = lambda name: MagicMock(name=f'transformers.{name}')
+    sys.modules.setdefault('transformers', _transformers)
+
+
+def pytest_configure(config):
+    # Benchmark: esclusi dai worker xdist (-m "not serial"), girano da soli
+    config.addinivalue_line(
+        "markers", "serial: test che richiede CPU quieta, fuori dall'esecuzione parallela"
+    )
+    # Esclusi dal giro rapido locale (make test-fast)
+    config.addinivalue_line("markers", "slow: test lento")
+    config.addinivalue_line("markers", "integration: test che attraversa più componenti")
+    config.addinivalue_line("markers", "benchmark: test di performance")
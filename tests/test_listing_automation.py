@@ -3,33 +3,114 @@ Test suite completa per Listing Automation System
 Coverage target: >85%
 """
 import pytest
+import pytest_asyncio
 import asyncio
 from unittest.mock import Mock, patch, AsyncMock
 import sys
 import os
+import pickle
+import functools
+import copy
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
 
 # Aggiungi src al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from src.core.listing_config import ListingConfig
 from src.core.dependencies import DIContainer, get_container
-from src.core.cache_system import MultiLevelCache
+from src.core.cache_system import MultiLevelCache, _serialize, _deserialize
 from src.core.retry_manager import RetryManager
 from src.core.error_handling import ErrorHandler, ListingError
 from src.core.monitoring import MetricsCollector
 
 from src.listing.ai_optimizer import AIListingOptimizer, OptimizationResult
-from src.listing.template_engine import AdvancedTemplateEngine, TemplateRegistry
+from src.listing.template_engine import AdvancedTemplateEngine, TemplateRegistry, TemplateConfig
 from src.listing.template_factory import TemplateFactory, TemplateBuilder
-from src.listing.publisher import MultiPlatformPublisher, PublishResult
+from src.listing.publisher import MultiPlatformPublisher, PublishResult, PublishStatus
 from src.listing.ebay_publisher import EbayPublisher
-from src.listing.queue_manager import PublishingQueue, QueueItem
+from src.listing.queue_manager import PublishingQueue, QueueItem, Priority
 from src.listing.sales_predictor import SalesPredictor
 
 
+# ==================== FAKES ====================
+
+class FakeCache:
+    """In-memory stand-in for MultiLevelCache (no spec= introspection)"""
+    
+    def __init__(self):
+        self.store = {}
+    
+    async def get(self, key):
+        return self.store.get(key)
+    
+    async def set(self, key, value, ttl=None):
+        self.store[key] = value
+    
+    async def get_many(self, keys):
+        return [self.store.get(key) for key in keys]
+    
+    async def set_many(self, items, ttl=None):
+        self.store.update(items)
+    
+    async def delete(self, key):
+        self.store.pop(key, None)
+    
+    def reset(self):
+        self.store.clear()
+
+
+class FakeMetrics:
+    """Records MetricsCollector calls as (kind, name, value) tuples"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    async def increment(self, name, value=1, tags=None):
+        self.calls.append(('counter', name, value))
+    
+    async def gauge(self, name, value, tags=None):
+        self.calls.append(('gauge', name, value))
+    
+    async def submit_many(self, entries):
+        self.calls.extend((kind, name, value) for name, kind, value in entries)
+    
+    def reset(self):
+        self.calls.clear()
+
+
+class FakeErrorHandler:
+    """Collects exceptions passed to ErrorHandler.capture_exception"""
+    
+    def __init__(self):
+        self.captured = []
+    
+    def capture_exception(self, exc, context=None):
+        self.captured.append((exc, context))
+    
+    def track_business_metric(self, metric_name, value, tags=None):
+        pass
+    
+    def reset(self):
+        self.captured.clear()
+
+
 # ==================== FIXTURES ====================
 
-@pytest.fixture
+@functools.lru_cache(maxsize=None)
+def _build_config(env_fingerprint):
+    """ListingConfig parsed once per distinct environment"""
+    return ListingConfig()
+
+
+def _cached_config():
+    return _build_config(hash(frozenset(os.environ.items())))
+
+
+@pytest.fixture(scope="session")
 def mock_config():
     """Mock configuration senza chiamate esterne"""
     with patch.dict(os.environ, {
@@ -39,36 +120,85 @@ def mock_config():
         'EBAY_CERT_ID': 'mock-cert-id',
         'EBAY_SANDBOX': 'true'
     }):
-        config = ListingConfig()
-        return config
+        return _cached_config()
 
 
-@pytest.fixture
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def mock_container(mock_config):
-    """Container DI con mock dependencies"""
+    """Container DI con mock dependencies (un solo start/stop per sessione)"""
     container = DIContainer()
     
     # Mock services
     container.register('config', lambda: mock_config)
-    container.register('cache', lambda: AsyncMock(spec=MultiLevelCache))
-    container.register('metrics', lambda: Mock(spec=MetricsCollector))
-    container.register('error_handler', lambda: Mock(spec=ErrorHandler))
+    container.register('cache', FakeCache)
+    container.register('metrics', FakeMetrics)
+    container.register('error_handler', FakeErrorHandler)
     
     await container.start()
     yield container
     await container.stop()
 
 
+@pytest.fixture(autouse=True)
+def reset_container_mocks(request):
+    """Fake del container condiviso azzerati prima di ogni test che lo usa"""
+    if 'mock_container' in request.fixturenames:
+        container = request.getfixturevalue('mock_container')
+        for name in ('cache', 'metrics', 'error_handler'):
+            container.get_service(name).reset()
+
+
 @pytest.fixture
 def mock_redis():
-    """Mock Redis client"""
-    with patch('redis.asyncio.from_url') as mock:
-        client = AsyncMock()
-        client.get = AsyncMock(return_value=None)
-        client.set = AsyncMock(return_value=True)
-        client.exists = AsyncMock(return_value=False)
-        mock.return_value = client
-        yield client
+    """Fake Redis client, injected via MultiLevelCache(redis_client=...)"""
+    client = AsyncMock()
+    client.get = AsyncMock(return_value=None)
+    client.set = AsyncMock(return_value=True)
+    client.exists = AsyncMock(return_value=False)
+    
+    # Pipeline: async context manager che registra i comandi in batch
+    pipe = AsyncMock()
+    pipe.__aenter__.return_value = pipe
+    pipe.setex = Mock(return_value=pipe)
+    pipe.get = Mock(return_value=pipe)
+    pipe.execute = AsyncMock(return_value=[True, True])
+    client.pipeline = Mock(return_value=pipe)
+    
+    return client
+
+
+@pytest.fixture(scope="session")
+def warm_pipeline(mock_config):
+    """Title pipeline loaded and warmed once per session (stub unless INTEGRATION=1)"""
+    import transformers
+    
+    title_pipeline = transformers.pipeline(
+        "summarization",
+        model=mock_config.model_title,
+        max_length=80,
+        min_length=30
+    )
+    # First call pays weights mmap + tokenizer build: keep it out of the tests
+    title_pipeline("warmup")
+    return title_pipeline
+
+
+@pytest.fixture(scope="module")
+def template_engine(mock_container):
+    """Template engine with test templates (compilato una volta per modulo)"""
+    engine = AdvancedTemplateEngine(
+        container=mock_container,
+        base_path='./test_templates'
+    )
+    
+    # Register test template
+    engine.registry.register(
+        'test_template',
+        '# {{ title }}\n{{ description }}',
+        {'type': 'simple', 'category': 'test'}
+    )
+    
+    return engine
 
 
 # ==================== CONFIG TESTS ====================
@@ -76,29 +206,36 @@ def mock_redis():
 class TestListingConfig:
     """Test configuration management"""
     
-    def test_config_defaults(self):
-        """Test default configuration values"""
-        with patch.dict(os.environ, {}, clear=True):
-            config = ListingConfig()
-            assert config.redis_url == 'redis://localhost:6379'
-            assert config.cache_ttl == 3600
-            assert config.model_title == 'salesforce/bart-large-mnli'
-    
-    def test_config_env_override(self):
-        """Test environment variable override"""
-        with patch.dict(os.environ, {
-            'REDIS_URL': 'redis://custom:6380',
-            'CACHE_TTL': '7200'
-        }):
-            config = ListingConfig()
-            assert config.redis_url == 'redis://custom:6380'
-            assert config.cache_ttl == 7200
-    
-    def test_config_validation(self):
-        """Test configuration validation"""
-        with patch.dict(os.environ, {'CACHE_TTL': '999999'}):
+    @pytest.mark.parametrize("env,expected", [
+        # Default configuration values
+        ({}, {
+            'redis_url': 'redis://localhost:6379',
+            'cache_ttl': 3600,
+            'model_title': 'salesforce/bart-large-mnli'
+        }),
+        # Environment variable override
+        ({'REDIS_URL': 'redis://custom:6380', 'CACHE_TTL': '7200'}, {
+            'redis_url': 'redis://custom:6380',
+            'cache_ttl': 7200
+        }),
+        # Configuration validation
+        ({'CACHE_TTL': '999999'}, ValueError),
+    ], ids=['defaults', 'env_override', 'validation'])
+    def test_config_from_env(self, monkeypatch, env, expected):
+        """Test configuration loading from environment"""
+        # Only the variables under test are touched: no full os.environ copy
+        for key in ('REDIS_URL', 'CACHE_TTL', 'MODEL_TITLE'):
+            monkeypatch.delenv(key, raising=False)
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        
+        if expected is ValueError:
             with pytest.raises(ValueError):
                 ListingConfig()
+            return
+        
+        config = ListingConfig()
+        assert {field: getattr(config, field) for field in expected} == expected
 
 
 # ==================== DI CONTAINER TESTS ====================
@@ -107,35 +244,30 @@ class TestDIContainer:
     """Test dependency injection container"""
     
     @pytest.mark.asyncio
-    async def test_container_registration(self):
-        """Test service registration"""
+    @pytest.mark.parametrize("singleton,resolves,expected", [
+        (False, 2, "new_each"),
+        (True, 2, "same"),
+    ])
+    async def test_container_behavior(self, singleton, resolves, expected):
+        """Test service registration and singleton/transient resolution"""
         container = DIContainer()
         
-        # Register service
-        test_service = Mock()
-        container.register('test', lambda: test_service)
-        
-        # Resolve service
-        resolved = await container.resolve('test')
-        assert resolved == test_service
-    
-    @pytest.mark.asyncio
-    async def test_container_singleton(self):
-        """Test singleton behavior"""
-        container = DIContainer()
-        
-        # Register singleton
+        # Register service: the factory counts its invocations
         counter = {'value': 0}
         def factory():
             counter['value'] += 1
-            return counter['value']
+            return Mock(name=f"service-{counter['value']}")
+        
+        container.register('service', factory, singleton=singleton)
         
-        container.register('counter', factory, singleton=True)
+        resolved = [await container.resolve('service') for _ in range(resolves)]
         
-        # Multiple resolves should return same instance
-        val1 = await container.resolve('counter')
-        val2 = await container.resolve('counter')
-        assert val1 == val2 == 1
+        if expected == "same":
+            assert all(service is resolved[0] for service in resolved)
+            assert counter['value'] == 1
+        else:
+            assert len({id(service) for service in resolved}) == resolves
+            assert counter['value'] == resolves
     
     @pytest.mark.asyncio
     async def test_container_lifecycle(self):
@@ -154,6 +286,29 @@ class TestDIContainer:
         
         await container.stop()
         service.stop.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_container_lifecycle_order(self):
+        """Services start in registration order and stop in reverse"""
+        container = DIContainer()
+        events = []
+        
+        def make_service(name):
+            service = AsyncMock()
+            service.start = AsyncMock(side_effect=lambda: events.append(('start', name)))
+            service.stop = AsyncMock(side_effect=lambda: events.append(('stop', name)))
+            return lambda: service
+        
+        for name in ('db', 'cache', 'api'):
+            container.register(name, make_service(name))
+        
+        await container.start()
+        await container.stop()
+        
+        assert events == [
+            ('start', 'db'), ('start', 'cache'), ('start', 'api'),
+            ('stop', 'api'), ('stop', 'cache'), ('stop', 'db'),
+        ]
 
 
 # ==================== CACHE TESTS ====================
@@ -170,6 +325,23 @@ class TestCacheSystem:
         assert result is None
         mock_redis.get.assert_called_once_with('nonexistent')
     
+    @pytest.mark.parametrize("value", [
+        {'title': 'x', 'scores': [1, 2.5, None, True]},
+        ('a', 1),
+        float('nan'),
+        uuid.UUID(int=1),
+        PublishStatus.PUBLISHED,
+        {1: 'non-str key'},
+        2 ** 70,
+    ])
+    def test_serialize_round_trip(self, value):
+        """L2 values come back with the same types as L1"""
+        restored = _deserialize(_serialize(value))
+        
+        assert type(restored) is type(value)
+        if value == value:  # NaN != NaN
+            assert restored == value
+    
     @pytest.mark.asyncio
     async def test_cache_set_get(self, mock_redis):
         """Test cache set and get"""
@@ -183,6 +355,116 @@ class TestCacheSystem:
         result = await cache.get('key')
         assert result == 'value'
     
+    @pytest.mark.asyncio
+    async def test_l1_hits_skip_redis(self, mock_redis):
+        """Test L1 hits are served in-process without a Redis GET"""
+        cache = MultiLevelCache(redis_client=mock_redis)
+        await cache.set('k', 'v')
+        mock_redis.get.reset_mock()
+        
+        assert await cache.get('k') == 'v'
+        mock_redis.get.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_invalidation_during_get_skips_l1_fill(self, mock_redis):
+        """A value read from Redis while an invalidation arrives is not pinned in L1"""
+        cache = MultiLevelCache(redis_client=mock_redis)
+        
+        async def get_racing_invalidation(key):
+            cache._invalidation_epoch += 1  # invalidation lands mid-GET
+            return _serialize('old')
+        
+        mock_redis.get.side_effect = get_racing_invalidation
+        
+        assert await cache.get('k') == 'old'
+        assert await cache.memory_cache.get('k') is None
+    
+    @pytest.mark.asyncio
+    async def test_cache_set_many_pipeline(self, mock_redis):
+        """Test batch set: all L2 writes coalesced in one pipeline round-trip"""
+        cache = MultiLevelCache(redis_client=mock_redis)
+        
+        await cache.set_many({'a': 1, 'b': 2}, ttl=60)
+        
+        pipe = mock_redis.pipeline.return_value
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        assert [c.args[:2] for c in pipe.setex.call_args_list] == [('a', 60), ('b', 60)]
+        pipe.execute.assert_awaited_once()
+        mock_redis.setex.assert_not_called()
+        assert await cache.get_many(['a', 'b']) == [1, 2]
+    
+    @pytest.mark.asyncio
+    async def test_cache_get_many(self, mock_redis):
+        """Test batch get: L1 hits served locally, misses in one MGET"""
+        mock_redis.mget = AsyncMock(return_value=[pickle.dumps('remote'), None])
+        
+        cache = MultiLevelCache(redis_client=mock_redis)
+        await cache.memory_cache.set('local', 'value')
+        
+        result = await cache.get_many(['local', 'remote', 'missing'])
+        assert result == ['value', 'remote', None]
+        mock_redis.mget.assert_awaited_once_with(['remote', 'missing'])
+        assert await cache.memory_cache.get('remote') == 'remote'
+    
+    @pytest.mark.asyncio
+    async def test_cache_invalidation_evicts_l1(self):
+        """Test Redis invalidation messages evict L1 entries"""
+        cache = MultiLevelCache()
+        await cache.memory_cache.set('key', 'value')
+        await cache.memory_cache.set('other', 'value')
+        
+        async def listen():
+            yield {'type': 'subscribe', 'data': 1}
+            yield {'type': 'message', 'data': [b'key']}
+        
+        pubsub = Mock()
+        pubsub.listen = listen
+        await cache._listen_invalidations(pubsub)
+        
+        assert await cache.memory_cache.get('key') is None
+        assert await cache.memory_cache.get('other') == 'value'
+    
+    def test_make_key_canonical(self):
+        """Equal arguments give equal keys, regardless of object sharing or dict order"""
+        cache = MultiLevelCache()
+        shared = [1]
+        
+        assert cache.make_key('p', [shared, shared]) == cache.make_key('p', [[1], [1]])
+        assert cache.make_key('p', {'a': 1, 'b': 2}) == cache.make_key('p', {'b': 2, 'a': 1})
+        assert cache.make_key('p', x=1, y={2, 3}) == cache.make_key('p', y={3, 2}, x=1)
+        assert cache.make_key('p', 1) != cache.make_key('p', 2)
+    
+    def test_make_key_rejects_unstable_args(self):
+        """Arguments without a canonical form raise instead of keying on repr"""
+        cache = MultiLevelCache()
+        with pytest.raises(TypeError):
+            cache.make_key('p', object())
+    
+    @pytest.mark.asyncio
+    async def test_cached_method_keys_on_instance(self, monkeypatch):
+        """Methods are keyed on the instance's __cache_key__ as well as the arguments"""
+        from src.core import cache_system
+        cache = MultiLevelCache()
+        monkeypatch.setattr(cache_system, 'get_cache', lambda: cache)
+        calls = []
+        
+        class Pricing:
+            def __init__(self, market):
+                self.market = market
+            
+            def __cache_key__(self):
+                return self.market
+            
+            @cache_system.cached(ttl=60)
+            async def quote(self, sku):
+                calls.append((self.market, sku))
+                return self.market
+        
+        assert await Pricing('it').quote('a') == 'it'
+        assert await Pricing('it').quote('a') == 'it'
+        assert await Pricing('de').quote('a') == 'de'
+        assert calls == [('it', 'a'), ('de', 'a')]
+    
     @pytest.mark.asyncio
     async def test_cache_decorator(self, mock_redis):
         """Test cache decorator"""
@@ -213,23 +495,31 @@ class TestAIOptimizer:
     """Test AI listing optimizer"""
     
     @pytest.fixture
-    def mock_optimizer(self, mock_container):
-        """Mock AI optimizer with mocked models"""
-        with patch('transformers.pipeline') as mock_pipeline:
-            # Mock title generator
-            mock_pipeline.return_value = Mock(
-                return_value=[{'generated_text': 'Optimized Title'}]
-            )
-            
-            optimizer = AIListingOptimizer(container=mock_container)
-            return optimizer
+    def mock_optimizer(self, mock_config, warm_pipeline):
+        """Mock AI optimizer with mocked models (transformers stubbato in conftest)"""
+        optimizer = AIListingOptimizer(mock_config, cache=FakeCache())
+        # Seed the lazy cached_property with the session-warmed pipeline
+        optimizer.__dict__['title_generator'] = warm_pipeline
+        optimizer.__dict__['keyword_extractor'] = Mock(return_value=[
+            {'word': 'Product', 'score': 0.95},
+            {'word': 'noise', 'score': 0.2}
+        ])
+        optimizer.__dict__['sentiment_analyzer'] = Mock(
+            return_value=[{'label': 'POSITIVE', 'score': 0.9}]
+        )
+        # DialoGPT: tokenizer/generate sostituiti dal testo già decodificato
+        optimizer._generate_text = Mock(return_value=(
+            "Prodotto di alta qualità, pensato per durare nel tempo "
+            "e offrire prestazioni eccellenti ogni giorno."
+        ))
+        return optimizer
     
     @pytest.mark.asyncio
     async def test_optimize_title(self, mock_optimizer):
         """Test title optimization"""
-        result = await mock_optimizer.optimize_title(
-            "Original Title",
-            category="Electronics"
+        result = await mock_optimizer._generate_title(
+            {'name': 'Original Title', 'category': 'Electronics'},
+            marketplace="ebay"
         )
         
         assert "Optimized" in result
@@ -239,31 +529,32 @@ class TestAIOptimizer:
     async def test_generate_description(self, mock_optimizer):
         """Test description generation"""
         features = ["Feature 1", "Feature 2"]
-        description = await mock_optimizer.generate_description(
-            "Product Title",
-            features=features,
-            category="Electronics"
+        description = await mock_optimizer._generate_description(
+            {'name': 'Product Title', 'features': features, 'category': 'Electronics'},
+            language="it"
         )
         
         assert isinstance(description, str)
         assert len(description) > 100
+        assert all(f in description for f in features)
     
     @pytest.mark.asyncio
     async def test_extract_keywords(self, mock_optimizer):
         """Test keyword extraction"""
-        keywords = await mock_optimizer.extract_keywords(
-            "This is a test product description"
+        keywords = await mock_optimizer._extract_keywords(
+            {'description': "This is a test product description"}
         )
         
         assert isinstance(keywords, list)
         assert len(keywords) > 0
         assert all(isinstance(k, str) for k in keywords)
+        assert 'noise' not in keywords  # sotto la soglia di score
     
     @pytest.mark.asyncio
     async def test_optimize_listing_complete(self, mock_optimizer):
         """Test complete listing optimization"""
         listing_data = {
-            'title': 'Test Product',
+            'name': 'Test Product',
             'description': 'Basic description',
             'category': 'Electronics',
             'features': ['Feature 1', 'Feature 2'],
@@ -271,10 +562,11 @@ class TestAIOptimizer:
         }
         
         result = await mock_optimizer.optimize_listing(listing_data)
+        await mock_optimizer.shutdown()
         
         assert isinstance(result, OptimizationResult)
-        assert result.title != listing_data['title']
-        assert result.description != listing_data['description']
+        assert result.optimized_title != listing_data['name']
+        assert result.optimized_description != listing_data['description']
         assert len(result.keywords) > 0
         assert result.sentiment_score >= -1 and result.sentiment_score <= 1
 
@@ -284,23 +576,6 @@ class TestAIOptimizer:
 class TestTemplateEngine:
     """Test template engine"""
     
-    @pytest.fixture
-    def template_engine(self, mock_container):
-        """Template engine with test templates"""
-        engine = AdvancedTemplateEngine(
-            container=mock_container,
-            base_path='./test_templates'
-        )
-        
-        # Register test template
-        engine.registry.register(
-            'test_template',
-            '# {{ title }}\n{{ description }}',
-            {'type': 'simple', 'category': 'test'}
-        )
-        
-        return engine
-    
     @pytest.mark.asyncio
     async def test_render_simple_template(self, template_engine):
         """Test simple template rendering"""
@@ -361,6 +636,36 @@ class TestTemplateEngine:
         assert 'features' in template
         assert 'Fast shipping' in template
 
+    def test_factory_structure_is_a_copy(self):
+        """Mutating a returned structure does not leak into the shared template"""
+        template = TemplateFactory.create_template('jewelry')
+        
+        template.get_structure()['sections'].append('extra')
+        
+        assert 'extra' not in TemplateFactory.create_template('jewelry').get_structure()['sections']
+    
+    @pytest.mark.asyncio
+    async def test_reregister_template_drops_stale_render(self, tmp_path):
+        """Re-registering a template serves the new file, not the memoized render"""
+        engine = AdvancedTemplateEngine(base_path=str(tmp_path))
+        (tmp_path / 'home' / 'desk').mkdir()
+        template_file = tmp_path / 'home' / 'desk.j2'
+        template_file.write_text('v1 {{ product_name }}')
+        config = TemplateConfig(template_id='desk', category='home')
+        data = {'product_name': 'Desk', 'features': ['oak'], 'price': 10.0}
+        
+        other = AdvancedTemplateEngine(base_path=str(tmp_path))
+        
+        engine.register_template(config, 'desk')
+        assert await engine.render_template('desk', data) == 'v1 Desk'
+        assert await other.render_template('desk', data) == 'v1 Desk'
+        
+        template_file.write_text('v2 {{ product_name }}')
+        engine.register_template(config, 'desk')
+        assert await engine.render_template('desk', data) == 'v2 Desk'
+        # Same base_path: the other engine sees the re-registration too
+        assert await other.render_template('desk', data) == 'v2 Desk'
+
 
 # ==================== PUBLISHER TESTS ====================
 
@@ -373,7 +678,7 @@ class TestPublisher:
         publisher = MultiPlatformPublisher(container=mock_container)
         
         # Mock eBay adapter
-        mock_ebay = AsyncMock(spec=eBayPublisher)
+        mock_ebay = AsyncMock()
         mock_ebay.publish = AsyncMock(return_value=PublishResult(
             success=True,
             platform='ebay',
@@ -431,134 +736,228 @@ class TestPublisher:
         assert mock_publisher.platforms['ebay'].publish.call_count == 2
 
 
+class TestEbayPublisher:
+    """Test eBay publisher"""
+    
+    @pytest.fixture
+    def listing(self):
+        return {
+            'title': 'Test Product',
+            'description': 'Test Description',
+            'price': 99.99,
+            'category_id': 123,
+            'condition': '1000'
+        }
+    
+    @pytest.mark.asyncio
+    async def test_warning_ack_is_published(self, listing):
+        """Ack 'Warning' means the item went live with non-blocking warnings"""
+        client = AsyncMock()
+        client.add_item.return_value = {'Ack': 'Warning', 'ItemID': '42'}
+        publisher = EbayPublisher({}, ebay_client=client)
+        
+        result = await publisher._do_publish(listing)
+        
+        assert result.status == PublishStatus.PUBLISHED
+        assert result.listing_id == '42'
+    
+    @pytest.mark.asyncio
+    async def test_batched_publish_propagates_errors(self, listing):
+        """A failed batch send fails every queued publish instead of leaving it pending"""
+        publisher = EbayPublisher({'publish_batch_window': 0.01}, ebay_client=AsyncMock())
+        publisher._do_publish_many = AsyncMock(side_effect=RuntimeError("boom"))
+        
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                publisher._do_publish(listing),
+                publisher._do_publish(listing),
+                return_exceptions=True
+            ),
+            timeout=1
+        )
+        
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert not publisher._send_tasks
+
+
 # ==================== QUEUE MANAGER TESTS ====================
 
+@pytest.fixture(scope="class")
+def priority_tasks():
+    """Listing con priorità diverse per PublishingQueue, costruiti una volta per classe"""
+    return [
+        ({'sku': 'low'}, Priority.LOW),
+        ({'sku': 'high'}, Priority.HIGH),
+        ({'sku': 'medium'}, Priority.NORMAL)
+    ]
+
+
 class TestQueueManager:
     """Test async queue manager"""
     
-    @pytest.fixture
-    async def queue_manager(self, mock_container):
-        """Queue manager instance"""
-        manager = QueueManager(
-            container=mock_container,
-            max_workers=2
-        )
-        await manager.start()
-        yield manager
-        await manager.stop()
+    @pytest_asyncio.fixture
+    async def queue_manager(self):
+        """Publishing queue instance"""
+        queue = PublishingQueue(max_concurrent=2)
+        yield queue
+        await queue.pause()
+        await queue.clear_queue()
     
     @pytest.mark.asyncio
     async def test_add_task(self, queue_manager):
         """Test adding task to queue"""
-        task = Task(
-            id='test-1',
-            type='optimize',
-            data={'title': 'Test'},
-            priority=1
+        # Scheduling futuro: l'item resta in coda
+        await queue_manager.add_to_queue(
+            {'title': 'Test'},
+            'test',
+            priority=Priority.HIGH,
+            scheduled_at=datetime.now() + timedelta(hours=1)
         )
-        
-        await queue_manager.add_task(task)
-        assert queue_manager.queue.qsize() == 1
+        assert len(queue_manager.queue) == 1
     
     @pytest.mark.asyncio
     async def test_process_task(self, queue_manager):
         """Test task processing"""
         processed = []
+        done = asyncio.Event()
+        
+        async def publish(listing):
+            processed.append(listing['id'])
+            done.set()
+            return PublishResult(
+                listing_id=listing['id'],
+                marketplace='test',
+                status=PublishStatus.PUBLISHED
+            )
         
-        async def handler(task):
-            processed.append(task.id)
-            return True
-        
-        queue_manager.register_handler('test', handler)
-        
-        task = Task(
-            id='test-1',
-            type='test',
-            data={'value': 42}
-        )
+        queue_manager.register_publisher('test', Mock(publish=publish))
         
-        await queue_manager.add_task(task)
-        await asyncio.sleep(0.1)  # Let worker process
+        await queue_manager.add_to_queue({'id': 'test-1', 'value': 42}, 'test')
+        await asyncio.wait_for(done.wait(), timeout=2.0)  # Worker done
         
         assert 'test-1' in processed
     
-    @pytest.mark.asyncio
-    async def test_priority_queue(self, queue_manager):
-        """Test priority queue ordering"""
-        # Add tasks with different priorities
-        tasks = [
-            Task('low', 'test', {}, priority=3),
-            Task('high', 'test', {}, priority=1),
-            Task('medium', 'test', {}, priority=2)
-        ]
-        
-        for task in tasks:
-            await queue_manager.add_task(task)
-        
-        # Process order should be by priority
+    async def _run_priority_tasks(self, priority_tasks, max_concurrent):
+        """Enqueue prioritized listings, then let max_concurrent slots drain the queue"""
+        queue = PublishingQueue(max_concurrent=max_concurrent)
         processed_order = []
+        done = asyncio.Event()
+        
+        async def publish(listing):
+            processed_order.append(listing['sku'])
+            if len(processed_order) == len(priority_tasks):
+                done.set()
+            return PublishResult(
+                listing_id=listing['sku'],
+                marketplace='test',
+                status=PublishStatus.PUBLISHED
+            )
         
-        async def handler(task):
-            processed_order.append(task.id)
-            return True
+        queue.register_publisher('test', Mock(publish=publish))
         
-        queue_manager.register_handler('test', handler)
+        # Copie per test: la coda può mutare i listing
+        tasks = [(copy.copy(listing), priority) for listing, priority in priority_tasks]
+        # add_to_queue non cede il loop: tutto è in coda prima che lo scheduler parta
+        for listing, priority in tasks:
+            await queue.add_to_queue(listing, 'test', priority=priority)
         
-        await asyncio.sleep(0.2)
+        await asyncio.wait_for(done.wait(), timeout=2.0)
+        return processed_order
+    
+    @pytest.mark.asyncio
+    async def test_priority_queue(self, priority_tasks):
+        """Test priority queue ordering (single slot: full order)"""
+        processed_order = await self._run_priority_tasks(priority_tasks, max_concurrent=1)
         
         assert processed_order == ['high', 'medium', 'low']
+    
+    @pytest.mark.asyncio
+    async def test_priority_queue_concurrent(self, priority_tasks):
+        """Test priority with concurrent slots (only the first pick is ordered)"""
+        processed_order = await self._run_priority_tasks(priority_tasks, max_concurrent=2)
+        
+        assert processed_order[0] == 'high'
+        assert sorted(processed_order) == ['high', 'low', 'medium']
+    
+    @pytest.mark.asyncio
+    async def test_publishing_queue_add_many(self):
+        """Bulk enqueue keeps FIFO order at equal priority"""
+        queue = PublishingQueue(max_concurrent=1)
+        published = []
+        done = asyncio.Event()
+        
+        async def publish(listing):
+            published.append(listing['sku'])
+            if len(published) == 3:
+                done.set()
+            return PublishResult(
+                listing_id=listing['sku'],
+                marketplace='ebay',
+                status=PublishStatus.PUBLISHED
+            )
+        
+        queue.register_publisher('ebay', Mock(publish=publish))
+        ids = await queue.add_many(
+            [{'sku': 'a'}, {'sku': 'b'}, {'sku': 'c'}],
+            'ebay'
+        )
+        await asyncio.wait_for(done.wait(), timeout=2.0)
+        
+        assert len(ids) == 3
+        assert published == ['a', 'b', 'c']
 
 
 # ==================== INTEGRATION TESTS ====================
 
+@pytest.mark.integration
 class TestIntegration:
     """Test integrazione componenti"""
     
+    @pytest.mark.slow
     @pytest.mark.asyncio
     async def test_full_optimization_flow(self, mock_container):
         """Test flusso completo di ottimizzazione"""
         # Setup components
-        with patch('transformers.pipeline'):
-            optimizer = AIListingOptimizer(container=mock_container)
-            template_engine = AdvancedTemplateEngine(container=mock_container)
-            
-            # Input data
-            product_data = {
-                'title': 'Original Product Title',
-                'description': 'Basic description',
-                'category': 'Electronics',
-                'features': ['Feature 1', 'Feature 2', 'Feature 3'],
-                'price': 149.99
-            }
-            
-            # Step 1: Optimize with AI
-            optimization_result = await optimizer.optimize_listing(product_data)
-            
-            # Step 2: Apply template
-            template_engine.registry.register(
-                'electronics',
-                '''
-                <h1>{{ title }}</h1>
-                <p>{{ description }}</p>
-                <ul>
-                {% for feature in features %}
-                <li>{{ feature }}</li>
-                {% endfor %}
-                </ul>
-                ''',
-                {'category': 'electronics'}
-            )
-            
-            listing_html = await template_engine.render('electronics', {
-                'title': optimization_result.title,
-                'description': optimization_result.description,
-                'features': product_data['features']
-            })
-            
-            # Verify results
-            assert '<h1>' in listing_html
-            assert optimization_result.title in listing_html
-            assert all(f in listing_html for f in product_data['features'])
+        optimizer = AIListingOptimizer(container=mock_container)
+        template_engine = AdvancedTemplateEngine(container=mock_container)
+        
+        # Input data
+        product_data = {
+            'title': 'Original Product Title',
+            'description': 'Basic description',
+            'category': 'Electronics',
+            'features': ['Feature 1', 'Feature 2', 'Feature 3'],
+            'price': 149.99
+        }
+        
+        # Step 1: Optimize with AI
+        optimization_result = await optimizer.optimize_listing(product_data)
+        
+        # Step 2: Apply template
+        template_engine.registry.register(
+            'electronics',
+            '''
+            <h1>{{ title }}</h1>
+            <p>{{ description }}</p>
+            <ul>
+            {% for feature in features %}
+            <li>{{ feature }}</li>
+            {% endfor %}
+            </ul>
+            ''',
+            {'category': 'electronics'}
+        )
+        
+        listing_html = await template_engine.render('electronics', {
+            'title': optimization_result.title,
+            'description': optimization_result.description,
+            'features': product_data['features']
+        })
+        
+        # Verify results
+        assert '<h1>' in listing_html
+        assert optimization_result.title in listing_html
+        assert all(f in listing_html for f in product_data['features'])
     
     @pytest.mark.asyncio
     async def test_error_handling_flow(self, mock_container):
@@ -580,13 +979,15 @@ class TestIntegration:
 
 # ==================== PERFORMANCE TESTS ====================
 
+@pytest.mark.serial
+@pytest.mark.benchmark
 class TestPerformance:
     """Test performance e benchmark"""
     
     @pytest.mark.benchmark
-    @pytest.mark.asyncio
-    async def test_template_rendering_performance(self, benchmark, template_engine):
+    def test_template_rendering_performance(self, benchmark, template_engine):
         """Benchmark template rendering"""
+        # Context built once, outside the timed region
         context = {
             'title': 'Test Product',
             'description': 'Long description ' * 100,
@@ -596,7 +997,18 @@ class TestPerformance:
         async def render():
             return await template_engine.render('test_template', context)
         
-        result = await benchmark(render)
+        loop = asyncio.new_event_loop()
+        try:
+            # First render (template compile) excluded from the measurement
+            loop.run_until_complete(render())
+            result = benchmark.pedantic(
+                lambda: loop.run_until_complete(render()),
+                iterations=100,
+                rounds=5,
+                warmup_rounds=1
+            )
+        finally:
+            loop.close()
         assert result is not None
         
         # Target: <100ms
@@ -609,8 +1021,9 @@ class TestPerformance:
         cache = MultiLevelCache(redis_client=mock_redis)
         
         async def cache_operations():
-            await cache.set('key', 'value' * 1000)
-            result = await cache.get('key')
+            # SET e GET batch: un round-trip L2 ciascuno (pipeline / MGET)
+            await cache.set_many({'key': 'value' * 1000})
+            result, = await cache.get_many(['key'])
             return result
         
         result = await benchmark(cache_operations)
@@ -620,24 +1033,55 @@ class TestPerformance:
         assert benchmark.stats['mean'] < 0.01
     
     @pytest.mark.benchmark
-    def test_optimization_memory_usage(self):
+    @pytest.mark.asyncio
+    async def test_optimization_memory_usage(self, mock_config):
         """Test memory usage during optimization"""
         import tracemalloc
         
-        tracemalloc.start()
+        optimizer = AIListingOptimizer(mock_config, cache=FakeCache())
+        
+        # Model steps stubbed: measures the optimize_listing path, not model weights
+        async def generate_title(product_data, marketplace):
+            return product_data['title']
+        
+        async def generate_description(product_data, language):
+            return product_data['description']
         
-        # Simulate heavy operation
-        data = []
-        for i in range(1000):
-            data.append({
-                'title': f'Product {i}',
-                'description': 'Description' * 100,
-                'features': list(range(50))
-            })
+        async def extract_keywords(product_data):
+            return ['product']
         
-        current, peak = tracemalloc.get_traced_memory()
-        tracemalloc.stop()
+        async def analyze_sentiment(text):
+            return 0.5
         
+        optimizer._generate_title = generate_title
+        optimizer._generate_description = generate_description
+        optimizer._extract_keywords = extract_keywords
+        optimizer._analyze_sentiment = analyze_sentiment
+        
+        def products():
+            for i in range(1000):
+                yield {
+                    'title': f'Product {i}',
+                    'description': 'Description' * 100,
+                    'features': list(range(50))
+                }
+        
+        tracemalloc.start()
+        
+        # Stream products through the optimizer, peak sampled every 100 items
+        peak = 0
+        optimized = 0
+        try:
+            for i, product in enumerate(products(), 1):
+                result = await optimizer.optimize_listing(product)
+                optimized += isinstance(result, OptimizationResult)
+                if i % 100 == 0:
+                    peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+            await optimizer.shutdown()
+        
+        assert optimized == 1000
         # Target: <500MB for 1000 products
         assert peak / 1024 / 1024 < 500
 
@@ -649,10 +1093,8 @@ class TestSalesPredictor:
     
     @pytest.fixture
     def mock_predictor(self, mock_container):
-        """Mock sales predictor"""
-        with patch('prophet.Prophet'):
-            predictor = SalesPredictor(container=mock_container)
-            return predictor
+        """Mock sales predictor (prophet stubbato in conftest)"""
+        return SalesPredictor(container=mock_container)
     
     @pytest.mark.asyncio
     async def test_predict_sales(self, mock_predictor):
@@ -684,6 +1126,37 @@ class TestSalesPredictor:
         assert 'weekly' in seasonality
         assert 'monthly' in seasonality
         assert 'yearly' in seasonality
+    
+    @pytest.mark.parametrize("price, price_impact", [
+        (np.float64(150), 0.7),
+        (np.int64(10), 1.5),
+        (float('nan'), 1.0),
+    ])
+    def test_potential_price_bucket(self, price, price_impact):
+        """numpy scalars index the price table; NaN keeps the neutral bucket"""
+        result = SalesPredictor().analyze_product_potential(
+            {'category': 'home', 'price': price}
+        )
+        
+        assert result['factors']['price_impact'] == pytest.approx(price_impact)
+    
+    def test_potential_batch_matches_scalar(self):
+        """Batch and per-product paths report the same estimates and factors"""
+        predictor = SalesPredictor()
+        products = pd.DataFrame({
+            'category': ['home', 'electronics', 'other'],
+            'price': [150.0, 10.0, 50.0],
+            'competition_level': ['low', 'high', 'medium']
+        })
+        
+        batch = predictor.analyze_product_potential_batch(products)
+        
+        for row, features in zip(batch.itertuples(), products.to_dict('records')):
+            scalar = predictor.analyze_product_potential(features)
+            assert row.estimated_daily_sales == scalar['estimated_daily_sales']
+            assert row.category_impact == scalar['factors']['category_impact']
+            assert row.price_impact == pytest.approx(scalar['factors']['price_impact'])
+            assert row.competition_impact == scalar['factors']['competition_impact']
 
 
 if __name__ == '__main__':